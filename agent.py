@@ -1,76 +1,44 @@
-import os
-import re
-from dotenv import load_dotenv
-from web3 import Web3
-from langchain.tools import Tool
-from langchain.agents import initialize_agent
-from langchain.llms import OpenAI
-from langchain.agents import AgentType
-from langchain_openai import ChatOpenAI
-from langchain.output_parsers import StructuredOutputParser, ResponseSchema
-from langchain.prompts import PromptTemplate
-import json
 import time
+import functools
+from collections import namedtuple
+from mezo_context import get_context, CHAIN_ID, MUSD_ADDRESS, WRAPPED_BTC_ADDRESS, ROUTER_ADDRESS
+from tracing import tracer
 
-# Load environment variables
-load_dotenv()
+# Heavy dependencies (web3, langchain) and all network setup live behind the
+# lazily constructed context, so importing this module is side-effect free.
 
-#Check for keys
-OpenAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OpenAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY not found in environment variables!")
+StructuredParsing = namedtuple("StructuredParsing", ["output_parser", "prompt_template", "schema_version"])
 
-PRIVATE_KEY = os.getenv("PRIVATE_KEY")
-
-if not PRIVATE_KEY:
-    raise ValueError("PRIVATE_KEY not found in environment variables!")
-
-# Mezo Testnet RPC
-RPC_URL = "https://rpc.test.mezo.org"
-web3 = Web3(Web3.HTTPProvider(RPC_URL))
-
-#Create Account Object
-account = web3.eth.account.from_key(PRIVATE_KEY)
-sender_address = account.address
-
-#mUSD Contract Setup
-MUSD_ADDRESS = "0x637e22A1EBbca50EA2d34027c238317fD10003eB"  
-ERC20_ABI = json.loads(
-    '[{"constant": false, "inputs": [{"name": "spender", "type": "address"}, {"name": "amount", "type": "uint256"}],'
-    '"name": "approve", "outputs": [{"name": "", "type": "bool"}], "stateMutability": "nonpayable", "type":"function"},'
-    '{"constant": true, "inputs": [{"name": "owner", "type": "address"}],'
-    '"name": "balanceOf", "outputs": [{"name": "balance", "type": "uint256"}], "stateMutability": "view", "type": "function"},'
-    '{"constant": true, "inputs": [{"name": "owner", "type": "address"}, {"name": "spender", "type": "address"}],'
-    '"name": "allowance", "outputs": [{"name": "remaining", "type": "uint256"}], "stateMutability": "view", "type": "function"}]'
-)
-
-musd_contract = web3.eth.contract(address=MUSD_ADDRESS, abi=ERC20_ABI)
-
-#wBTC and router 
-WRAPPED_BTC_ADDRESS = "0xA460F83cdd9584E4bD6a9838abb0baC58EAde999" 
-ROUTER_ADDRESS = "0xC2E61936a542D78b9c3AA024fA141c4C632DF6c1"    
-
-#Load router ABI 
-with open("new_router_abi.json", "r") as abi_file:
-    router_abi = json.load(abi_file)
+def build_parsing(response_schemas, template):
+    """
+    Builds a structured output parser and prompt template from (name, description) pairs.
+    """
+    from langchain.output_parsers import StructuredOutputParser, ResponseSchema
+    from langchain.prompts import PromptTemplate
+    from intent_cache import schema_version
 
-#Router contract connection 
-router_contract = web3.eth.contract(address=ROUTER_ADDRESS, abi=router_abi)
+    output_parser = StructuredOutputParser.from_response_schemas(
+        [ResponseSchema(name=name, description=description) for name, description in response_schemas]
+    )
+    prompt_template = PromptTemplate(
+        template=template,
+        input_variables=["input"],
+        partial_variables={"format_instructions": output_parser.get_format_instructions()},
+    )
+    return StructuredParsing(
+        output_parser, prompt_template, schema_version(template, output_parser.get_format_instructions())
+    )
 
 #Define structured output schema for swaps 
 swap_response_schemas = [
-    ResponseSchema(name="amount", description="The amount of mUSD to swap."),
-    ResponseSchema(name="from_currency", description="The token to swap from (should always be 'mUSD')."),
-    ResponseSchema(name="to_currency", description="The token to receive (should always be 'BTC')."),
-    ResponseSchema(name="router_address", description="The Dumpy Swap router address for executing the swap.")
+    ("amount", "The amount of mUSD to swap."),
+    ("from_currency", "The token to swap from (should always be 'mUSD')."),
+    ("to_currency", "The token to receive (should always be 'BTC')."),
+    ("router_address", "The Dumpy Swap router address for executing the swap."),
 ]
 
-#Create swap output parser
-swap_output_parser = StructuredOutputParser.from_response_schemas(swap_response_schemas)
-
 #Define swap prompt template to parse swap prompts 
-swap_prompt_template = PromptTemplate(
-    template="""
+SWAP_PROMPT = """
     Extract swap transaction details from this request:
     {input}
 
@@ -79,53 +47,128 @@ swap_prompt_template = PromptTemplate(
     - The router address should always be '0xC2E61936a542D78b9c3AA024fA141c4C632DF6c1'.
     
     {format_instructions}
-    """,
-    input_variables=["input"],
-    partial_variables={"format_instructions": swap_output_parser.get_format_instructions()},
-)
+    """
+
+@functools.lru_cache(maxsize=None)
+def swap_parsing():
+    return build_parsing(swap_response_schemas, SWAP_PROMPT)
 
 
 #Parse swap prompts 
 def extract_swap_details(prompt: str):
     """
     Uses LLM to extract structured swap transaction details from user input.
+    Unambiguous commands are parsed directly without calling the LLM.
     """
-    formatted_prompt = swap_prompt_template.format(input=prompt)
-    response = llm.invoke(formatted_prompt)
+    context = get_context()
+    fast_result = context.fast_parser.parse_swap(prompt)
+    if fast_result is not None:
+        return fast_result
+
+    return context.intent_cache.get_or_compute(
+        "swap", swap_parsing().schema_version, prompt, llm_extract_swap_details
+    )
+
+def llm_extract_swap_details(prompt: str):
+    parsing = swap_parsing()
+    formatted_prompt = parsing.prompt_template.format(input=prompt)
+    with tracer.span("llm"):
+        response = get_context().llm.invoke(formatted_prompt)
 
     try:
-        extracted_data = swap_output_parser.parse(response.content)
+        with tracer.span("parse_output"):
+            extracted_data = parsing.output_parser.parse(response.content)
         return extracted_data
     except Exception as e:
         return f"Failed to extract swap details: {str(e)}"
     
 #Swap approval helper function
-def approve_if_needed(token_contract, amount_wei):
-    """
-    Checks if the router has enough allowance to spend tokens.
-    If not, sends an approval transaction.
-    """
-    current_allowance = token_contract.functions.allowance(sender_address, ROUTER_ADDRESS).call()
-    if current_allowance < amount_wei:
-        print(f"Current allowance ({current_allowance}) is less than required ({amount_wei}). Approving...")
-        nonce = web3.eth.get_transaction_count(sender_address)
-        gas_price = web3.eth.gas_price
-        
-        approve_tx = token_contract.functions.approve(ROUTER_ADDRESS, amount_wei).build_transaction({
-            "from": sender_address,
-            "nonce": nonce,
-            "gas": 50000,  # Typical gas limit for an ERC-20 approval
-            "gasPrice": gas_price,
-        })
-        
-        signed_tx = web3.eth.account.sign_transaction(approve_tx, PRIVATE_KEY)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
-        if receipt.status != 1:
-            raise Exception("Approval transaction failed.")
-        print(f"Approval successful. TX Hash: {tx_hash.hex()}")
-    else:
+def approve_if_needed(token_contract, amount_wei, signer=None, reserve_spend=None):
+    """
+    Reserves amount_wei from the signer's locally tracked router allowance
+    (the PRIVATE_KEY account by default).
+    If it is short, sends an approval (sized by the ledger's strategy) and
+    returns its hash without waiting for the receipt, so the caller can submit
+    the next transaction right behind it. Returns None when no approval was needed.
+    reserve_spend runs while the ledger is still locked (see AllowanceLedger.ensure).
+    """
+    context = get_context()
+    signer = signer or context.signer_pool.primary
+    ledger = signer.allowance_ledgers[token_contract.address]
+
+    def send_approval(approve_amount):
+        print(f"Tracked allowance ({ledger.available()}) is less than required ({amount_wei}). Approving {approve_amount}...")
+        gas_price = context.chain_cache.gas_price()
+
+        def build_approve_tx(nonce):
+            return token_contract.functions.approve(ROUTER_ADDRESS, approve_amount).build_transaction({
+                "from": signer.address,
+                "nonce": nonce,
+                "gas": 50000,  # Typical gas limit for an ERC-20 approval
+                "gasPrice": gas_price,
+            })
+
+        tx_hash = signer.nonce_manager.send_transaction(build_approve_tx, signer.private_key)
+        print(f"Approval sent. TX Hash: {tx_hash.hex()}")
+        return tx_hash
+
+    tx_hash = ledger.ensure(amount_wei, send_approval, reserve_spend)
+    if tx_hash is None:
         print("Sufficient allowance already set.")
+    return tx_hash
+
+def read_swap_state(context, signer):
+    """
+    Reads the signer's mUSD balance and the gas price, plus the router
+    allowance if the ledger hasn't synced yet. The contract reads share one
+    multicall eth_call, batched with eth_gasPrice when it isn't cached.
+    Served without any RPC when the request's prefetch already has them.
+    """
+    from multicall import erc20_allowance_call, erc20_balance_call
+
+    ledger = signer.allowance_ledgers[MUSD_ADDRESS]
+    gas_price = context.chain_cache.cached_gas_price()
+    snapshot = context.prefetcher.snapshot(signer.address) if context.prefetch_enabled else None
+    if snapshot is not None and gas_price is not None and not ledger.needs_sync():
+        return snapshot.musd_balance, gas_price
+
+    calls = [erc20_balance_call(MUSD_ADDRESS, signer.address)]
+    if ledger.needs_sync():
+        calls.append(erc20_allowance_call(MUSD_ADDRESS, signer.address, ROUTER_ADDRESS))
+    extra = [("eth_gasPrice", [])] if gas_price is None else []
+
+    values, extra_results = context.read_aggregator.read(calls, extra)
+    if len(values) > 1:
+        ledger.sync(values[1])
+    if extra_results:
+        gas_price = int(extra_results[0], 16)
+        context.chain_cache.set_gas_price(gas_price)
+    return values[0], gas_price
+
+def report_approval_receipt(ledger, tx_hash, receipt, error):
+    """
+    Prints the outcome of an approval confirmed by the receipt tracker.
+    """
+    if error is not None or receipt.status != 1:
+        print(f"❌ Approval transaction failed. TX Hash: {tx_hash} {error or ''}")
+        ledger.resync()
+    else:
+        print(f"Approval successful. TX Hash: {tx_hash}")
+
+def report_swap_receipt(ledger, tx_hash, receipt, error):
+    """
+    Prints the outcome of a swap confirmed by the receipt tracker.
+    """
+    if error is not None:
+        print(f"❌ Swap transaction not confirmed: {str(error)}")
+        return
+    print("✅ Swap transaction confirmed!")
+    print(f"  Transaction Hash: {tx_hash}")
+    print(f"  Gas Used: {receipt.gasUsed}")
+    print(f"  Status: {'Success' if receipt.status == 1 else 'Failed'}")
+    if receipt.status != 1:
+        # The local allowance may no longer match the chain
+        ledger.resync()
 
 def swap_musd_for_wrapped_btc(prompt: str) -> str:
     """
@@ -140,6 +183,32 @@ def swap_musd_for_wrapped_btc(prompt: str) -> str:
     if isinstance(transaction_details, str):  # Handle parsing errors
         return transaction_details
 
+    return execute_swap(transaction_details)
+
+def execute_swap(transaction_details) -> str:
+    """
+    Executes a swap from mUSD to Wrapped BTC from already parsed swap details
+    on the least-loaded account of the signer pool. With MEZO_SWAP_BATCH_WINDOW
+    set, the request goes through the swap coalescing queue instead.
+    """
+    if get_context().swap_batch_window > 0:
+        return execute_swap_batched(transaction_details)
+    return execute_swap_now(transaction_details)
+
+def execute_swap_now(transaction_details) -> str:
+    with get_context().signer_pool.assign() as signer:
+        return execute_swap_as(signer, transaction_details)
+
+class SwapError(Exception):
+    """
+    A swap step failed; the message is the user-facing result.
+    """
+
+SentSwap = namedtuple("SentSwap", ["tx_hash", "quote", "approve_future", "swap_future"])
+
+def execute_swap_as(signer, transaction_details) -> str:
+    context = get_context()
+
     # ✅ Step 2: Extract parsed swap details
     amount_musd = float(transaction_details["amount"])
     from_currency = transaction_details["from_currency"].lower()
@@ -154,94 +223,223 @@ def swap_musd_for_wrapped_btc(prompt: str) -> str:
 
     # ✅ Step 4: Convert values to Wei (18 decimals for mUSD and BTC)
     amount_musd_wei = int(amount_musd * 10**18)
-    min_wrapped_btc_wei = int(0.000000000000001 * 10**18)  # Minimal value to prevent failure
+
+    try:
+        sent = send_swap(signer, amount_musd_wei)
+    except SwapError as e:
+        return str(e)
+    tx_hash = sent.tx_hash
+
+    if not context.wait_for_receipts:
+        return f"⏳ Swap submitted! {amount_musd} mUSD for BTC on Dumpy Swap. TX Hash: {tx_hash.hex()} (confirmation will follow)"
+
+    try:
+        wait_for_swap(sent)
+        return f"✅ Swap successful! {amount_musd} mUSD swapped for BTC on Dumpy Swap. TX Hash: {tx_hash.hex()}"
+    except Exception as e:
+        print(f"❌ Swap transaction failed: {str(e)}")
+        return f"❌ Swap transaction failed: {str(e)}"
+
+def send_swap(signer, amount_musd_wei, min_wrapped_btc_wei=None):
+    """
+    Checks the balance, quotes, approves if needed and broadcasts an
+    mUSD → Wrapped BTC swap from signer. Confirmation is left to the
+    receipt futures of the returned SentSwap.
+    The minimum received defaults to the quote minus MEZO_SLIPPAGE_BPS.
+    Raises SwapError with the user-facing message when a step fails.
+    """
+    context = get_context()
+    musd_allowance = signer.allowance_ledgers[MUSD_ADDRESS]
+    amount_musd = amount_musd_wei / 10**18
     deadline = int(time.time()) + 600  # 10-minute transaction deadline
 
-    # ✅ Step 5: Check sender's balance
-    sender_balance = musd_contract.functions.balanceOf(sender_address).call()
+    # ✅ Step 5: Check sender's balance (one multicall, batched with the gas price read)
+    sender_balance, gas_price = read_swap_state(context, signer)
     sender_balance_musd = sender_balance / 10**18
 
     if sender_balance < amount_musd_wei:
-        return f"❌ Insufficient balance! You have {sender_balance_musd} mUSD, but you need {amount_musd} mUSD."
+        raise SwapError(f"❌ Insufficient balance! You have {sender_balance_musd} mUSD, but you need {amount_musd} mUSD.")
 
-    # ✅ Step 6: Approve mUSD spending if needed
-    approve_if_needed(musd_contract, amount_musd_wei)
+    # ✅ Step 6: Quote locally from per-block cached reserves (best path, slippage-protected minimum)
+    try:
+        quote = context.quote_engine.quote(MUSD_ADDRESS, WRAPPED_BTC_ADDRESS, amount_musd_wei)
+    except Exception as e:
+        raise SwapError(f"❌ Could not quote swap: {str(e)}")
+    path = quote.path
+    if min_wrapped_btc_wei is None:
+        min_wrapped_btc_wei = quote.min_amount_out(context.slippage_bps)
+    print(f"Quoted {quote.amount_out / 10**18} BTC over {len(path) - 1} hop(s), "
+          f"minimum {min_wrapped_btc_wei / 10**18} BTC at {context.slippage_bps / 100}% slippage.")
 
-    # ✅ Step 7: Define swap path (mUSD → Wrapped BTC)
-    path = [MUSD_ADDRESS, WRAPPED_BTC_ADDRESS]
+    # ✅ Step 7: Approve mUSD spending if needed (not awaited, swap is pipelined behind it)
+    # The swap nonce is taken under the ledger lock so no later approval can overwrite its allowance first
+    swap_nonce = []
+    try:
+        approve_tx_hash = approve_if_needed(
+            context.musd_contract, amount_musd_wei, signer,
+            reserve_spend=lambda: swap_nonce.append(signer.nonce_manager.allocate()),
+        )
+    except Exception as e:
+        raise SwapError(f"❌ Approval transaction failed: {str(e)}")
 
-    # ✅ Step 8: Get nonce and gas price
-    nonce = web3.eth.get_transaction_count(sender_address)
-    gas_price = web3.eth.gas_price
+    # ✅ Step 8: Gas price was read in step 5 (nonce is allocated locally at send time)
+    sent_txs = []
 
-    try:
-        # ✅ Step 9: Build the swap transaction
-        swap_tx = router_contract.functions.swapExactTokensForTokens(
+    def build_swap_tx(nonce):
+        swap_tx = context.router_contract.functions.swapExactTokensForTokens(
             amount_musd_wei,  # Amount of mUSD to swap
             min_wrapped_btc_wei,  # Minimum Wrapped BTC to receive
             path,  # Swap path
-            sender_address,  # Recipient (sender receives the Wrapped BTC)
+            signer.address,  # Recipient (sender receives the Wrapped BTC)
             deadline  # Deadline for the transaction
         ).build_transaction({
-            "from": sender_address,
+            "from": signer.address,
             "nonce": nonce,
             "gasPrice": gas_price,
+            "gas": 250000,  # Placeholder, replaced by the estimate below
         })
 
-        # ✅ Step 10: Estimate gas and adjust with a buffer
-        estimated_gas = web3.eth.estimate_gas(swap_tx)
-        swap_tx["gas"] = estimated_gas + 10000  # Add buffer
+        sent_txs.append(swap_tx)
 
-        print(f"Estimated gas: {estimated_gas}, using gas limit: {swap_tx['gas']}")
+        if approve_tx_hash is not None:
+            # Estimation would revert until the approval is mined, reuse a cached estimate if we have one
+            swap_tx["gas"] = context.chain_cache.cached_estimate(swap_tx, buffer=10000) or 250000
+            print(f"Approval pending, using gas limit of {swap_tx['gas']}.")
+            return swap_tx
 
-    except Exception as e:
-        print(f"⚠️ Gas estimation failed: {e}. Using default gas limit of 250000.")
-        swap_tx["gas"] = 250000  # Default gas if estimation fails
+        try:
+            # ✅ Step 10: Estimate gas (cached per router, selector and hop count) with a safety margin and buffer
+            swap_tx["gas"] = context.chain_cache.estimate_gas(swap_tx, buffer=10000)
+
+            print(f"Using gas limit: {swap_tx['gas']}")
+
+        except Exception as e:
+            print(f"⚠️ Gas estimation failed: {e}. Using default gas limit of 250000.")
+            swap_tx["gas"] = 250000  # Default gas if estimation fails
+
+        return swap_tx
 
+    # ✅ Step 9-11: Build, sign and send transaction
     try:
-        # ✅ Step 11: Sign and send transaction
-        signed_swap_tx = web3.eth.account.sign_transaction(swap_tx, PRIVATE_KEY)
-        tx_hash = web3.eth.send_raw_transaction(signed_swap_tx.raw_transaction)
+        tx_hash = signer.nonce_manager.send_transaction(build_swap_tx, signer.private_key, nonce=swap_nonce[0])
+    except Exception as e:
+        musd_allowance.release(amount_musd_wei)
+        print(f"❌ Swap transaction failed: {str(e)}")
+        raise SwapError(f"❌ Swap transaction failed: {str(e)}")
 
-        print(f"✅ Swap transaction sent! TX Hash: {tx_hash.hex()}")
+    print(f"✅ Swap transaction sent! TX Hash: {tx_hash.hex()}")
 
-        # ✅ Step 12: Wait for confirmation
-        receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+    # ✅ Step 12: Hand confirmation to the receipt tracker
+    approve_future = None
+    if approve_tx_hash is not None:
+        approve_future = signer.watch(context.receipt_tracker.track(
+            approve_tx_hash, callback=functools.partial(report_approval_receipt, musd_allowance)
+        ))
+    swap_future = signer.watch(context.receipt_tracker.track(
+        tx_hash, callback=functools.partial(report_swap_receipt, musd_allowance)
+    ))
+    # Our own swap moves the pool, don't quote the next one from stale reserves
+    swap_future.add_done_callback(lambda done: context.quote_engine.invalidate())
+    # Refresh the cached estimate if this swap runs out of gas
+    swap_future.add_done_callback(
+        lambda done: done.exception() or context.chain_cache.check_receipt(sent_txs[-1], done.result())
+    )
+    return SentSwap(tx_hash, quote, approve_future, swap_future)
+
+def wait_for_swap(sent):
+    """
+    Waits for the approval (if any) and the swap to be mined and returns the
+    swap receipt. Raises if the approval failed.
+    """
+    with tracer.span("receipt_wait") as span:
+        if sent.approve_future is not None and sent.approve_future.result().status != 1:
+            span.outcome = "error"
+            raise Exception("Approval transaction failed.")
+        receipt = sent.swap_future.result()
+        if receipt.status != 1:
+            span.outcome = "error"
+        return receipt
 
-        print("✅ Swap transaction confirmed!")
-        print(f"  Transaction Hash: {receipt.transactionHash.hex()}")
-        print(f"  Gas Used: {receipt.gasUsed}")
-        print(f"  Status: {'Success' if receipt.status == 1 else 'Failed'}")
+#Swap coalescing (concurrent small swaps share one router call)
+@functools.lru_cache(maxsize=None)
+def get_swap_batcher():
+    from swap_batcher import SwapBatcher
 
-        return f"✅ Swap successful! {amount_musd} mUSD swapped for BTC on Dumpy Swap. TX Hash: {tx_hash.hex()}"
+    context = get_context()
+    return SwapBatcher(
+        execute_swap_now, execute_swap_batch, window=context.swap_batch_window, max_batch=context.swap_batch_max
+    )
 
+def execute_swap_batch(amount_musd_wei):
+    """
+    Swaps the summed amount of a batch in one router call and returns
+    (tx hash, Wrapped BTC received).
+    """
+    from swap_batcher import transferred_to
+
+    with get_context().signer_pool.assign() as signer:
+        sent = send_swap(signer, amount_musd_wei)
+        receipt = wait_for_swap(sent)
+    if receipt.status != 1:
+        raise SwapError(f"❌ Batched swap reverted. TX Hash: {sent.tx_hash.hex()}")
+    return sent.tx_hash.hex(), transferred_to(receipt, WRAPPED_BTC_ADDRESS, signer.address)
+
+def execute_swap_batched(transaction_details) -> str:
+    """
+    Queues the swap for coalescing. Requests that share a batch are swapped
+    in one router call and each gets its pro-rata share of the output; a
+    request alone in its window runs as a regular swap. Batched requests
+    always wait for the receipt, since the shares come from the actual output.
+    """
+    amount_musd = float(transaction_details["amount"])
+    if transaction_details["from_currency"].lower() != "musd" or transaction_details["to_currency"].lower() != "btc":
+        return "❌ This function only supports swapping mUSD for BTC."
+
+    try:
+        result = get_swap_batcher().submit(int(amount_musd * 10**18), transaction_details).result()
+    except SwapError as e:
+        return str(e)
     except Exception as e:
         print(f"❌ Swap transaction failed: {str(e)}")
         return f"❌ Swap transaction failed: {str(e)}"
+    if isinstance(result, str):
+        return result
+    return (f"✅ Swap successful! {amount_musd} mUSD swapped for {result.amount_out / 10**18} BTC on Dumpy Swap "
+            f"(batched with {result.batch_size - 1} other request(s)). TX Hash: {result.tx_hash}")
+
 #Define Structured Output Parser Schema 
 response_schemas = [
-    ResponseSchema(name="amount", description="The amount of cryptocurrency to transfer."),
-    ResponseSchema(name="currency", description="The cryptocurrency to transfer (BTC, mUSD, ect.)"),
-    ResponseSchema(name="recipient", description="The recipient's Mezo address."),
+    ("amount", "The amount of cryptocurrency to transfer."),
+    ("currency", "The cryptocurrency to transfer (BTC, mUSD, ect.)"),
+    ("recipient", "The recipient's Mezo address."),
 ]
 
-output_parser = StructuredOutputParser.from_response_schemas(response_schemas=response_schemas)
-
-#Define LLM and Prompt for Parsing Transactions
-llm = ChatOpenAI(temperature=0, openai_api_key=OpenAI_API_KEY)
+#Define Prompt for Parsing Transactions
+TRANSACTION_PROMPT = "Extract transaction details from this request:\n{input}\n{format_instructions}"
 
-prompt_template = PromptTemplate(
-    template = "Extract transaction details from this request:\n{input}\n{format_instructions}",
-    input_variables=["input"],
-    partial_variables={"format_instructions": output_parser.get_format_instructions()},
-)
+@functools.lru_cache(maxsize=None)
+def transaction_parsing():
+    return build_parsing(response_schemas, TRANSACTION_PROMPT)
 
 def extract_transaction_details(prompt:str):
-    formatted_prompt = prompt_template.format(input=prompt)
-    response = llm.invoke(formatted_prompt)
+    context = get_context()
+    fast_result = context.fast_parser.parse_transfer(prompt)
+    if fast_result is not None:
+        return fast_result
+
+    return context.intent_cache.get_or_compute(
+        "transfer", transaction_parsing().schema_version, prompt, llm_extract_transaction_details
+    )
+
+def llm_extract_transaction_details(prompt: str):
+    parsing = transaction_parsing()
+    formatted_prompt = parsing.prompt_template.format(input=prompt)
+    with tracer.span("llm"):
+        response = get_context().llm.invoke(formatted_prompt)
 
     try:
-        extracted_data = output_parser.parse(response.content)
+        with tracer.span("parse_output"):
+            extracted_data = parsing.output_parser.parse(response.content)
         return extracted_data
     except Exception as e:
         return f"Failed to extract transaction details: {str(e)}"
@@ -252,7 +450,14 @@ def mezo_agent_transaction_btc(prompt: str) -> str:
 
     if isinstance(transaction_details, str):
         return transaction_details
-    
+
+    return execute_btc_transfer(transaction_details)
+
+def execute_btc_transfer(transaction_details) -> str:
+    with get_context().signer_pool.assign() as signer:
+        return execute_btc_transfer_as(signer, transaction_details)
+
+def execute_btc_transfer_as(signer, transaction_details) -> str:
     amount = float(transaction_details["amount"])
     currency = transaction_details["currency"].lower()
     recipient = transaction_details["recipient"]
@@ -260,23 +465,23 @@ def mezo_agent_transaction_btc(prompt: str) -> str:
     if currency != "btc":
         return "This function only handles BTC transactions."
     
-    amount_wei = web3.to_wei(amount, "ether")
-    nonce = web3.eth.get_transaction_count(sender_address)
-    gas_price = web3.eth.gas_price
-    gas_limit = web3.eth.estimate_gas({"to": recipient, "value": amount_wei, "from": sender_address})
-
-    tx = {
-        "to": recipient,
-        "value": amount_wei,
-        "gas": gas_limit,
-        "gasPrice": gas_price,
-        "nonce": nonce,
-        "chainId": 31611,
-    }
+    context = get_context()
+    amount_wei = context.web3.to_wei(amount, "ether")
+    gas_price = context.chain_cache.gas_price()
+    gas_limit = context.chain_cache.estimate_gas({"to": recipient, "value": amount_wei, "from": signer.address})
+
+    def build_tx(nonce):
+        return {
+            "to": recipient,
+            "value": amount_wei,
+            "gas": gas_limit,
+            "gasPrice": gas_price,
+            "nonce": nonce,
+            "chainId": CHAIN_ID,
+        }
 
     try:
-        signed_tx = account.sign_transaction(tx)
-        tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        tx_hash = signer.nonce_manager.send_transaction(build_tx, signer.private_key)
         return f"✅ BTC transaction successful! Hash: {tx_hash.hex()}"
     except Exception as e:
         return f"❌ Transaction failed: {str(e)}"
@@ -288,6 +493,13 @@ def mezo_agent_transaction_musd(prompt: str) -> str:
     if isinstance(transaction_details, str):  # Error handling
         return transaction_details
 
+    return execute_musd_transfer(transaction_details)
+
+def execute_musd_transfer(transaction_details) -> str:
+    with get_context().signer_pool.assign() as signer:
+        return execute_musd_transfer_as(signer, transaction_details)
+
+def execute_musd_transfer_as(signer, transaction_details) -> str:
     amount = float(transaction_details["amount"])
     currency = transaction_details["currency"].lower()
     recipient = transaction_details["recipient"]
@@ -295,56 +507,697 @@ def mezo_agent_transaction_musd(prompt: str) -> str:
     if currency != "musd":
         return "This function only handles mUSD transactions."
 
+    context = get_context()
     amount_musd_wei = int(amount * 10**18)
-    nonce = web3.eth.get_transaction_count(sender_address)
-    gas_price = web3.eth.gas_price
+    gas_price = context.chain_cache.gas_price()
 
-    try:
-        txn = musd_contract.functions.transfer(recipient, amount_musd_wei).build_transaction({
-            "from": sender_address,
+    def build_txn(nonce):
+        return context.musd_contract.functions.transfer(recipient, amount_musd_wei).build_transaction({
+            "from": signer.address,
             "nonce": nonce,
             "gas": 50000,
             "gasPrice": gas_price,
         })
 
-        signed_txn = web3.eth.account.sign_transaction(txn, account.key)
-        tx_hash = web3.eth.send_raw_transaction(signed_txn.raw_transaction)
+    try:
+        tx_hash = signer.nonce_manager.send_transaction(build_txn, signer.private_key)
 
         return f"✅ mUSD Transaction successful! Hash: {tx_hash.hex()}"
     except Exception as e:
         return f"❌ Transaction failed: {str(e)}"
 
 
+#Balance Query Function (one multicall for token balances + native BTC balance)
+def mezo_agent_balance(prompt: str = "") -> str:
+    return execute_balance_query({"query": "balance"})
+
+def format_balances(btc_balance, musd_balance, wrapped_btc_balance) -> str:
+    return f"{btc_balance / 10**18} BTC, {musd_balance / 10**18} mUSD, {wrapped_btc_balance / 10**18} Wrapped BTC"
+
+def execute_balance_query(transaction_details=None) -> str:
+    """
+    Reports the balances of every account in the signer pool: one line for
+    a single account, otherwise the total followed by a line per account.
+    """
+    from multicall import erc20_balance_call
+
+    context = get_context()
+    addresses = [signer.address for signer in context.signer_pool.signers]
+    snapshots = [context.prefetcher.snapshot(address) for address in addresses] if context.prefetch_enabled else [None]
+    if all(snapshot is not None for snapshot in snapshots):
+        balances = [(snapshot.btc_balance, snapshot.musd_balance, snapshot.wrapped_btc_balance) for snapshot in snapshots]
+    else:
+        try:
+            # Every account's token balances share one multicall, native balances ride in the same batch
+            token_balances, btc_balances = context.read_aggregator.read(
+                [call for address in addresses for call in (
+                    erc20_balance_call(MUSD_ADDRESS, address), erc20_balance_call(WRAPPED_BTC_ADDRESS, address)
+                )],
+                [("eth_getBalance", [address, "latest"]) for address in addresses],
+            )
+        except Exception as e:
+            return f"❌ Balance query failed: {str(e)}"
+        balances = [
+            (int(btc_balance, 16), token_balances[2 * index], token_balances[2 * index + 1])
+            for index, btc_balance in enumerate(btc_balances)
+        ]
+
+    if len(addresses) == 1:
+        return f"💰 Balances for {addresses[0]}: {format_balances(*balances[0])}"
+    totals = [sum(column) for column in zip(*balances)]
+    lines = [f"💰 Balances across {len(addresses)} accounts: {format_balances(*totals)}"]
+    lines += [f"  {address}: {format_balances(*balance)}" for address, balance in zip(addresses, balances)]
+    return "\n".join(lines)
+
+
+#History and Indexed Balance Functions (served from the local event index)
+def get_event_indexer():
+    """
+    Returns the event indexer, running a first sync if nothing is indexed yet.
+    """
+    indexer = get_context().event_indexer
+    if indexer.last_block() is None:
+        print("Building the local event index (first run)...")
+        indexer.sync()
+    return indexer
+
+def mezo_agent_history(prompt: str) -> str:
+    filters = get_context().fast_parser.parse_history(prompt) or {}
+    return execute_history_query(filters)
+
+def execute_history_query(transaction_details) -> str:
+    """
+    Lists recent activity of every account in the signer pool, newest first.
+    Lines are labelled with their account when the pool has more than one.
+    """
+    context = get_context()
+    try:
+        indexer = get_event_indexer()
+    except Exception as e:
+        return f"❌ History lookup failed: {str(e)}"
+
+    addresses = [signer.address for signer in context.signer_pool.signers]
+    lookback = transaction_details.get("lookback_seconds")
+    entries = []
+    for address in addresses:
+        entries += [(address, entry) for entry in indexer.history(
+            address,
+            direction=transaction_details.get("direction"),
+            token="Wrapped BTC" if transaction_details.get("currency") == "BTC" else transaction_details.get("currency"),
+            since=int(time.time() - lookback) if lookback else None,
+            counterparty=transaction_details.get("counterparty"),
+        )]
+    if not entries:
+        return f"📭 No matching activity found (indexed through block {indexer.last_block()})."
+    entries = sorted(entries, key=lambda item: item[1].block_number, reverse=True)[:20]
+
+    lines = []
+    for address, entry in entries:
+        when = time.strftime("%Y-%m-%d %H:%M", time.gmtime(entry.timestamp))
+        if len(addresses) > 1:
+            when += f" [{address}]"
+        if entry.kind == "swap":
+            lines.append(f"{when} swapped {entry.amount / 10**18} {entry.token} for {entry.amount_out / 10**18} {entry.token_out} ({entry.tx_hash})")
+        elif entry.kind == "out":
+            lines.append(f"{when} sent {entry.amount / 10**18} {entry.token} to {entry.counterparty} ({entry.tx_hash})")
+        else:
+            lines.append(f"{when} received {entry.amount / 10**18} {entry.token} from {entry.counterparty} ({entry.tx_hash})")
+    owner = addresses[0] if len(addresses) == 1 else f"{len(addresses)} accounts"
+    return f"📜 Activity for {owner} (indexed through block {indexer.last_block()}):\n" + "\n".join(lines)
+
+def mezo_agent_indexed_balance(prompt: str = "") -> str:
+    context = get_context()
+    addresses = [signer.address for signer in context.signer_pool.signers]
+    try:
+        indexer = get_event_indexer()
+        per_account = [indexer.balances(address) for address in addresses]
+    except Exception as e:
+        return f"❌ Indexed balance lookup failed: {str(e)}"
+    last_block = min(last_block for _, last_block in per_account)
+
+    def shown(balances):
+        return ", ".join(f"{amount / 10**18} {token}" for token, amount in balances.items())
+
+    if len(addresses) == 1:
+        return f"💰 Indexed token balances for {addresses[0]} as of block {last_block}: {shown(per_account[0][0])}"
+    totals = {}
+    for balances, _ in per_account:
+        for token, amount in balances.items():
+            totals[token] = totals.get(token, 0) + amount
+    lines = [f"💰 Indexed token balances across {len(addresses)} accounts as of block {last_block}: {shown(totals)}"]
+    lines += [f"  {address}: {shown(balances)}" for address, (balances, _) in zip(addresses, per_account)]
+    return "\n".join(lines)
+
+
+#Bulk Transfer Function (many recipients, one signing/submission pipeline)
+bulk_response_schemas = [
+    ("payouts", "A JSON list with one {\"recipient\", \"amount\", \"currency\"} object per payment (currency is BTC or mUSD)."),
+]
+
+BULK_PROMPT = """
+    Extract every payment from this request, one entry per recipient:
+    {input}
+
+    {format_instructions}
+    """
+
+@functools.lru_cache(maxsize=None)
+def bulk_parsing():
+    return build_parsing(bulk_response_schemas, BULK_PROMPT)
+
+def extract_bulk_payouts(prompt: str):
+    """
+    Reads payout rows from a CSV/JSON file path, inline CSV/JSON or a plain
+    instruction; falls back to the LLM only when none of those parse.
+    """
+    from bulk_transfer import load_payout_rows
+
+    try:
+        rows = load_payout_rows(prompt)
+    except Exception as e:
+        return f"Failed to read payouts: {str(e)}"
+    if rows is not None:
+        return {"payouts": rows}
+
+    return get_context().intent_cache.get_or_compute(
+        "bulk", bulk_parsing().schema_version, prompt, llm_extract_bulk_payouts
+    )
+
+def llm_extract_bulk_payouts(prompt: str):
+    import json
+
+    parsing = bulk_parsing()
+    formatted_prompt = parsing.prompt_template.format(input=prompt)
+    with tracer.span("llm"):
+        response = get_context().llm.invoke(formatted_prompt)
+
+    try:
+        with tracer.span("parse_output"):
+            extracted_data = parsing.output_parser.parse(response.content)
+        if isinstance(extracted_data["payouts"], str):
+            extracted_data["payouts"] = json.loads(extracted_data["payouts"])
+        return extracted_data
+    except Exception as e:
+        return f"Failed to extract payouts: {str(e)}"
+
+def mezo_agent_bulk_transfer(prompt: str) -> str:
+    transaction_details = extract_bulk_payouts(prompt)
+
+    if isinstance(transaction_details, str):
+        return transaction_details
+
+    return execute_bulk_transfer(transaction_details)
+
+def execute_bulk_transfer(transaction_details) -> str:
+    """
+    Validates every payout, then signs and submits them all from one account
+    of the signer pool with consecutive nonces.
+    """
+    from bulk_transfer import validate_payouts
+
+    payouts, errors = validate_payouts(transaction_details.get("payouts") or [])
+    if errors:
+        shown = "\n".join(errors[:20]) + (f"\n... and {len(errors) - 20} more" if len(errors) > 20 else "")
+        return f"❌ Bulk transfer rejected, nothing was sent:\n{shown}"
+
+    with get_context().signer_pool.assign() as signer:
+        return execute_bulk_transfer_as(signer, payouts)
+
+def fill_nonce_gaps(signer, nonces, gas_price):
+    """
+    Sends a 0-value self-transfer at each nonce whose transaction was
+    rejected, so the transfers queued behind it can be mined.
+    Returns the nonces that are still open.
+    """
+    from bulk_transfer import build_gap_filler_tx, sign_all, submit_raw_transactions
+    from nonce_manager import is_nonce_conflict
+
+    if not nonces:
+        return []
+    txs = [build_gap_filler_tx(signer.address, nonce, gas_price, CHAIN_ID) for nonce in nonces]
+    results = submit_raw_transactions(get_context().web3, sign_all(txs, signer.private_key))
+    open_gaps = []
+    for nonce, (tx_hash, error) in zip(nonces, results):
+        if error is None:
+            print(f"Filled nonce gap {nonce} with a 0-value self-transfer. TX Hash: {tx_hash}")
+            signer.nonce_manager.watch(tx_hash, nonce)
+        elif not is_nonce_conflict(error):
+            # Kept in flight so a resync can't hand it out, the transfers behind it stay pending
+            print(f"⚠️ Could not fill nonce gap {nonce}: {error}")
+            open_gaps.append(nonce)
+    return open_gaps
+
+def execute_bulk_transfer_as(signer, payouts) -> str:
+    from bulk_transfer import (
+        BTC_TRANSFER_GAS, MUSD_TRANSFER_GAS, build_transfer_tx, sign_all, split_rejected, submit_raw_transactions,
+    )
+    from multicall import erc20_balance_call
+    from nonce_manager import is_nonce_conflict
+
+    context = get_context()
+    print(f"📦 Bulk transfer of {len(payouts)} payouts from {signer.address}")
+
+    # ✅ Step 1: Check both balances (and the gas price) in one request before signing anything
+    total_btc = sum(p.amount_wei for p in payouts if p.currency == "BTC")
+    total_musd = sum(p.amount_wei for p in payouts if p.currency == "mUSD")
+    try:
+        (musd_balance,), (btc_balance, gas_price) = context.read_aggregator.read(
+            [erc20_balance_call(MUSD_ADDRESS, signer.address)],
+            [("eth_getBalance", [signer.address, "latest"]), ("eth_gasPrice", [])],
+        )
+    except Exception as e:
+        return f"❌ Bulk transfer failed: {str(e)}"
+    btc_balance, gas_price = int(btc_balance, 16), int(gas_price, 16)
+    gas_cost = gas_price * sum(BTC_TRANSFER_GAS if p.currency == "BTC" else MUSD_TRANSFER_GAS for p in payouts)
+
+    if musd_balance < total_musd:
+        return f"❌ Insufficient balance! You have {musd_balance / 10**18} mUSD, but the payouts need {total_musd / 10**18} mUSD."
+    if btc_balance < total_btc + gas_cost:
+        return (f"❌ Insufficient balance! You have {btc_balance / 10**18} BTC, but the payouts and gas "
+                f"need {(total_btc + gas_cost) / 10**18} BTC.")
+
+    # ✅ Step 2: Reserve consecutive nonces and build + sign every transaction locally
+    nonces = signer.nonce_manager.allocate_many(len(payouts))
+    try:
+        txs = [build_transfer_tx(p, nonce, gas_price, CHAIN_ID, MUSD_ADDRESS) for p, nonce in zip(payouts, nonces)]
+        raw_txs = sign_all(txs, signer.private_key, workers=context.bulk_sign_workers)
+    except Exception as e:
+        for nonce in reversed(nonces):
+            signer.nonce_manager.release(nonce)
+        return f"❌ Bulk transfer failed while signing: {str(e)}"
+
+    # ✅ Step 3: Submit back-to-back in batched requests
+    results = submit_raw_transactions(context.web3, raw_txs)
+    failed = [(p, error) for p, (_, error) in zip(payouts, results) if error is not None]
+
+    # ✅ Step 4: Settle rejected nonces ourselves, a resync could hand them to another request.
+    # Unsent ones at the end go back to the pool; a gap that later transfers queue behind is plugged.
+    gaps, tail = split_rejected(results)
+    for index in reversed(tail):
+        if not is_nonce_conflict(results[index][1]):
+            signer.nonce_manager.release(nonces[index])
+    open_gaps = fill_nonce_gaps(
+        signer, [nonces[index] for index in gaps if not is_nonce_conflict(results[index][1])], gas_price
+    )
+    first_gap = min(open_gaps) if open_gaps else None
+
+    # ✅ Step 5: Track every receipt through the shared tracker
+    tracked, blocked = [], []
+    for p, nonce, (tx_hash, error) in zip(payouts, nonces, results):
+        if error is not None:
+            continue
+        signer.nonce_manager.watch(tx_hash, nonce)
+        future = signer.watch(context.receipt_tracker.track(tx_hash))
+        if first_gap is not None and nonce > first_gap:
+            blocked.append((p, tx_hash))
+        else:
+            tracked.append((p, tx_hash, future))
+    print(f"Submitted {len(tracked) + len(blocked)}/{len(payouts)} transfers.")
+
+    failure_lines = [f"{p.amount} {p.currency} to {p.recipient}: {error}" for p, error in failed[:20]]
+    failure_lines += [
+        f"{p.amount} {p.currency} to {p.recipient}: pending behind nonce gap {first_gap} (TX Hash: {tx_hash})"
+        for p, tx_hash in blocked[:20]
+    ]
+    if not context.wait_for_receipts:
+        summary = (f"⏳ Bulk transfer submitted! {len(tracked) + len(blocked)}/{len(payouts)} transfers sent "
+                   f"(confirmations will follow).")
+        return "\n".join([summary] + failure_lines)
+
+    confirmed = 0
+    with tracer.span("receipt_wait", count=len(tracked)) as span:
+        for p, tx_hash, future in tracked:
+            try:
+                receipt = future.result()
+            except Exception as e:
+                failure_lines.append(f"{p.amount} {p.currency} to {p.recipient}: not confirmed ({str(e)})")
+                continue
+            if receipt.status == 1:
+                confirmed += 1
+            else:
+                failure_lines.append(f"{p.amount} {p.currency} to {p.recipient}: reverted (TX Hash: {tx_hash})")
+        if confirmed < len(tracked) or blocked:
+            span.outcome = "error"
+
+    status = "✅" if confirmed == len(payouts) else "⚠️"
+    summary = f"{status} Bulk transfer complete! {confirmed}/{len(payouts)} transfers confirmed."
+    return "\n".join([summary] + failure_lines[:20])
+
+
+#Single-call intent routing (one LLM call returns intent + arguments)
+intent_response_schemas = [
+    ("intent", "One of 'btc_transfer', 'musd_transfer', 'bulk_transfer', 'swap', 'balance', 'history' or 'unknown'."),
+    ("amount", "The amount of cryptocurrency to transfer or swap."),
+    ("currency", "The cryptocurrency to transfer or swap from (BTC or mUSD)."),
+    ("to_currency", "The token to receive for swaps (BTC), empty otherwise."),
+    ("recipient", "The recipient's Mezo address for transfers, empty for swaps."),
+]
+
+INTENT_PROMPT = """
+    Classify this Mezo wallet request and extract its details:
+    {input}
+
+    - Use 'btc_transfer' for sending BTC and 'musd_transfer' for sending mUSD to an address.
+    - Use 'bulk_transfer' for payments to several recipients or from a CSV/JSON payout file.
+    - Use 'swap' for swapping mUSD for BTC via Dumpy Swap.
+    - Use 'balance' for questions about the wallet's balances.
+    - Use 'history' for questions about past transfers or swaps.
+    - Use 'unknown' for anything else.
+
+    {format_instructions}
+    """
+
+@functools.lru_cache(maxsize=None)
+def intent_parsing():
+    return build_parsing(intent_response_schemas, INTENT_PROMPT)
+
+INTENT_EXECUTORS = {
+    "btc_transfer": execute_btc_transfer,
+    "musd_transfer": execute_musd_transfer,
+    "bulk_transfer": execute_bulk_transfer,
+    "swap": execute_swap,
+    "balance": execute_balance_query,
+    "history": execute_history_query,
+}
+
+def route_intent(prompt: str):
+    """
+    Resolves a user request to (intent, details) with at most one LLM call.
+    Details have the same shape as the per-tool extractors return.
+    Returns an error string if the model response can't be parsed.
+    """
+    context = get_context()
+    # History questions first, so "did I swap 5 mUSD for BTC?" never executes a swap
+    fast_result = context.fast_parser.parse_history(prompt)
+    if fast_result is not None:
+        return "history", fast_result
+    fast_result = context.fast_parser.parse_swap(prompt)
+    if fast_result is not None:
+        return "swap", fast_result
+    fast_result = context.fast_parser.parse_transfer(prompt)
+    if fast_result is not None:
+        return f"{fast_result['currency'].lower()}_transfer", fast_result
+    fast_result = fast_parse_bulk(prompt)
+    if fast_result is not None:
+        return "bulk_transfer", fast_result
+    fast_result = context.fast_parser.parse_balance(prompt)
+    if fast_result is not None:
+        return "balance", fast_result
+
+    extracted_data = context.intent_cache.get_or_compute(
+        "intent", intent_parsing().schema_version, prompt, llm_route_intent
+    )
+    if isinstance(extracted_data, str):
+        return extracted_data
+
+    intent = str(extracted_data.get("intent", "unknown")).strip().lower()
+    if intent == "swap":
+        return intent, {
+            "amount": extracted_data["amount"],
+            "from_currency": extracted_data["currency"],
+            "to_currency": extracted_data["to_currency"] or "BTC",
+            "router_address": ROUTER_ADDRESS,
+        }
+    if intent in ("btc_transfer", "musd_transfer"):
+        return intent, {
+            "amount": extracted_data["amount"],
+            "currency": extracted_data["currency"],
+            "recipient": extracted_data["recipient"],
+        }
+    if intent == "bulk_transfer":
+        payouts = extract_bulk_payouts(prompt)
+        return payouts if isinstance(payouts, str) else (intent, payouts)
+    if intent == "balance":
+        return intent, {"query": "balance"}
+    if intent == "history":
+        return intent, {}
+    return "unknown", extracted_data
+
+def fast_parse_bulk(prompt: str):
+    """
+    Recognizes payout files and instructions that pay more than one recipient.
+    """
+    from bulk_transfer import load_payout_rows
+
+    try:
+        rows = load_payout_rows(prompt)
+    except Exception:
+        return None
+    if rows is None or (len(rows) < 2 and not prompt.strip().lower().endswith((".csv", ".json"))):
+        return None
+    return {"payouts": rows}
+
+def llm_route_intent(prompt: str):
+    parsing = intent_parsing()
+    formatted_prompt = parsing.prompt_template.format(input=prompt)
+    with tracer.span("llm"):
+        response = get_context().llm.invoke(formatted_prompt)
+
+    try:
+        with tracer.span("parse_output"):
+            return parsing.output_parser.parse(response.content)
+    except Exception as e:
+        return f"Failed to extract request details: {str(e)}"
+
+
+#Per-tool latency spans
+def run_tool(name, func, *args):
+    """
+    Runs a tool under a tracing span tagged with its name; "❌" results
+    are recorded as errors.
+    """
+    with tracer.tool(name) as span:
+        result = func(*args)
+        if isinstance(result, str) and result.startswith("❌"):
+            span.outcome = "error"
+        return result
+
+def traced_tool(name, func):
+    return functools.partial(run_tool, name, func)
+
 #Define Mezo Agent LangChain Tools 
-mezo_agent_transaction_tool_btc = Tool(
-    name="Mezo BTC Transaction Tool",
-    func=mezo_agent_transaction_btc,
-    description="Send BTC on Mezo Matsnet. Example: 'Send 0.01 BTC to 0xABC123...'."
-)
-
-mezo_agent_transaction_tool_musd = Tool(
-    name="Mezo mUSD Transaction Tool",
-    func=mezo_agent_transaction_musd,
-    description="Transfer mUSD on Mezo Matsnet. Example: 'Transfer 100 mUSD to 0xABC123...'."
-)
-
-mezo_agent_musd_to_btc_dumpy_tool = Tool(
-    name="Mezo mUSD to BTC Dumpy Swap Tool",
-    func=swap_musd_for_wrapped_btc,
-    description="Swap mUSD for Wrapped BTC using the Dumpy Swap router."
-)
-
-#Initialize Mezo Baller Agent
-agent = initialize_agent(
-    tools=[mezo_agent_transaction_tool_btc, mezo_agent_transaction_tool_musd, mezo_agent_musd_to_btc_dumpy_tool],
-    llm=llm,
-    agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-    verbose=True
-)
+@functools.lru_cache(maxsize=None)
+def build_tools():
+    from langchain.tools import Tool
+
+    mezo_agent_transaction_tool_btc = Tool(
+        name="Mezo BTC Transaction Tool",
+        func=traced_tool("btc_transfer", mezo_agent_transaction_btc),
+        description="Send BTC on Mezo Matsnet. Example: 'Send 0.01 BTC to 0xABC123...'."
+    )
+
+    mezo_agent_transaction_tool_musd = Tool(
+        name="Mezo mUSD Transaction Tool",
+        func=traced_tool("musd_transfer", mezo_agent_transaction_musd),
+        description="Transfer mUSD on Mezo Matsnet. Example: 'Transfer 100 mUSD to 0xABC123...'."
+    )
+
+    mezo_agent_musd_to_btc_dumpy_tool = Tool(
+        name="Mezo mUSD to BTC Dumpy Swap Tool",
+        func=traced_tool("swap", swap_musd_for_wrapped_btc),
+        description="Swap mUSD for Wrapped BTC using the Dumpy Swap router."
+    )
+
+    mezo_agent_bulk_transfer_tool = Tool(
+        name="Mezo Bulk Transfer Tool",
+        func=traced_tool("bulk_transfer", mezo_agent_bulk_transfer),
+        description="Pay many recipients at once in BTC and/or mUSD. Input is the payment instruction, "
+                    "or a path to a CSV/JSON file of recipient, amount, currency rows."
+    )
+
+    mezo_agent_history_tool = Tool(
+        name="Mezo History Tool",
+        func=traced_tool("history", mezo_agent_history),
+        description="Look up the wallet's past transfers and swaps (e.g. 'what did I send last week') from the local index."
+    )
+
+    mezo_agent_indexed_balance_tool = Tool(
+        name="Mezo Indexed Balance Tool",
+        func=traced_tool("indexed_balance", mezo_agent_indexed_balance),
+        description="Get the wallet's mUSD and Wrapped BTC balances instantly from the local index, without live RPC calls."
+    )
+
+    mezo_agent_balance_tool = Tool(
+        name="Mezo Balance Tool",
+        func=traced_tool("balance", mezo_agent_balance),
+        description="Check the agent wallet's BTC, mUSD and Wrapped BTC balances on Mezo Matsnet."
+    )
+
+    return [
+        mezo_agent_transaction_tool_btc,
+        mezo_agent_transaction_tool_musd,
+        mezo_agent_musd_to_btc_dumpy_tool,
+        mezo_agent_bulk_transfer_tool,
+        mezo_agent_balance_tool,
+        mezo_agent_indexed_balance_tool,
+        mezo_agent_history_tool,
+    ]
+
+#Initialize Mezo Baller Agent (built on first use)
+@functools.lru_cache(maxsize=None)
+def get_agent():
+    from langchain.agents import initialize_agent, AgentType
+
+    return initialize_agent(
+        tools=build_tools(),
+        llm=get_context().llm,
+        agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+        verbose=True
+    )
+
+#Intents whose tools use the speculatively prefetched sender state
+PREFETCH_INTENTS = ("btc_transfer", "musd_transfer", "bulk_transfer", "swap", "balance")
+
+def start_prefetch():
+    """
+    Starts reading sender state in the background so it overlaps with the LLM call.
+    """
+    context = get_context()
+    return context.prefetcher.start() if context.prefetch_enabled else None
+
+def finish_prefetch(prefetch, intent, routed_at):
+    """
+    Reports how much chain latency the prefetch hid behind intent parsing.
+    """
+    if prefetch is None:
+        return
+    # The ReAct agent picks its tools itself, count the prefetch as used if one of them took the snapshot
+    used = prefetch.served if intent == "agent" else intent in PREFETCH_INTENTS
+    saved = get_context().prefetcher.finish(prefetch, routed_at, used)
+    if used:
+        print(f"⚡ Prefetch overlapped {saved * 1000:.0f} ms of chain reads with intent parsing.")
+
+def run_request(user_input: str) -> str:
+    """
+    Serves one user request. In router mode the intent and arguments come from
+    a single routing call and the tool runs directly; unknown intents fall back
+    to the ReAct agent. Sender state is prefetched while the request is parsed.
+    """
+    context = get_context()
+    with context.tracer.request():
+        prefetch = start_prefetch()
+        if context.agent_mode == "router":
+            with tracer.span("route"):
+                routed = route_intent(user_input)
+            finish_prefetch(prefetch, None if isinstance(routed, str) else routed[0], time.perf_counter())
+            if isinstance(routed, str):
+                return routed
+            intent, details = routed
+            if intent in INTENT_EXECUTORS:
+                return run_tool(intent, INTENT_EXECUTORS[intent], details)
+            prefetch = None  # Already reported after routing
+        try:
+            with tracer.tool("agent"):
+                return get_agent().run(user_input)
+        finally:
+            finish_prefetch(prefetch, "agent", time.perf_counter())
+
+#Async execution engine (concurrent pre-flight reads, many requests per event loop)
+ASYNC_INTENT_EXECUTORS = {
+    "btc_transfer": "execute_btc_transfer",
+    "musd_transfer": "execute_musd_transfer",
+    "swap": "execute_swap",
+}
+
+async def arun_request(user_input: str) -> str:
+    """
+    Async counterpart of run_request. Routing and the ReAct fallback run in
+    worker threads; routed tools run on the event loop via AsyncWeb3.
+    """
+    import asyncio
+
+    context = get_context()
+    with context.tracer.request():
+        prefetch = start_prefetch()
+        if context.agent_mode == "router":
+            with tracer.span("route"):
+                routed = await asyncio.to_thread(route_intent, user_input)
+            finish_prefetch(prefetch, None if isinstance(routed, str) else routed[0], time.perf_counter())
+            if isinstance(routed, str):
+                return routed
+            intent, details = routed
+            # Coalesced swaps go through the shared (thread-based) batching queue
+            if intent in ASYNC_INTENT_EXECUTORS and not (intent == "swap" and context.swap_batch_window > 0):
+                with tracer.tool(intent) as span:
+                    result = await getattr(context.async_tools, ASYNC_INTENT_EXECUTORS[intent])(details)
+                    if result.startswith("❌"):
+                        span.outcome = "error"
+                    return result
+            if intent in INTENT_EXECUTORS:
+                return await asyncio.to_thread(run_tool, intent, INTENT_EXECUTORS[intent], details)
+            prefetch = None  # Already reported after routing
+        try:
+            with tracer.tool("agent"):
+                return await asyncio.to_thread(get_agent().run, user_input)
+        finally:
+            finish_prefetch(prefetch, "agent", time.perf_counter())
+
+async def aserve_requests(user_inputs):
+    """
+    Serves many user requests concurrently on one event loop.
+    """
+    import asyncio
+
+    return await asyncio.gather(*(arun_request(user_input) for user_input in user_inputs))
+
+#Build everything a request needs before the first one arrives
+def warm_up():
+    """
+    Connects to the RPC and builds the LLM, parsers, signer pool, tools and
+    ReAct agent up front, so the first request of a long-running process
+    doesn't pay for them.
+    """
+    context = get_context()
+    context.ensure_connected()
+    context.llm
+    context.fast_parser
+    context.intent_cache
+    context.signer_pool
+    context.receipt_tracker
+    context.chain_cache.block_number()  # Also starts following the chain head
+    for parsing in (intent_parsing, swap_parsing, transaction_parsing, bulk_parsing):
+        parsing()
+    get_agent()
+    if context.use_async:
+        context.async_tools
+    print("✅ Mezo Agent is warm.")
 
 #Run Mezo Agent
-print("Mezo Agent Ready! Type your request:")
+if __name__ == "__main__":
+    import argparse
+    from mezo_service import AgentService, EventLoopThread, run_repl, serve_http, serve_unix_socket
+
+    arg_parser = argparse.ArgumentParser(description="Mezo Agent")
+    arg_parser.add_argument("--repl", action="store_true", help="Keep the agent warm and take many requests.")
+    arg_parser.add_argument("--serve", action="store_true", help="Run as a service with a local API.")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8765)
+    arg_parser.add_argument("--unix-socket", help="Serve on this Unix socket path instead of HTTP.")
+    arg_parser.add_argument("--workers", type=int, default=4)
+    arg_parser.add_argument("--queue-size", type=int, default=100)
+    args = arg_parser.parse_args()
+
+    handler = run_request
+    if get_context().use_async:
+        # Every request (from any worker thread) runs on one shared event loop
+        event_loop = EventLoopThread().start()
+        handler = lambda user_input: event_loop.run(arun_request(user_input))
+
+    if args.serve or args.repl:
+        warm_up()
+
+    if args.serve:
+        service = AgentService(handler, workers=args.workers, queue_size=args.queue_size)
+        service.start()
+        if args.unix_socket:
+            serve_unix_socket(service, args.unix_socket)
+        else:
+            serve_http(service, args.host, args.port)
+    elif args.repl:
+        run_repl(handler)
+    else:
+        print("Mezo Agent Ready! Type your request:")
 
-user_input = input("> ")
-response = agent.run(user_input)
-print(response)
+        user_input = input("> ")
+        response = handler(user_input)
+        print(response)
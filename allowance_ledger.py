@@ -0,0 +1,119 @@
+import threading
+
+# -----------------------------------------------------------------------------
+# Local Allowance Ledger
+# -----------------------------------------------------------------------------
+
+MAX_UINT256 = 2**256 - 1
+
+# exact: approve exactly what the swap needs (previous behaviour)
+# capped: top up to a fixed cap so several swaps fit in one approval
+# unlimited: approve the maximum once
+APPROVAL_STRATEGIES = ("exact", "capped", "unlimited")
+
+
+class AllowanceLedger:
+    """
+    Tracks an owner's ERC-20 allowance for one spender locally.
+
+    The allowance is read from chain once and then decremented as swaps
+    reserve it, so back-to-back swaps don't need an allowance() call each.
+    When it runs short, a single approval is sent for an amount chosen by
+    the configured strategy. Call resync() when the chain disagrees (for
+    example after a swap reverts).
+    """
+
+    def __init__(self, token_contract, owner, spender, strategy="exact", cap=0):
+        if strategy not in APPROVAL_STRATEGIES:
+            raise ValueError(f"Unknown approval strategy '{strategy}'. Use one of {APPROVAL_STRATEGIES}.")
+        self.token_contract = token_contract
+        self.owner = owner
+        self.spender = spender
+        self.strategy = strategy
+        self.cap = cap
+        self._lock = threading.RLock()
+        self._allowance = None
+
+    def _chain_allowance(self):
+        return self.token_contract.functions.allowance(self.owner, self.spender).call()
+
+    def available(self) -> int:
+        """
+        Returns the locally tracked allowance, syncing from chain on first use.
+        """
+        with self._lock:
+            if self._allowance is None:
+                self._allowance = self._chain_allowance()
+            return self._allowance
+
+    def needs_sync(self) -> bool:
+        """
+        True until the ledger has seen the on-chain allowance.
+        """
+        with self._lock:
+            return self._allowance is None
+
+    def sync(self, chain_allowance):
+        """
+        Seeds the ledger from an allowance read elsewhere (e.g. a multicall),
+        unless it already holds local state.
+        """
+        with self._lock:
+            if self._allowance is None:
+                self._allowance = chain_allowance
+
+    def approval_amount(self, required) -> int:
+        """
+        Returns how much to approve when the allowance can't cover required.
+        """
+        if self.strategy == "unlimited":
+            return MAX_UINT256
+        if self.strategy == "capped":
+            return max(required, self.cap)
+        return required
+
+    def ensure(self, required, send_approval, reserve_spend=None):
+        """
+        Reserves required from the allowance, approving first if it is short.
+
+        The lock is held while the approval is broadcast so its nonce is lower
+        than any swap that relies on it. An approval overwrites the allowance,
+        so the swap's own nonce must also be taken under the lock: otherwise a
+        later approval can land before it and replace the amount it reserved.
+
+        :param required: Amount (in wei) the next swap will spend.
+        :param send_approval: Callable taking the amount to approve and returning the tx hash.
+        :param reserve_spend: Optional callable run before the lock is released,
+            e.g. to allocate the swap's nonce.
+        :return: Approval tx hash, or None if the existing allowance was enough.
+        """
+        with self._lock:
+            if self._allowance is None:
+                self._allowance = self._chain_allowance()
+
+            tx_hash = None
+            if self._allowance < required:
+                approve_amount = self.approval_amount(required)
+                tx_hash = send_approval(approve_amount)
+                self._allowance = approve_amount
+
+            if self._allowance != MAX_UINT256:
+                self._allowance -= required
+            if reserve_spend is not None:
+                reserve_spend()
+            return tx_hash
+
+    def release(self, amount):
+        """
+        Gives back a reservation whose swap was never broadcast.
+        """
+        with self._lock:
+            if self._allowance is not None and self._allowance != MAX_UINT256:
+                self._allowance += amount
+
+    def resync(self):
+        """
+        Discards local state; the next use re-reads the allowance from chain.
+        """
+        with self._lock:
+            self._allowance = None
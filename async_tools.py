@@ -0,0 +1,253 @@
+import asyncio
+import time
+
+from mezo_context import CHAIN_ID
+from tracing import tracer
+
+# -----------------------------------------------------------------------------
+# Async Transaction Tools
+# -----------------------------------------------------------------------------
+
+class AsyncMezoTools:
+    """
+    AsyncWeb3 variants of the BTC transfer, mUSD transfer and Dumpy Swap tools.
+
+    Independent pre-flight reads (balance, gas price, quote, gas estimate)
+    are issued concurrently, so pre-flight latency is the slowest RPC rather
+    than the sum of them. Each execute_* coroutine takes the same parsed
+    details dict as its synchronous counterpart in agent.py and returns the
+    same style of result message. Each request runs on the least-loaded
+    account of the shared signer pool.
+
+    web3 is an AsyncWeb3 client, normally backed by AsyncPooledHTTPProvider
+    so async traffic uses the same endpoints and retry policy as sync calls.
+    Gas prices and balances are served from the shared chain cache and the
+    request's prefetched snapshot when they are current.
+    """
+
+    def __init__(self, web3, signer_pool, musd_address, wrapped_btc_address,
+                 router_address, erc20_abi, router_abi, receipt_tracker=None, quote_engine=None, slippage_bps=50,
+                 chain_cache=None, prefetcher=None):
+        self.web3 = web3
+        self.chain_cache = chain_cache
+        self.prefetcher = prefetcher
+        self.signer_pool = signer_pool
+        self.receipt_tracker = receipt_tracker
+        self.quote_engine = quote_engine
+        self.slippage_bps = slippage_bps
+        self.musd_address = musd_address
+        self.wrapped_btc_address = wrapped_btc_address
+        self.router_address = router_address
+        self.musd_contract = self.web3.eth.contract(address=musd_address, abi=erc20_abi)
+        self.router_contract = self.web3.eth.contract(address=router_address, abi=router_abi)
+
+    async def gas_price(self):
+        """
+        Returns the gas price cached for the current block, reading it only
+        when the cache has none.
+        """
+        gas_price = self.chain_cache.cached_gas_price() if self.chain_cache is not None else None
+        if gas_price is None:
+            gas_price = await self.web3.eth.gas_price
+        return gas_price
+
+    async def musd_balance(self, address):
+        """
+        Returns the prefetched mUSD balance when it is from the current block,
+        otherwise reads balanceOf.
+        """
+        if self.prefetcher is not None:
+            # Waits for an in-flight prefetch, keep that off the event loop
+            snapshot = await asyncio.to_thread(self.prefetcher.snapshot, address)
+            if snapshot is not None:
+                return snapshot.musd_balance
+        return await self.musd_contract.functions.balanceOf(address).call()
+
+    async def wait_for_receipt(self, tx_hash):
+        """
+        Awaits a receipt through the shared tracker when one is configured,
+        otherwise falls back to AsyncWeb3's own polling.
+        """
+        with tracer.span("receipt_wait"):
+            if self.receipt_tracker is not None:
+                return await asyncio.wrap_future(self.receipt_tracker.track(tx_hash))
+            return await self.web3.eth.wait_for_transaction_receipt(tx_hash)
+
+    async def execute_btc_transfer(self, transaction_details) -> str:
+        with self.signer_pool.assign() as signer:
+            return await self._execute_btc_transfer(signer, transaction_details)
+
+    async def _execute_btc_transfer(self, signer, transaction_details) -> str:
+        amount = float(transaction_details["amount"])
+        currency = transaction_details["currency"].lower()
+        recipient = transaction_details["recipient"]
+
+        if currency != "btc":
+            return "This function only handles BTC transactions."
+
+        amount_wei = self.web3.to_wei(amount, "ether")
+        try:
+            gas_price, gas_limit = await asyncio.gather(
+                self.gas_price(),
+                self.web3.eth.estimate_gas({"to": recipient, "value": amount_wei, "from": signer.address}),
+            )
+        except Exception as e:
+            return f"❌ Transaction failed: {str(e)}"
+
+        async def build_tx(nonce):
+            return {
+                "to": recipient,
+                "value": amount_wei,
+                "gas": gas_limit,
+                "gasPrice": gas_price,
+                "nonce": nonce,
+                "chainId": CHAIN_ID,
+            }
+
+        try:
+            tx_hash = await signer.nonce_manager.asend_transaction(self.web3, build_tx, signer.private_key)
+            return f"✅ BTC transaction successful! Hash: {tx_hash.hex()}"
+        except Exception as e:
+            return f"❌ Transaction failed: {str(e)}"
+
+    async def execute_musd_transfer(self, transaction_details) -> str:
+        with self.signer_pool.assign() as signer:
+            return await self._execute_musd_transfer(signer, transaction_details)
+
+    async def _execute_musd_transfer(self, signer, transaction_details) -> str:
+        amount = float(transaction_details["amount"])
+        currency = transaction_details["currency"].lower()
+        recipient = transaction_details["recipient"]
+
+        if currency != "musd":
+            return "This function only handles mUSD transactions."
+
+        amount_musd_wei = int(amount * 10**18)
+
+        try:
+            gas_price = await self.gas_price()
+
+            async def build_txn(nonce):
+                return await self.musd_contract.functions.transfer(recipient, amount_musd_wei).build_transaction({
+                    "from": signer.address,
+                    "nonce": nonce,
+                    "gas": 50000,
+                    "gasPrice": gas_price,
+                    "chainId": CHAIN_ID,
+                })
+
+            tx_hash = await signer.nonce_manager.asend_transaction(self.web3, build_txn, signer.private_key)
+            return f"✅ mUSD Transaction successful! Hash: {tx_hash.hex()}"
+        except Exception as e:
+            return f"❌ Transaction failed: {str(e)}"
+
+    async def quote_swap(self, amount_musd_wei):
+        """
+        Quotes mUSD -> Wrapped BTC with the shared (synchronous) quote engine.
+        Reserves are cached per block, so this rarely touches the network.
+        """
+        if self.quote_engine is None:
+            raise ValueError("No quote engine configured, refusing to swap without slippage protection.")
+        return await asyncio.to_thread(
+            self.quote_engine.quote, self.musd_address, self.wrapped_btc_address, amount_musd_wei
+        )
+
+    async def execute_swap(self, transaction_details) -> str:
+        with self.signer_pool.assign() as signer:
+            return await self._execute_swap(signer, transaction_details)
+
+    async def _execute_swap(self, signer, transaction_details) -> str:
+        amount_musd = float(transaction_details["amount"])
+        from_currency = transaction_details["from_currency"].lower()
+        to_currency = transaction_details["to_currency"].lower()
+
+        if from_currency != "musd" or to_currency != "btc":
+            return "❌ This function only supports swapping mUSD for BTC."
+
+        amount_musd_wei = int(amount_musd * 10**18)
+        deadline = int(time.time()) + 600  # 10-minute transaction deadline
+
+        # Balance, gas price and the quote don't depend on each other
+        try:
+            sender_balance, gas_price, quote = await asyncio.gather(
+                self.musd_balance(signer.address),
+                self.gas_price(),
+                self.quote_swap(amount_musd_wei),
+            )
+        except Exception as e:
+            return f"❌ Swap transaction failed: {str(e)}"
+        path = quote.path
+        min_wrapped_btc_wei = quote.min_amount_out(self.slippage_bps)
+
+        if sender_balance < amount_musd_wei:
+            return (f"❌ Insufficient balance! You have {sender_balance / 10**18} mUSD, "
+                    f"but you need {amount_musd} mUSD.")
+
+        # The signer's allowance ledger is shared with the sync tools, so concurrent
+        # swaps reserve from one tracked allowance instead of each approving (and
+        # overwriting) the amount it needs
+        ledger = signer.allowance_ledgers[self.musd_address]
+        swap_nonce = []
+
+        def send_approval(approve_amount):
+            def build_approve_tx(nonce):
+                return ledger.token_contract.functions.approve(self.router_address, approve_amount).build_transaction({
+                    "from": signer.address,
+                    "nonce": nonce,
+                    "gas": 50000,  # Typical gas limit for an ERC-20 approval
+                    "gasPrice": gas_price,
+                    "chainId": CHAIN_ID,
+                })
+
+            return signer.nonce_manager.send_transaction(build_approve_tx, signer.private_key)
+
+        try:
+            # The ledger blocks on its lock and may read the allowance, keep it off the event loop
+            approve_tx_hash = await asyncio.to_thread(
+                ledger.ensure, amount_musd_wei, send_approval,
+                lambda: swap_nonce.append(signer.nonce_manager.allocate()),
+            )
+        except Exception as e:
+            return f"❌ Approval transaction failed: {str(e)}"
+
+        async def build_swap_tx(nonce):
+            swap_tx = await self.router_contract.functions.swapExactTokensForTokens(
+                amount_musd_wei, min_wrapped_btc_wei, path, signer.address, deadline
+            ).build_transaction({
+                "from": signer.address,
+                "nonce": nonce,
+                "gasPrice": gas_price,
+                "gas": 250000,
+                "chainId": CHAIN_ID,
+            })
+            if approve_tx_hash is None:
+                try:
+                    with tracer.span("gas_estimate"):
+                        swap_tx["gas"] = await self.web3.eth.estimate_gas(swap_tx) + 10000
+                except Exception:
+                    swap_tx["gas"] = 250000  # Default gas if estimation fails
+            return swap_tx
+
+        try:
+            tx_hash = await signer.nonce_manager.asend_transaction(
+                self.web3, build_swap_tx, signer.private_key, nonce=swap_nonce[0]
+            )
+        except Exception as e:
+            ledger.release(amount_musd_wei)
+            return f"❌ Swap transaction failed: {str(e)}"
+
+        try:
+            if approve_tx_hash is not None:
+                approve_receipt = await self.wait_for_receipt(approve_tx_hash)
+                if approve_receipt.status != 1:
+                    ledger.resync()
+                    raise Exception("Approval transaction failed.")
+            receipt = await self.wait_for_receipt(tx_hash)
+            if receipt.status != 1:
+                # The local allowance may no longer match the chain
+                ledger.resync()
+                raise Exception(f"Swap reverted. TX Hash: {tx_hash.hex()}")
+
+            return f"✅ Swap successful! {amount_musd} mUSD swapped for BTC on Dumpy Swap. TX Hash: {tx_hash.hex()}"
+        except Exception as e:
+            return f"❌ Swap transaction failed: {str(e)}"
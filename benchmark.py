@@ -0,0 +1,872 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import rlp
+from eth_abi import decode, encode
+from eth_account import Account
+from eth_utils import function_signature_to_4byte_selector, keccak, to_checksum_address
+
+from intent_parser import hit_rates
+from mezo_context import CHAIN_ID, MUSD_ADDRESS, ROUTER_ADDRESS, WRAPPED_BTC_ADDRESS, MezoContext, set_context
+from multicall import MULTICALL3_ADDRESS
+from quote_engine import get_amounts_out
+
+# -----------------------------------------------------------------------------
+# Offline Benchmark (local chain stand-in + scripted chat model)
+# -----------------------------------------------------------------------------
+
+FACTORY_ADDRESS = to_checksum_address("0x" + "fa" * 20)
+PAIR_ADDRESS = to_checksum_address("0x" + "ba" * 20)
+ZERO_ADDRESS = "0x" + "00" * 20
+MAX_UINT256 = 2**256 - 1
+SWAP_FEE_BPS = 30
+
+# Minimal UniswapV2-style router ABI (the deployed router's ABI file isn't shipped)
+ROUTER_ABI = [
+    {"name": "factory", "type": "function", "stateMutability": "view", "inputs": [],
+     "outputs": [{"name": "", "type": "address"}]},
+    {"name": "swapExactTokensForTokens", "type": "function", "stateMutability": "nonpayable",
+     "inputs": [{"name": "amountIn", "type": "uint256"}, {"name": "amountOutMin", "type": "uint256"},
+                {"name": "path", "type": "address[]"}, {"name": "to", "type": "address"},
+                {"name": "deadline", "type": "uint256"}],
+     "outputs": [{"name": "amounts", "type": "uint256[]"}]},
+]
+
+SELECTORS = {
+    signature: function_signature_to_4byte_selector(signature)
+    for signature in (
+        "balanceOf(address)",
+        "allowance(address,address)",
+        "decimals()",
+        "transfer(address,uint256)",
+        "approve(address,uint256)",
+        "factory()",
+        "getPair(address,address)",
+        "getReserves()",
+        "aggregate3((address,bool,bytes)[])",
+        "swapExactTokensForTokens(uint256,uint256,address[],address,uint256)",
+    )
+}
+TRANSFER_TOPIC = "0x" + keccak(text="Transfer(address,address,uint256)").hex()
+APPROVAL_TOPIC = "0x" + keccak(text="Approval(address,address,uint256)").hex()
+
+# Gas charged per call kind (the stand-in doesn't meter execution)
+GAS_USED = {"native": 21000, "transfer": 35000, "approve": 46000, "swap": 110000, "revert": 30000}
+
+RawTransaction = namedtuple("RawTransaction", ["sender", "nonce", "gas_price", "gas", "to", "value", "data"])
+
+
+class Revert(Exception):
+    pass
+
+
+def to_hex(value):
+    return hex(value)
+
+
+def address_topic(address):
+    return "0x" + "00" * 12 + address[2:].lower()
+
+
+def decode_raw_transaction(raw):
+    """
+    Decodes a signed legacy or EIP-1559 transaction and recovers its sender.
+    """
+    if raw[0] >= 0xc0:
+        nonce, gas_price, gas, to, value, data, _, _, _ = rlp.decode(raw)
+    elif raw[0] == 2:
+        _, nonce, _, gas_price, gas, to, value, data, _, _, _, _ = rlp.decode(raw[1:])
+    else:
+        raise ValueError(f"Unsupported transaction type {raw[0]}.")
+    as_int = lambda field: int.from_bytes(field, "big")
+    return RawTransaction(
+        Account.recover_transaction(raw),
+        as_int(nonce),
+        as_int(gas_price),
+        as_int(gas),
+        to_checksum_address(to) if to else None,
+        as_int(value),
+        bytes(data),
+    )
+
+
+# -----------------------------------------------------------------------------
+# Local Chain Stand-In
+# -----------------------------------------------------------------------------
+
+
+class FakeChain:
+    """
+    In-process chain with mUSD, Wrapped BTC, a UniswapV2-style factory,
+    pair and router, and Multicall3, all at the addresses the agent uses.
+
+    Signed transactions are decoded and executed against Python state:
+    native and ERC-20 transfers, approvals and constant-product swaps (with
+    the same fee and rounding as the pair contract). Nonces are enforced and
+    future nonces are queued until the gap is filled, like a node's mempool.
+    With block_time=0 every transaction is mined on arrival, otherwise a
+    miner thread seals pending transactions every block_time seconds.
+    """
+
+    def __init__(self, gas_price=10**9, block_time=0.0):
+        self.gas_price = gas_price
+        self.block_time = block_time
+        self.block_number = 1
+        self.native = defaultdict(int)
+        self.balances = {MUSD_ADDRESS.lower(): defaultdict(int), WRAPPED_BTC_ADDRESS.lower(): defaultdict(int)}
+        self.allowances = defaultdict(int)  # (token, owner, spender) -> amount
+        self.nonces = defaultdict(int)  # mined
+        self.pending_nonces = defaultdict(int)  # accepted into the mempool
+        self.queued = defaultdict(dict)  # sender -> {nonce: (tx_hash, tx)}
+        self.pending = []
+        self.transactions = {}  # tx_hash -> RawTransaction, once accepted or queued
+        self.receipts = {}
+        token0, token1 = sorted((MUSD_ADDRESS.lower(), WRAPPED_BTC_ADDRESS.lower()))
+        self.pair_tokens = (token0, token1)
+        self.reserves = [0, 0]
+        self._lock = threading.RLock()
+        self._miner = None
+        self._stopped = False
+
+    def fund(self, address, btc_wei=0, musd_wei=0, wrapped_btc_wei=0):
+        with self._lock:
+            self.native[address.lower()] += btc_wei
+            self.balances[MUSD_ADDRESS.lower()][address.lower()] += musd_wei
+            self.balances[WRAPPED_BTC_ADDRESS.lower()][address.lower()] += wrapped_btc_wei
+
+    def add_liquidity(self, musd_wei, wrapped_btc_wei):
+        amounts = {MUSD_ADDRESS.lower(): musd_wei, WRAPPED_BTC_ADDRESS.lower(): wrapped_btc_wei}
+        with self._lock:
+            for index, token in enumerate(self.pair_tokens):
+                self.reserves[index] += amounts[token]
+                self.balances[token][PAIR_ADDRESS.lower()] += amounts[token]
+
+    def start(self):
+        if self.block_time > 0 and self._miner is None:
+            self._miner = threading.Thread(target=self._mine_loop, name="fake-chain-miner", daemon=True)
+            self._miner.start()
+
+    def stop(self):
+        self._stopped = True
+
+    def _mine_loop(self):
+        while not self._stopped:
+            time.sleep(self.block_time)
+            with self._lock:
+                self._mine()
+
+    # -------------------------------------------------------------------------
+    # JSON-RPC
+    # -------------------------------------------------------------------------
+
+    def handle(self, request):
+        """
+        Answers one JSON-RPC request object.
+        """
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+        method = request.get("method")
+        handler = getattr(self, "rpc_" + str(method), None)
+        if handler is None:
+            response["error"] = {"code": -32601, "message": f"Method {method} not found"}
+            return response
+        try:
+            response["result"] = handler(*request.get("params", []))
+        except Revert as e:
+            response["error"] = {"code": 3, "message": f"execution reverted: {e}"}
+        except Exception as e:
+            response["error"] = {"code": -32000, "message": str(e)}
+        return response
+
+    def rpc_web3_clientVersion(self):
+        return "MezoBenchmark/FakeChain"
+
+    def rpc_net_version(self):
+        return str(CHAIN_ID)
+
+    def rpc_eth_chainId(self):
+        return to_hex(CHAIN_ID)
+
+    def rpc_eth_blockNumber(self):
+        with self._lock:
+            return to_hex(self.block_number)
+
+    def rpc_eth_gasPrice(self):
+        return to_hex(self.gas_price)
+
+    def rpc_eth_getBalance(self, address, block="latest"):
+        with self._lock:
+            return to_hex(self.native[address.lower()])
+
+    def rpc_eth_getTransactionCount(self, address, block="latest"):
+        with self._lock:
+            nonces = self.pending_nonces if block == "pending" else self.nonces
+            return to_hex(nonces[address.lower()])
+
+    def rpc_eth_getCode(self, address, block="latest"):
+        contracts = {MUSD_ADDRESS, WRAPPED_BTC_ADDRESS, ROUTER_ADDRESS, FACTORY_ADDRESS, PAIR_ADDRESS, MULTICALL3_ADDRESS}
+        return "0x60806040" if to_checksum_address(address) in contracts else "0x"
+
+    def rpc_eth_call(self, tx, block="latest"):
+        data = bytes.fromhex(tx.get("data", tx.get("input", "0x"))[2:])
+        with self._lock:
+            return "0x" + self.call(tx["to"], data).hex()
+
+    def rpc_eth_estimateGas(self, tx, block=None):
+        data = bytes.fromhex((tx.get("data") or tx.get("input") or "0x")[2:])
+        return to_hex(GAS_USED[self.call_kind(tx.get("to"), data)])
+
+    def rpc_eth_sendRawTransaction(self, raw_hex):
+        raw = bytes.fromhex(raw_hex[2:])
+        tx = decode_raw_transaction(raw)
+        tx_hash = "0x" + keccak(raw).hex()
+        sender = tx.sender.lower()
+        with self._lock:
+            if tx_hash in self.transactions and tx_hash not in self.receipts:
+                raise ValueError("already known")
+            if tx.nonce < self.pending_nonces[sender]:
+                raise ValueError("nonce too low")
+            if tx.nonce in self.queued[sender]:
+                raise ValueError("replacement transaction underpriced")
+            if self.native[sender] < tx.value + tx.gas * tx.gas_price:
+                raise ValueError("insufficient funds for gas * price + value")
+            self.queued[sender][tx.nonce] = (tx_hash, tx)
+            self.transactions[tx_hash] = tx
+            # Promote every consecutive nonce now that the gap (if any) is filled
+            while self.pending_nonces[sender] in self.queued[sender]:
+                self.pending.append(self.queued[sender].pop(self.pending_nonces[sender]))
+                self.pending_nonces[sender] += 1
+            if self.block_time <= 0:
+                self._mine()
+        return tx_hash
+
+    def rpc_eth_getTransactionByHash(self, tx_hash):
+        with self._lock:
+            tx = self.transactions.get(tx_hash.lower())
+            receipt = self.receipts.get(tx_hash.lower())
+        if tx is None:
+            return None
+        return {
+            "hash": tx_hash.lower(),
+            "nonce": to_hex(tx.nonce),
+            "from": tx.sender,
+            "to": tx.to,
+            "value": to_hex(tx.value),
+            "gas": to_hex(tx.gas),
+            "gasPrice": to_hex(tx.gas_price),
+            "input": "0x" + tx.data.hex(),
+            "blockNumber": receipt["blockNumber"] if receipt else None,
+            "blockHash": receipt["blockHash"] if receipt else None,
+            "transactionIndex": "0x0" if receipt else None,
+            "chainId": to_hex(CHAIN_ID),
+            "type": "0x0",
+            "v": "0x0",
+            "r": "0x0",
+            "s": "0x0",
+        }
+
+    def rpc_eth_getTransactionReceipt(self, tx_hash):
+        with self._lock:
+            return self.receipts.get(tx_hash.lower())
+
+    def rpc_eth_getBlockByNumber(self, block="latest", full=False):
+        with self._lock:
+            number = self.block_number if block in ("latest", "pending") else int(block, 16)
+        return {
+            "number": to_hex(number),
+            "hash": self.block_hash(number),
+            "parentHash": self.block_hash(number - 1),
+            "timestamp": to_hex(int(time.time())),
+            "gasLimit": to_hex(30_000_000),
+            "gasUsed": "0x0",
+            "baseFeePerGas": to_hex(self.gas_price),
+            "transactions": [],
+        }
+
+    @staticmethod
+    def block_hash(number):
+        return "0x" + keccak(number.to_bytes(32, "big")).hex()
+
+    # -------------------------------------------------------------------------
+    # Contract views
+    # -------------------------------------------------------------------------
+
+    def call(self, to, data):
+        """
+        Executes a view call and returns the ABI-encoded result.
+        """
+        to = to_checksum_address(to)
+        selector, args = data[:4], data[4:]
+        if to.lower() in self.balances:
+            ledger = self.balances[to.lower()]
+            if selector == SELECTORS["balanceOf(address)"]:
+                (owner,) = decode(["address"], args)
+                return encode(["uint256"], [ledger[owner.lower()]])
+            if selector == SELECTORS["allowance(address,address)"]:
+                owner, spender = decode(["address", "address"], args)
+                return encode(["uint256"], [self.allowances[(to.lower(), owner.lower(), spender.lower())]])
+            if selector == SELECTORS["decimals()"]:
+                return encode(["uint8"], [18])
+        elif to == ROUTER_ADDRESS and selector == SELECTORS["factory()"]:
+            return encode(["address"], [FACTORY_ADDRESS])
+        elif to == FACTORY_ADDRESS and selector == SELECTORS["getPair(address,address)"]:
+            token_a, token_b = decode(["address", "address"], args)
+            found = tuple(sorted((token_a.lower(), token_b.lower()))) == self.pair_tokens
+            return encode(["address"], [PAIR_ADDRESS if found else ZERO_ADDRESS])
+        elif to == PAIR_ADDRESS and selector == SELECTORS["getReserves()"]:
+            return encode(["uint112", "uint112", "uint32"], [self.reserves[0], self.reserves[1], int(time.time()) % 2**32])
+        elif to == MULTICALL3_ADDRESS and selector == SELECTORS["aggregate3((address,bool,bytes)[])"]:
+            (calls,) = decode(["(address,bool,bytes)[]"], args)
+            results = []
+            for target, allow_failure, call_data in calls:
+                try:
+                    results.append((True, self.call(target, call_data)))
+                except Revert:
+                    if not allow_failure:
+                        raise
+                    results.append((False, b""))
+            return encode(["(bool,bytes)[]"], [results])
+        raise Revert(f"unknown call to {to}")
+
+    def call_kind(self, to, data):
+        if not data:
+            return "native"
+        selector = data[:4]
+        if to and to.lower() in self.balances:
+            if selector == SELECTORS["transfer(address,uint256)"]:
+                return "transfer"
+            if selector == SELECTORS["approve(address,uint256)"]:
+                return "approve"
+        if to and to_checksum_address(to) == ROUTER_ADDRESS and \
+                selector == SELECTORS["swapExactTokensForTokens(uint256,uint256,address[],address,uint256)"]:
+            return "swap"
+        return "revert"
+
+    # -------------------------------------------------------------------------
+    # Execution
+    # -------------------------------------------------------------------------
+
+    def _mine(self):
+        """
+        Seals every pending transaction into its own block.
+        """
+        pending, self.pending = self.pending, []
+        for tx_hash, tx in pending:
+            self.block_number += 1
+            self.receipts[tx_hash] = self._execute(tx_hash, tx)
+            self.nonces[tx.sender.lower()] = tx.nonce + 1
+
+    def _execute(self, tx_hash, tx):
+        sender = tx.sender.lower()
+        kind = self.call_kind(tx.to, tx.data)
+        logs = []
+        try:
+            if tx.value:
+                if self.native[sender] < tx.value:
+                    raise Revert("insufficient balance")
+                self.native[sender] -= tx.value
+                self.native[tx.to.lower()] += tx.value
+            args = tx.data[4:]
+            if kind == "transfer":
+                recipient, amount = decode(["address", "uint256"], args)
+                logs.append(self._transfer(tx.to.lower(), sender, recipient.lower(), amount))
+            elif kind == "approve":
+                spender, amount = decode(["address", "uint256"], args)
+                self.allowances[(tx.to.lower(), sender, spender.lower())] = amount
+                logs.append((tx.to, [APPROVAL_TOPIC, address_topic(sender), address_topic(spender)], amount))
+            elif kind == "swap":
+                logs += self._swap(sender, *decode(["uint256", "uint256", "address[]", "address", "uint256"], args))
+            elif kind == "revert":
+                raise Revert("unknown function")
+            status = 1
+        except Revert:
+            logs, status = [], 0
+        gas_used = min(GAS_USED[kind if status else "revert"], tx.gas)
+        self.native[sender] -= gas_used * tx.gas_price
+        block_hash = self.block_hash(self.block_number)
+        return {
+            "transactionHash": tx_hash,
+            "transactionIndex": "0x0",
+            "blockHash": block_hash,
+            "blockNumber": to_hex(self.block_number),
+            "from": tx.sender,
+            "to": tx.to,
+            "cumulativeGasUsed": to_hex(gas_used),
+            "gasUsed": to_hex(gas_used),
+            "effectiveGasPrice": to_hex(tx.gas_price),
+            "contractAddress": None,
+            "logs": [
+                {
+                    "address": address,
+                    "topics": topics,
+                    "data": "0x" + encode(["uint256"], [value]).hex(),
+                    "blockNumber": to_hex(self.block_number),
+                    "blockHash": block_hash,
+                    "transactionHash": tx_hash,
+                    "transactionIndex": "0x0",
+                    "logIndex": to_hex(index),
+                    "removed": False,
+                }
+                for index, (address, topics, value) in enumerate(logs)
+            ],
+            "logsBloom": "0x" + "00" * 256,
+            "status": to_hex(status),
+            "type": "0x0",
+        }
+
+    def _transfer(self, token, sender, recipient, amount):
+        ledger = self.balances[token]
+        if ledger[sender] < amount:
+            raise Revert("transfer amount exceeds balance")
+        ledger[sender] -= amount
+        ledger[recipient] += amount
+        return (to_checksum_address(token), [TRANSFER_TOPIC, address_topic(sender), address_topic(recipient)], amount)
+
+    def _swap(self, sender, amount_in, amount_out_min, path, recipient, deadline):
+        if deadline < time.time():
+            raise Revert("UniswapV2Router: EXPIRED")
+        token_in = path[0].lower()
+        allowance_key = (token_in, sender, ROUTER_ADDRESS.lower())
+        if self.allowances[allowance_key] < amount_in:
+            raise Revert("transfer amount exceeds allowance")
+        reserves = {
+            self.pair_tokens: tuple(self.reserves),
+            self.pair_tokens[::-1]: tuple(self.reserves[::-1]),
+        }
+        try:
+            amounts = get_amounts_out(amount_in, path, reserves, SWAP_FEE_BPS)
+        except KeyError:
+            raise Revert("UniswapV2Library: INVALID_PATH")
+        if amounts[-1] < amount_out_min:
+            raise Revert("UniswapV2Router: INSUFFICIENT_OUTPUT_AMOUNT")
+
+        pair = PAIR_ADDRESS.lower()
+        logs = [self._transfer(token_in, sender, pair, amount_in)]
+        logs.append(self._transfer(path[-1].lower(), pair, recipient.lower(), amounts[-1]))
+        if self.allowances[allowance_key] != MAX_UINT256:
+            self.allowances[allowance_key] -= amount_in
+        for index, token in enumerate(self.pair_tokens):
+            self.reserves[index] = self.balances[token][pair]
+        return logs
+
+
+class FakeChainServer:
+    """
+    Serves a FakeChain over HTTP JSON-RPC (single and batched requests) on a
+    local port, adding latency per HTTP request to model network round trips.
+    Counts HTTP requests and JSON-RPC calls per method.
+    """
+
+    def __init__(self, chain, latency=0.0, host="127.0.0.1"):
+        self.chain = chain
+        self.latency = latency
+        self.host = host
+        self.http_requests = 0
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self._server.server_address[1]}"
+
+    def start(self):
+        server = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like a real node
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+                requests_list = payload if isinstance(payload, list) else [payload]
+                with server._lock:
+                    server.http_requests += 1
+                    server.calls.update(str(request.get("method")) for request in requests_list)
+                if server.latency > 0:
+                    time.sleep(server.latency)
+                responses = [server.chain.handle(request) for request in requests_list]
+                data = json.dumps(responses if isinstance(payload, list) else responses[0]).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, 0), RequestHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="fake-chain-rpc", daemon=True).start()
+        self.chain.start()
+        return self.url
+
+    def stop(self):
+        self.chain.stop()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def counts(self):
+        with self._lock:
+            return self.http_requests, Counter(self.calls)
+
+    def reset_counts(self):
+        with self._lock:
+            self.http_requests, self.calls = 0, Counter()
+
+
+# -----------------------------------------------------------------------------
+# Scripted Chat Model
+# -----------------------------------------------------------------------------
+
+ChatMessage = namedtuple("ChatMessage", ["content"])
+
+
+class ScriptedChatModel:
+    """
+    Stand-in for the chat model. Answers each user request with its scripted
+    JSON (fenced the way the output parsers expect) after a fixed delay, and
+    with an unparseable reply for anything it has no script for.
+    """
+
+    def __init__(self, script, latency=0.0):
+        self.script = script
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def user_input(prompt):
+        # Every prompt template puts {input} on the line after "...request:"
+        text = prompt if isinstance(prompt, str) else str(prompt)
+        _, _, rest = text.partition(":\n")
+        return rest.strip().split("\n", 1)[0].strip()
+
+    def invoke(self, prompt):
+        with self._lock:
+            self.calls += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+        response = self.script.get(self.user_input(prompt))
+        if response is None:
+            return ChatMessage("I can't help with that.")
+        return ChatMessage("```json\n" + json.dumps(response) + "\n```")
+
+
+# -----------------------------------------------------------------------------
+# Workload
+# -----------------------------------------------------------------------------
+
+FLOWS = ("btc", "musd", "swap")
+
+
+def benchmark_key(index):
+    return "0x" + keccak(text=f"mezo-benchmark-signer-{index}").hex()
+
+
+def benchmark_recipient(index):
+    return to_checksum_address(keccak(text=f"mezo-benchmark-recipient-{index}")[-20:])
+
+
+def build_workload(flows, count, phrasing):
+    """
+    Builds count prompts cycling through flows, plus the chat model script
+    that answers them. "fast" phrasing is parsed without the model, "llm"
+    phrasing is worded so the deterministic parser misses and the routing
+    call goes to the (scripted) model. Amounts differ per request so the
+    intent cache doesn't serve repeats.
+    """
+    prompts, script = [], {}
+    for index in range(count):
+        flow = flows[index % len(flows)]
+        recipient = benchmark_recipient(index)
+        if flow == "swap":
+            amount = f"{1 + index * 0.01:.2f}"
+            prompt = f"Swap {amount} mUSD for BTC" if phrasing == "fast" else f"Please turn {amount} mUSD into BTC"
+            response = {"intent": "swap", "amount": amount, "currency": "mUSD", "to_currency": "BTC", "recipient": ""}
+        else:
+            currency = "BTC" if flow == "btc" else "mUSD"
+            amount = f"{0.0001 + index * 0.000001:.6f}" if flow == "btc" else f"{1 + index * 0.01:.2f}"
+            if phrasing == "fast":
+                prompt = f"Send {amount} {currency} to {recipient}"
+            else:
+                prompt = f"Please move {amount} {currency} over to {recipient} for me"
+            response = {
+                "intent": f"{flow}_transfer", "amount": amount, "currency": currency,
+                "to_currency": "", "recipient": recipient,
+            }
+        prompts.append(prompt)
+        script[prompt] = response
+    return prompts, script
+
+
+# -----------------------------------------------------------------------------
+# Reporting
+# -----------------------------------------------------------------------------
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of values (0 for an empty list).
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+
+def summarize_trace(trace_path):
+    """
+    Reads the span JSON lines written during the measured run.
+
+    :return: ({stage: [ms]}, {tool: [ms]}, per-request RPC round trips, per-request RPC calls)
+    """
+    stages, tools = defaultdict(list), defaultdict(list)
+    round_trips, calls = Counter(), Counter()
+    requests_seen = set()
+    with open(trace_path, "r") as trace_file:
+        for line in trace_file:
+            span = json.loads(line)
+            stages[span["stage"]].append(span["duration_ms"])
+            if span["stage"] == "tool":
+                tools[span["tool"]].append(span["duration_ms"])
+            elif span["stage"] == "request":
+                requests_seen.add(span["trace"])
+            elif span["stage"] == "rpc" and span["trace"]:
+                round_trips[span["trace"]] += 1
+                calls[span["trace"]] += span.get("calls", 1)
+    return (
+        stages,
+        tools,
+        [round_trips[trace] for trace in requests_seen],
+        [calls[trace] for trace in requests_seen],
+    )
+
+
+STAGE_ORDER = ("request", "route", "llm", "parse_output", "tool", "rpc", "gas_estimate", "sign", "broadcast", "receipt_wait")
+
+
+def counter_delta(before, after):
+    return {key: after[key] - before[key] for key in before if isinstance(before[key], int)}
+
+
+def build_report(args, wall_seconds, latencies, results, trace_path, server, model, parser_stats, cache_stats):
+    stages, tools, round_trips, calls = summarize_trace(trace_path)
+    cache_lookups = cache_stats["hits"] + cache_stats["misses"]
+    http_requests, server_calls = server.counts()
+    row = lambda values: {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 0.50), 3),
+        "p99_ms": round(percentile(values, 0.99), 3),
+    }
+    return {
+        "requests": len(latencies),
+        "flows": list(args.flows),
+        "phrasing": args.phrasing,
+        "concurrency": "async" if args.use_async else args.concurrency,
+        "llm_latency_ms": args.llm_latency * 1000,
+        "rpc_latency_ms": args.rpc_latency * 1000,
+        "throughput_rps": round(len(latencies) / wall_seconds, 3) if wall_seconds else 0.0,
+        "failed": sum(1 for result in results if not str(result).startswith(("✅", "⏳", "💰"))),
+        "latency": row([seconds * 1000 for seconds in latencies]),
+        "stages": {stage: row(stages[stage]) for stage in STAGE_ORDER if stage in stages},
+        "tools": {tool: row(values) for tool, values in sorted(tools.items())},
+        "rpc_per_request": {
+            "round_trips_avg": round(sum(round_trips) / len(round_trips), 2) if round_trips else 0.0,
+            "round_trips_p99": percentile(round_trips, 0.99),
+            "calls_avg": round(sum(calls) / len(calls), 2) if calls else 0.0,
+            "calls_p99": percentile(calls, 0.99),
+        },
+        "llm_calls": model.calls,
+        "fast_parser": {
+            kind: {
+                "hits": parser_stats[f"{kind}_hits"],
+                "misses": parser_stats[f"{kind}_misses"],
+                "hit_rate": round(rate, 3),
+            }
+            for kind, rate in hit_rates(parser_stats).items()
+        },
+        "intent_cache": {
+            "hits": cache_stats["hits"],
+            "misses": cache_stats["misses"],
+            "hit_rate": round(cache_stats["hits"] / cache_lookups, 3) if cache_lookups else 0.0,
+        },
+        "server": {"http_requests": http_requests, "calls": dict(server_calls.most_common())},
+    }
+
+
+def print_report(report):
+    print(f"Mezo Agent benchmark: {report['requests']} requests ({', '.join(report['flows'])}, {report['phrasing']} "
+          f"phrasing), concurrency {report['concurrency']}, LLM {report['llm_latency_ms']:.0f} ms, "
+          f"RPC {report['rpc_latency_ms']:.0f} ms")
+    print(f"Throughput: {report['throughput_rps']:.2f} req/s, {report['failed']} failed, "
+          f"{report['llm_calls']} LLM calls")
+    print(f"Request latency: p50 {report['latency']['p50_ms']:.1f} ms, p99 {report['latency']['p99_ms']:.1f} ms")
+    parser = ", ".join(
+        f"{kind} {values['hit_rate']:.0%} ({values['hits']}/{values['hits'] + values['misses']})"
+        for kind, values in report["fast_parser"].items() if values["hits"] + values["misses"]
+    )
+    cache = report["intent_cache"]
+    print(f"Fast parser hit rate: {parser or 'not used'}")
+    print(f"Intent cache hit rate: {cache['hit_rate']:.0%} ({cache['hits']} hits, {cache['misses']} misses)")
+    print()
+    print(f"{'stage':<16}{'count':>8}{'p50 ms':>12}{'p99 ms':>12}")
+    for name, values in list(report["stages"].items()) + [(f"tool:{t}", v) for t, v in report["tools"].items()]:
+        print(f"{name:<16}{values['count']:>8}{values['p50_ms']:>12.2f}{values['p99_ms']:>12.2f}")
+    print()
+    rpc = report["rpc_per_request"]
+    print(f"RPC per request: {rpc['round_trips_avg']} round trips (p99 {rpc['round_trips_p99']}), "
+          f"{rpc['calls_avg']} calls (p99 {rpc['calls_p99']})")
+    server = report["server"]
+    total_calls = sum(server["calls"].values())
+    print(f"Chain server (incl. background polling): {server['http_requests']} HTTP requests, {total_calls} calls")
+    for method, count in server["calls"].items():
+        print(f"  {method:<28}{count:>8}")
+
+
+# -----------------------------------------------------------------------------
+# Runner
+# -----------------------------------------------------------------------------
+
+
+@contextlib.contextmanager
+def setup_context(url, signers, model, workdir):
+    """
+    Points a fresh agent context at the local chain and the scripted model
+    for the duration of the with block.
+    Environment settings the benchmark depends on are fixed; everything else
+    (MEZO_PREFETCH, MEZO_APPROVAL_STRATEGY, MEZO_WAIT_FOR_RECEIPTS, ...) is
+    left to the caller so configurations can be compared. The previous
+    environment values and process-wide context are restored on exit.
+    """
+    abi_path = os.path.join(workdir, "router_abi.json")
+    with open(abi_path, "w") as abi_file:
+        json.dump(ROUTER_ABI, abi_file)
+    settings = {
+        "MEZO_TRACE": "true",
+        "MEZO_TRACE_FILE": os.path.join(workdir, "warmup.jsonl"),
+        "MEZO_RPC_FALLBACK_URLS": "",
+        "MEZO_SIGNER_KEYS": ",".join(benchmark_key(index) for index in range(1, signers)),
+        "MEZO_AGENT_MODE": "router",
+        "MEZO_INTENT_CACHE_DB": "",
+    }
+    saved = {key: os.environ.get(key) for key in settings}
+    os.environ.update(settings)
+    context = MezoContext(
+        rpc_url=url, private_key=benchmark_key(0), openai_api_key="benchmark", router_abi_path=abi_path, llm=model
+    )
+    previous = set_context(context)
+    try:
+        yield context
+    finally:
+        set_context(previous)
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def run_workload(prompts, concurrency, use_async):
+    """
+    Runs every prompt through the agent and returns (wall seconds, per-request seconds, results).
+    """
+    from agent import arun_request, run_request
+
+    def timed(prompt):
+        started = time.perf_counter()
+        result = run_request(prompt)
+        return time.perf_counter() - started, result
+
+    async def atimed(prompt):
+        started = time.perf_counter()
+        result = await arun_request(prompt)
+        return time.perf_counter() - started, result
+
+    async def arun_all():
+        return await asyncio.gather(*(atimed(prompt) for prompt in prompts))
+
+    started = time.perf_counter()
+    if use_async:
+        timings = asyncio.run(arun_all())
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            timings = list(pool.map(timed, prompts))
+    wall_seconds = time.perf_counter() - started
+    return wall_seconds, [seconds for seconds, _ in timings], [result for _, result in timings]
+
+
+def run_benchmark(args):
+    chain = FakeChain(block_time=args.block_time)
+    for index in range(args.signers):
+        chain.fund(Account.from_key(benchmark_key(index)).address, btc_wei=10**24, musd_wei=10**27)
+    chain.add_liquidity(musd_wei=10**8 * 10**18, wrapped_btc_wei=10**3 * 10**18)
+    server = FakeChainServer(chain, latency=args.rpc_latency)
+    url = server.start()
+
+    prompts, script = build_workload(args.flows, args.requests + args.warmup, args.phrasing)
+    model = ScriptedChatModel(script, latency=args.llm_latency)
+
+    with tempfile.TemporaryDirectory() as workdir, setup_context(url, args.signers, model, workdir) as context:
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        try:
+            with output:
+                run_workload(prompts[:args.warmup], args.concurrency, args.use_async)
+                # Only the measured requests go into the report
+                trace_path = os.path.join(workdir, "trace.jsonl")
+                context.tracer.configure(True, trace_path=trace_path)
+                server.reset_counts()
+                model.calls = 0
+                parser_before, cache_before = context.fast_parser.stats(), context.intent_cache.stats()
+                wall_seconds, latencies, results = run_workload(
+                    prompts[args.warmup:], args.concurrency, args.use_async
+                )
+            context.tracer.configure(False)
+            return build_report(
+                args, wall_seconds, latencies, results, trace_path, server, model,
+                counter_delta(parser_before, context.fast_parser.stats()),
+                counter_delta(cache_before, context.intent_cache.stats()),
+            )
+        finally:
+            server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the agent's transfer and swap flows against a local chain stand-in and a scripted model."
+    )
+    parser.add_argument("--requests", type=int, default=60, help="Measured requests.")
+    parser.add_argument("--warmup", type=int, default=3, help="Unmeasured requests run first (lazy setup, caches).")
+    parser.add_argument("--flows", default=",".join(FLOWS), help="Comma-separated flows: btc, musd, swap.")
+    parser.add_argument("--phrasing", choices=("llm", "fast"), default="llm",
+                        help="llm routes through the scripted model, fast hits the deterministic parser.")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once (thread mode).")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Serve all requests on one event loop.")
+    parser.add_argument("--signers", type=int, default=1, help="Accounts in the signer pool.")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per model call.")
+    parser.add_argument("--rpc-latency", type=float, default=0.02, help="Seconds per HTTP round trip to the chain.")
+    parser.add_argument("--block-time", type=float, default=0.0, help="Seconds per block, 0 mines on arrival.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    parser.add_argument("--verbose", action="store_true", help="Show the tools' output.")
+    args = parser.parse_args()
+    args.flows = [flow.strip().lower() for flow in args.flows.split(",") if flow.strip()]
+    unknown = [flow for flow in args.flows if flow not in FLOWS]
+    if unknown:
+        parser.error(f"Unknown flows: {', '.join(unknown)}")
+
+    report = run_benchmark(args)
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print_report(report)
@@ -0,0 +1,253 @@
+import csv
+import io
+import itertools
+import json
+import os
+import re
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, InvalidOperation
+
+from tracing import tracer
+
+# -----------------------------------------------------------------------------
+# Bulk (Multi-Recipient) Transfers
+# -----------------------------------------------------------------------------
+
+Payout = namedtuple("Payout", ["recipient", "amount", "currency", "amount_wei"])
+
+CURRENCY_NAMES = {"btc": "BTC", "musd": "mUSD"}
+TRANSFER_SELECTOR = bytes.fromhex("a9059cbb")  # transfer(address,uint256)
+BTC_TRANSFER_GAS = 21000
+MUSD_TRANSFER_GAS = 50000
+
+# "5 mUSD to 0x..., 2 BTC each to 0x... and 0x..."
+ADDRESS_LIST = r"0x[a-fA-F0-9]{40}(?:\s*(?:,|\band\b)\s*0x[a-fA-F0-9]{40})*"
+INLINE_PATTERN = re.compile(
+    r"(?<![\w.])(?P<amount>\d+(?:\.\d+)?|\.\d+)\s*(?P<currency>btc|musd)\s+(?P<each>each\s+)?to\s+"
+    r"(?P<recipients>" + ADDRESS_LIST + r")",
+    re.IGNORECASE,
+)
+ADDRESS_PATTERN = re.compile(r"0x[a-fA-F0-9]{40}")
+
+
+def parse_csv(text):
+    """
+    Reads recipient,amount,currency rows. A header row is optional; when
+    present its column names are used.
+    """
+    rows = [row for row in csv.reader(io.StringIO(text)) if any(cell.strip() for cell in row)]
+    if rows and "recipient" in [cell.strip().lower() for cell in rows[0]]:
+        header = [cell.strip().lower() for cell in rows[0]]
+        return [dict(zip(header, (cell.strip() for cell in row))) for row in rows[1:]]
+    return [dict(zip(("recipient", "amount", "currency"), (cell.strip() for cell in row))) for row in rows]
+
+
+def parse_json(text):
+    """
+    Reads a JSON list (or {"payouts": [...]}) of objects or
+    [recipient, amount, currency] lists.
+    """
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("payouts", [])
+    return [
+        row if isinstance(row, dict) else dict(zip(("recipient", "amount", "currency"), row))
+        for row in data
+    ]
+
+
+def parse_inline(text):
+    """
+    Reads "<amount> <BTC|mUSD> to <address>" and "<amount> <BTC|mUSD> each
+    to <address>, <address> ..." clauses. Returns None when a clause lists
+    several addresses without "each" ("5 mUSD to A and B" could be a split).
+    """
+    rows = []
+    for match in INLINE_PATTERN.finditer(text):
+        recipients = ADDRESS_PATTERN.findall(match.group("recipients"))
+        if len(recipients) > 1 and not match.group("each"):
+            return None
+        for recipient in recipients:
+            rows.append({"recipient": recipient, "amount": match.group("amount"), "currency": match.group("currency")})
+    return rows
+
+
+def load_payout_rows(source):
+    """
+    Turns a CSV/JSON file path, inline CSV/JSON text or a plain instruction
+    into raw payout rows. Returns None when nothing could be parsed
+    deterministically (the caller can then ask the LLM).
+    """
+    source = source.strip()
+    if source.lower().endswith((".csv", ".json")) and os.path.isfile(source):
+        with open(source, "r") as payout_file:
+            text = payout_file.read()
+        return parse_json(text) if source.lower().endswith(".json") else parse_csv(text)
+    if source.startswith(("[", "{")):
+        return parse_json(source)
+    rows = parse_inline(source)
+    if rows is None:
+        return None
+    mentioned = {address.lower() for address in ADDRESS_PATTERN.findall(source)}
+    if rows and {row["recipient"].lower() for row in rows} == mentioned:
+        return rows
+    if "\n" in source and "," in source and not rows:
+        return parse_csv(source)
+    return None
+
+
+def validate_payouts(rows):
+    """
+    Checks every row before anything is signed.
+
+    :return: (list of Payout, list of error messages). Any error means the
+             batch should not be sent.
+    """
+    from eth_utils import is_address, to_checksum_address
+
+    payouts, errors = [], []
+    for index, row in enumerate(rows, start=1):
+        recipient = str(row.get("recipient", "")).strip()
+        currency = CURRENCY_NAMES.get(str(row.get("currency", "")).strip().lower())
+        try:
+            amount = Decimal(str(row.get("amount", "")).strip())
+        except InvalidOperation:
+            amount = None
+
+        row_errors = []
+        if not is_address(recipient):
+            row_errors.append(f"Row {index}: invalid recipient address '{recipient}'.")
+        if currency is None:
+            row_errors.append(f"Row {index}: unsupported currency '{row.get('currency')}' (use BTC or mUSD).")
+        if amount is None or not amount.is_finite() or amount <= 0:
+            row_errors.append(f"Row {index}: invalid amount '{row.get('amount')}'.")
+        if row_errors:
+            errors.extend(row_errors)
+            continue
+        payouts.append(Payout(to_checksum_address(recipient), amount, currency, int(amount * 10**18)))
+    if not rows:
+        errors.append("No payouts found.")
+    return payouts, errors
+
+
+def build_transfer_tx(payout, nonce, gas_price, chain_id, musd_address):
+    """
+    Builds a BTC or mUSD transfer entirely locally (no RPC calls).
+    """
+    from eth_abi import encode
+
+    if payout.currency == "BTC":
+        return {
+            "to": payout.recipient,
+            "value": payout.amount_wei,
+            "gas": BTC_TRANSFER_GAS,
+            "gasPrice": gas_price,
+            "nonce": nonce,
+            "chainId": chain_id,
+        }
+    data = TRANSFER_SELECTOR + encode(["address", "uint256"], [payout.recipient, payout.amount_wei])
+    return {
+        "to": musd_address,
+        "value": 0,
+        "data": "0x" + data.hex(),
+        "gas": MUSD_TRANSFER_GAS,
+        "gasPrice": gas_price,
+        "nonce": nonce,
+        "chainId": chain_id,
+    }
+
+
+def build_gap_filler_tx(address, nonce, gas_price, chain_id):
+    """
+    Builds a 0-value self-transfer that takes up a nonce whose transaction
+    was rejected, so the ones queued behind it can be mined.
+    """
+    return {
+        "to": address,
+        "value": 0,
+        "gas": BTC_TRANSFER_GAS,
+        "gasPrice": gas_price,
+        "nonce": nonce,
+        "chainId": chain_id,
+    }
+
+
+def split_rejected(results):
+    """
+    Splits the rejected transactions of a submission by where they sit.
+
+    :param results: (tx_hash, error) per transaction, in nonce order.
+    :return: (gaps, tail): indexes of rejected transactions that a later
+             accepted one queues behind, and of those after the last accepted one.
+    """
+    accepted = [index for index, (_, error) in enumerate(results) if error is None]
+    last_accepted = accepted[-1] if accepted else -1
+    rejected = [index for index, (_, error) in enumerate(results) if error is not None]
+    return [index for index in rejected if index < last_accepted], [index for index in rejected if index > last_accepted]
+
+
+def sign_transaction(tx, private_key):
+    """
+    Signs one transaction and returns the raw bytes (top level so process
+    pool workers can run it).
+    """
+    from eth_account import Account
+
+    return bytes(Account.sign_transaction(tx, private_key).raw_transaction)
+
+
+def sign_all(txs, private_key, workers=0):
+    """
+    Signs every transaction, spread over a process pool when workers > 1.
+    """
+    private_key = bytes(private_key) if not isinstance(private_key, str) else private_key
+    with tracer.span("sign", count=len(txs), workers=workers):
+        if workers > 1 and len(txs) > workers:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                chunksize = max(1, len(txs) // (workers * 4))
+                return list(pool.map(sign_transaction, txs, itertools.repeat(private_key), chunksize=chunksize))
+        return [sign_transaction(tx, private_key) for tx in txs]
+
+
+def submit_raw_transactions(web3, raw_txs, chunk_size=100):
+    """
+    Broadcasts signed transactions back-to-back, chunk_size per batched
+    request. Stops after the first chunk with a rejected transaction, since
+    later nonces would only queue behind the gap (see split_rejected for the
+    ones of that chunk that were accepted anyway).
+
+    A chunk whose request fails in transit is never re-posted (the node may
+    already have it): its transactions are returned with their locally
+    computed hashes so the receipts decide, and later chunks are not sent.
+
+    :return: List of (tx_hash, error) per transaction; unsent ones get an error.
+    """
+    from eth_utils import keccak
+    from rpc_transport import SendOutcomeUnknown
+
+    provider = web3.provider
+    results = []
+    for start in range(0, len(raw_txs), chunk_size):
+        chunk = raw_txs[start:start + chunk_size]
+        calls = [("eth_sendRawTransaction", ["0x" + raw.hex()]) for raw in chunk]
+        try:
+            with tracer.span("broadcast", count=len(calls)):
+                if hasattr(provider, "make_batch_request"):
+                    responses = provider.make_batch_request(calls)
+                else:
+                    responses = [provider.make_request(method, params) for method, params in calls]
+        except SendOutcomeUnknown as e:
+            print(f"⚠️ Broadcast outcome unknown ({e}), checking receipts instead of resending.")
+            results.extend(("0x" + keccak(raw).hex(), None) for raw in chunk)
+            break
+        for response in responses:
+            if "error" in response:
+                error = response["error"]
+                results.append((None, str(error.get("message", error) if isinstance(error, dict) else error)))
+            else:
+                results.append((response.get("result"), None))
+        if any(error is not None for _, error in results[start:]):
+            break
+    results.extend((None, "Not sent (an earlier transaction was rejected).") for _ in raw_txs[len(results):])
+    return results
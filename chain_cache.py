@@ -0,0 +1,187 @@
+import threading
+import time
+
+from tracing import tracer
+
+# -----------------------------------------------------------------------------
+# Block-Scoped Chain State Cache
+# -----------------------------------------------------------------------------
+
+DECIMALS_SELECTOR = "0x313ce567"  # decimals()
+
+
+class ChainStateCache:
+    """
+    Caches chain reads that rarely change between transactions.
+
+    - Gas price is cached for the current block and dropped when a new head
+      is seen by the background poller.
+    - Gas estimates are cached per (target, selector, calldata length) for estimate_ttl_blocks
+      blocks and served with a safety margin. They are refreshed early when a
+      transaction using them runs out of gas.
+    - Static values (e.g. token decimals) are cached for the process lifetime.
+    """
+
+    def __init__(self, web3, poll_interval=2.0, margin=1.2, estimate_ttl_blocks=100):
+        self.web3 = web3
+        self.poll_interval = poll_interval
+        self.margin = margin
+        self.estimate_ttl_blocks = estimate_ttl_blocks
+        self._lock = threading.Lock()
+        self._block_number = None
+        self._gas_price = None
+        self._estimates = {}
+        self._static = {}
+        self._poller = None
+        self._stopped = False
+
+    # -------------------------------------------------------------------------
+    # New-head polling
+    # -------------------------------------------------------------------------
+
+    def start(self):
+        """
+        Starts the new-head poller if it isn't already running.
+        """
+        with self._lock:
+            if self._poller is not None and self._poller.is_alive():
+                return
+            self._stopped = False
+            self._poller = threading.Thread(target=self._poll_heads, name="chain-cache-heads", daemon=True)
+            self._poller.start()
+
+    def stop(self):
+        self._stopped = True
+
+    def _poll_heads(self):
+        while not self._stopped:
+            try:
+                self.on_new_head(self.web3.eth.block_number)
+            except Exception as e:
+                print(f"Chain cache head poll failed: {e}")
+            time.sleep(self.poll_interval)
+
+    def on_new_head(self, block_number):
+        """
+        Records the latest block number, invalidating block-scoped entries.
+        """
+        with self._lock:
+            if block_number != self._block_number:
+                self._block_number = block_number
+                self._gas_price = None
+
+    def block_number(self):
+        with self._lock:
+            block_number = self._block_number
+        if block_number is None:
+            self.on_new_head(self.web3.eth.block_number)
+            self.start()
+            with self._lock:
+                block_number = self._block_number
+        return block_number
+
+    # -------------------------------------------------------------------------
+    # Cached reads
+    # -------------------------------------------------------------------------
+
+    def gas_price(self):
+        """
+        Returns the gas price for the current block, fetching it once per block.
+        """
+        self.block_number()
+        with self._lock:
+            if self._gas_price is not None:
+                return self._gas_price
+        gas_price = self.web3.eth.gas_price
+        with self._lock:
+            self._gas_price = gas_price
+        return gas_price
+
+    def cached_gas_price(self):
+        """
+        Returns the gas price cached for the current block, or None.
+        """
+        with self._lock:
+            return self._gas_price
+
+    def set_gas_price(self, gas_price):
+        """
+        Stores a gas price read elsewhere (e.g. in a batched request) for this block.
+        """
+        self.block_number()
+        with self._lock:
+            self._gas_price = gas_price
+
+    @staticmethod
+    def estimate_key(tx):
+        """
+        Builds the (target, selector, calldata length) key an estimate is
+        cached under. Dynamic arguments change the length, so e.g. a swap
+        over a longer path (more hops, more gas) gets its own estimate.
+        """
+        data = tx.get("data") or "0x"
+        if isinstance(data, bytes):
+            data = "0x" + data.hex()
+        return (str(tx.get("to", "")).lower(), data[:10], len(data))
+
+    def estimate_gas(self, tx, buffer=0):
+        """
+        Returns a gas limit for tx: the cached (or freshly estimated) gas for
+        its key (see estimate_key), scaled by the safety margin, plus buffer.
+        """
+        key = self.estimate_key(tx)
+        block_number = self.block_number()
+        with self._lock:
+            cached = self._estimates.get(key)
+        if cached is None or block_number - cached[1] >= self.estimate_ttl_blocks:
+            with tracer.span("gas_estimate"):
+                estimate = self.web3.eth.estimate_gas(tx)
+            with self._lock:
+                self._estimates[key] = (estimate, block_number)
+        else:
+            estimate = cached[0]
+        return int(estimate * self.margin) + buffer
+
+    def cached_estimate(self, tx, buffer=0):
+        """
+        Returns the cached gas limit for tx without touching the chain, or None.
+        Useful when estimation would revert (e.g. behind a pending approval).
+        """
+        with self._lock:
+            cached = self._estimates.get(self.estimate_key(tx))
+        if cached is None:
+            return None
+        return int(cached[0] * self.margin) + buffer
+
+    def invalidate_estimate(self, tx):
+        with self._lock:
+            self._estimates.pop(self.estimate_key(tx), None)
+
+    def check_receipt(self, tx, receipt):
+        """
+        Drops the cached estimate for tx if its receipt shows it ran out of gas.
+        """
+        if receipt is not None and receipt.status != 1 and receipt.gasUsed >= tx.get("gas", 0):
+            self.invalidate_estimate(tx)
+
+    def static(self, key, loader):
+        """
+        Returns a value that never changes on chain, calling loader() once.
+        """
+        with self._lock:
+            if key in self._static:
+                return self._static[key]
+        value = loader()
+        with self._lock:
+            self._static[key] = value
+        return value
+
+    def token_decimals(self, token_address):
+        """
+        Returns an ERC-20 token's decimals, read from chain only once.
+        """
+        def load_decimals():
+            result = self.web3.eth.call({"to": token_address, "data": DECIMALS_SELECTOR})
+            return int.from_bytes(result, "big")
+
+        return self.static(("decimals", token_address.lower()), load_decimals)
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+
+# -----------------------------------------------------------------------------
+# Import-Time Budget Check
+# -----------------------------------------------------------------------------
+
+# Modules that must stay importable without web3/langchain or network access
+LIBRARY_MODULES = ["agent", "DumpySwapScript", "mezo_context"]
+
+# Heavy dependencies that must only be imported on first use
+DEFERRED_MODULES = ["web3", "langchain", "langchain_openai", "dotenv"]
+
+IMPORT_BUDGET_MS = float(os.getenv("MEZO_IMPORT_BUDGET_MS", "50"))
+
+
+def measure_import(module):
+    """
+    Imports module in a fresh interpreter with -X importtime and returns
+    (cumulative import time in ms, heavy modules that got imported).
+    """
+    code = (
+        f"import {module}, sys; "
+        f"print(','.join(m for m in {DEFERRED_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        check=True,
+    )
+    cumulative_us = 0
+    for line in result.stderr.splitlines():
+        # Format: "import time: self [us] | cumulative | imported package"
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            cumulative_us = int(parts[1].strip())
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+    return cumulative_us / 1000, loaded
+
+
+if __name__ == "__main__":
+    failed = False
+    for module in LIBRARY_MODULES:
+        elapsed_ms, loaded = measure_import(module)
+        status = "ok"
+        if elapsed_ms > IMPORT_BUDGET_MS:
+            status = f"over budget ({IMPORT_BUDGET_MS:.0f} ms)"
+            failed = True
+        if loaded:
+            status = f"imported {', '.join(loaded)} eagerly"
+            failed = True
+        print(f"{module}: {elapsed_ms:.1f} ms {status}")
+    sys.exit(1 if failed else 0)
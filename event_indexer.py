@@ -0,0 +1,413 @@
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from multicall import erc20_balance_call, hex_to_bytes
+from rpc_transport import batch_request
+
+# -----------------------------------------------------------------------------
+# Local Event Indexer
+# -----------------------------------------------------------------------------
+
+# keccak("Transfer(address,address,uint256)")
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+# keccak("Swap(address,uint256,uint256,uint256,uint256,address)"), emitted by UniswapV2-style pairs
+SWAP_TOPIC = "0xd78ad95fa46c994b6551d0da85fc275fe613ce37657fb8d5e3d130840159d822"
+
+# eth_getLogs errors that mean "ask for a smaller block range"
+RANGE_TOO_LARGE_ERRORS = ("range", "too many", "limit", "exceed", "more than")
+
+HistoryEntry = namedtuple(
+    "HistoryEntry", ["block_number", "timestamp", "tx_hash", "kind", "token", "amount", "counterparty", "token_out", "amount_out"]
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS blocks (block_number INTEGER PRIMARY KEY, block_hash TEXT NOT NULL, timestamp INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS baselines (
+    owner TEXT NOT NULL, token TEXT NOT NULL, block_number INTEGER NOT NULL, amount TEXT NOT NULL,
+    PRIMARY KEY (owner, token)
+);
+CREATE TABLE IF NOT EXISTS transfers (
+    tx_hash TEXT NOT NULL, log_index INTEGER NOT NULL, block_number INTEGER NOT NULL,
+    token TEXT NOT NULL, from_addr TEXT NOT NULL, to_addr TEXT NOT NULL, amount TEXT NOT NULL,
+    PRIMARY KEY (tx_hash, log_index)
+);
+CREATE INDEX IF NOT EXISTS transfers_from ON transfers (from_addr, block_number);
+CREATE INDEX IF NOT EXISTS transfers_to ON transfers (to_addr, block_number);
+CREATE TABLE IF NOT EXISTS swaps (
+    tx_hash TEXT NOT NULL, log_index INTEGER NOT NULL, block_number INTEGER NOT NULL,
+    pair TEXT NOT NULL, to_addr TEXT NOT NULL, token_in TEXT NOT NULL, amount_in TEXT NOT NULL,
+    token_out TEXT NOT NULL, amount_out TEXT NOT NULL,
+    PRIMARY KEY (tx_hash, log_index)
+);
+CREATE INDEX IF NOT EXISTS swaps_to ON swaps (to_addr, block_number);
+"""
+
+
+def address_topic(address):
+    return "0x" + "0" * 24 + address.lower()[2:]
+
+
+def topic_address(topic):
+    return "0x" + topic[-40:].lower()
+
+
+class EventIndexer:
+    """
+    Follows eth_getLogs in block-range chunks and stores the owners' token
+    transfers and pair swaps in an indexed SQLite file.
+
+    - Each chunk is one batched request (sent, received and swap logs), and
+      the chunk shrinks automatically when a node rejects the range.
+    - Indexing resumes from the last indexed block. Block hashes of the
+      last reorg_depth blocks are re-checked before every sync; on a mismatch
+      the re-checked window is dropped and indexed again.
+    - Balances are a baseline read at the chain head plus transfers indexed
+      after it, so no archive state is needed and balance and history
+      lookups never touch the network. Owners added later get their own
+      baseline and a history backfill on the next sync.
+    """
+
+    def __init__(self, web3, db_path, tokens, owners, pairs=None, start_block=None,
+                 lookback_blocks=250000, chunk_size=5000, reorg_depth=12):
+        self.web3 = web3
+        self.tokens = {address.lower(): symbol for address, symbol in tokens.items()}
+        self.owners = [owner.lower() for owner in owners]
+        self.pairs = {pair.lower(): (token0.lower(), token1.lower()) for pair, (token0, token1) in (pairs or {}).items()}
+        self.start_block = start_block
+        self.lookback_blocks = lookback_blocks
+        self.chunk_size = chunk_size
+        self.reorg_depth = reorg_depth
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()  # One sync at a time (follower thread vs. on-demand)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+        self._thread = None
+        self._stopped = False
+
+    # -------------------------------------------------------------------------
+    # Indexing
+    # -------------------------------------------------------------------------
+
+    def last_block(self):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'last_block'").fetchone()
+        return int(row[0]) if row else None
+
+    def _set_last_block(self, block_number):
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_block', ?)", (str(block_number),))
+
+    def first_block(self):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'first_block'").fetchone()
+            if row is None:
+                # Indexes created before first_block was stored have their baselines just before it
+                row = self._db.execute("SELECT MIN(block_number) + 1 FROM baselines").fetchone()
+        return int(row[0]) if row and row[0] is not None else None
+
+    def _record_baselines(self, owners, block_number):
+        """
+        Stores the owners' token balances at block_number (a recent block, so
+        any node can serve it). Only transfers after it are added on top.
+        """
+        calls = [(owner, token, erc20_balance_call(token, owner)) for owner in owners for token in self.tokens]
+        results = batch_request(self.web3, [call.rpc_call(hex(block_number)) for _, _, call in calls])
+        with self._lock:
+            for (owner, token, call), result in zip(calls, results):
+                self._db.execute(
+                    "INSERT OR REPLACE INTO baselines (owner, token, block_number, amount) VALUES (?, ?, ?, ?)",
+                    (owner, token, block_number, str(call.decode(hex_to_bytes(result)))),
+                )
+            self._db.commit()
+
+    def _initialize(self, latest):
+        """
+        Picks the first block to index and records the owners' balances at
+        the head. History is then indexed forward from the first block.
+        """
+        start_block = self.start_block if self.start_block is not None else max(0, latest - self.lookback_blocks)
+        self._record_baselines(self.owners, latest)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('first_block', ?)", (str(start_block),))
+            self._set_last_block(start_block - 1)
+            self._db.commit()
+        print(f"Event indexer starting at block {start_block}.")
+        return start_block - 1
+
+    def _add_owners(self, latest, last_block):
+        """
+        Initializes owners without a baseline (e.g. signers added to
+        MEZO_SIGNER_KEYS after the index was created): reads their balances
+        at the head and backfills their history up to last_block.
+        """
+        with self._lock:
+            known = {row[0] for row in self._db.execute("SELECT DISTINCT owner FROM baselines")}
+        missing = [owner for owner in self.owners if owner not in known]
+        if not missing:
+            return
+        from_block = self.first_block()
+        self._record_baselines(missing, latest)
+        if from_block is None or from_block > last_block:
+            return
+        print(f"Event indexer backfilling {len(missing)} new account(s) from block {from_block}.")
+        self._index_chunks(missing, from_block - 1, last_block, advance=False)
+
+    def _check_reorg(self, last_block, latest):
+        """
+        Compares stored hashes of recent blocks with the chain and, on a
+        mismatch, rolls the index back past the fork point. Baselines read
+        after the fork point are read again at latest.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT block_number, block_hash FROM blocks WHERE block_number > ? ORDER BY block_number",
+                (last_block - self.reorg_depth,),
+            ).fetchall()
+        if not rows:
+            return last_block
+        blocks = batch_request(self.web3, [("eth_getBlockByNumber", [hex(number), False]) for number, _ in rows])
+        changed = [number for (number, stored_hash), block in zip(rows, blocks) if not block or block["hash"] != stored_hash]
+        if not changed:
+            return last_block
+
+        # Only blocks with logs have stored hashes, so the fork may start anywhere after the last
+        # block that still matches. Roll back to that block or the re-checked window, whichever is lower.
+        first_changed = changed[0]
+        matching = [number for number, _ in rows if number < first_changed]
+        rollback_to = min(matching[-1] if matching else first_changed - 1, last_block - self.reorg_depth)
+        first_block = self.first_block()
+        if first_block is not None:
+            # Never below the first indexed block, nothing before it is stored
+            rollback_to = max(rollback_to, first_block - 1)
+        with self._lock:
+            stale = [row[0] for row in self._db.execute(
+                "SELECT DISTINCT owner FROM baselines WHERE block_number > ?", (rollback_to,)
+            )]
+            print(f"⚠️ Reorg detected at block {first_changed}, re-indexing from block {rollback_to + 1}.")
+            for table in ("transfers", "swaps", "blocks"):
+                self._db.execute(f"DELETE FROM {table} WHERE block_number > ?", (rollback_to,))
+            self._set_last_block(rollback_to)
+            self._db.commit()
+        if stale:
+            self._record_baselines(stale, latest)
+        return rollback_to
+
+    def _fetch_logs(self, owners, from_block, to_block):
+        owner_topics = [address_topic(owner) for owner in owners]
+        block_range = {"fromBlock": hex(from_block), "toBlock": hex(to_block)}
+        calls = [
+            ("eth_getLogs", [dict(block_range, address=list(self.tokens), topics=[TRANSFER_TOPIC, owner_topics])]),
+            ("eth_getLogs", [dict(block_range, address=list(self.tokens), topics=[TRANSFER_TOPIC, None, owner_topics])]),
+        ]
+        if self.pairs:
+            calls.append(("eth_getLogs", [dict(block_range, address=list(self.pairs), topics=[SWAP_TOPIC, None, owner_topics])]))
+        results = batch_request(self.web3, calls)
+        transfer_logs = results[0] + results[1]
+        swap_logs = results[2] if self.pairs else []
+        return transfer_logs, swap_logs
+
+    def _index_range(self, owners, from_block, to_block, advance=True):
+        transfer_logs, swap_logs = self._fetch_logs(owners, from_block, to_block)
+
+        # Timestamps (for "last week" queries) and hashes (for reorg checks) of
+        # every block with a log, plus the chunk's last block
+        numbers = sorted({int(log["blockNumber"], 16) for log in transfer_logs + swap_logs} | {to_block})
+        blocks = batch_request(self.web3, [("eth_getBlockByNumber", [hex(number), False]) for number in numbers])
+
+        with self._lock:
+            for number, block in zip(numbers, blocks):
+                self._db.execute(
+                    "INSERT OR REPLACE INTO blocks (block_number, block_hash, timestamp) VALUES (?, ?, ?)",
+                    (number, block["hash"], int(block["timestamp"], 16)),
+                )
+            for log in transfer_logs:
+                self._db.execute(
+                    "INSERT OR IGNORE INTO transfers VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        log["transactionHash"], int(log["logIndex"], 16), int(log["blockNumber"], 16),
+                        log["address"].lower(), topic_address(log["topics"][1]), topic_address(log["topics"][2]),
+                        str(int(log["data"], 16)),
+                    ),
+                )
+            for log in swap_logs:
+                token0, token1 = self.pairs[log["address"].lower()]
+                data = log["data"][2:]
+                amount0_in, amount1_in, amount0_out, amount1_out = (int(data[i:i + 64], 16) for i in range(0, 256, 64))
+                token_in, amount_in = (token0, amount0_in) if amount0_in else (token1, amount1_in)
+                token_out, amount_out = (token0, amount0_out) if amount0_out else (token1, amount1_out)
+                self._db.execute(
+                    "INSERT OR IGNORE INTO swaps VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        log["transactionHash"], int(log["logIndex"], 16), int(log["blockNumber"], 16),
+                        log["address"].lower(), topic_address(log["topics"][2]),
+                        token_in, str(amount_in), token_out, str(amount_out),
+                    ),
+                )
+            if advance:
+                self._set_last_block(to_block)
+            self._db.commit()
+
+    def sync(self, max_chunks=None):
+        """
+        Indexes from the last indexed block up to the chain head.
+
+        :param max_chunks: Stop after this many chunks (None indexes to the head).
+        :return: The last indexed block.
+        """
+        with self._sync_lock:
+            return self._sync(max_chunks)
+
+    def _sync(self, max_chunks):
+        latest = self.web3.eth.block_number
+        last_block = self.last_block()
+        if last_block is None:
+            last_block = self._initialize(latest)
+        else:
+            last_block = self._check_reorg(last_block, latest)
+            self._add_owners(latest, last_block)
+        return self._index_chunks(self.owners, last_block, latest, max_chunks)
+
+    def _index_chunks(self, owners, last_block, latest, max_chunks=None, advance=True):
+        """
+        Indexes the owners' logs after last_block up to latest in chunks,
+        halving the chunk size when the node rejects a range.
+        """
+        chunks = 0
+        while last_block < latest and (max_chunks is None or chunks < max_chunks):
+            to_block = min(latest, last_block + self.chunk_size)
+            try:
+                self._index_range(owners, last_block + 1, to_block, advance)
+            except ValueError as e:
+                if self.chunk_size > 1 and any(fragment in str(e).lower() for fragment in RANGE_TOO_LARGE_ERRORS):
+                    self.chunk_size = max(1, self.chunk_size // 2)
+                    continue
+                raise
+            last_block = to_block
+            chunks += 1
+        return last_block
+
+    def start(self, interval=15.0):
+        """
+        Follows the chain head from a daemon thread, syncing every interval seconds.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._follow, args=(interval,), name="event-indexer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped = True
+
+    def _follow(self, interval):
+        while not self._stopped:
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Event indexer sync failed: {e}")
+            time.sleep(interval)
+
+    # -------------------------------------------------------------------------
+    # Queries (served from SQLite only)
+    # -------------------------------------------------------------------------
+
+    def balances(self, owner):
+        """
+        Returns ({token symbol: balance in wei}, last indexed block) for owner.
+        """
+        owner = owner.lower()
+        with self._lock:
+            balances = {
+                token: int(amount)
+                for token, amount in self._db.execute("SELECT token, amount FROM baselines WHERE owner = ?", (owner,))
+            }
+            # Only transfers after the owner's baseline block change the balance
+            rows = self._db.execute(
+                "SELECT t.token, t.from_addr, t.to_addr, t.amount FROM transfers t "
+                "JOIN baselines b ON b.owner = ? AND b.token = t.token "
+                "WHERE (t.from_addr = ? OR t.to_addr = ?) AND t.block_number > b.block_number",
+                (owner, owner, owner),
+            ).fetchall()
+            last_block = self._db.execute("SELECT value FROM meta WHERE key = 'last_block'").fetchone()
+        for token, from_addr, to_addr, amount in rows:
+            if to_addr == owner:
+                balances[token] = balances.get(token, 0) + int(amount)
+            if from_addr == owner:
+                balances[token] = balances.get(token, 0) - int(amount)
+        return (
+            {self.tokens.get(token, token): amount for token, amount in balances.items()},
+            int(last_block[0]) if last_block else None,
+        )
+
+    def history(self, owner, direction=None, token=None, since=None, counterparty=None, limit=20):
+        """
+        Returns the owner's most recent transfers and swaps, newest first.
+
+        :param direction: "out", "in", "swap" or None for everything.
+        :param token: Token symbol to filter on (e.g. "mUSD"), or None.
+        :param since: Unix timestamp lower bound, or None.
+        :param counterparty: Only transfers to/from this address.
+        """
+        owner = owner.lower()
+        token_address = next((address for address, symbol in self.tokens.items() if symbol == token), None)
+        since = since or 0
+        entries = []
+        with self._lock:
+            if direction in (None, "out", "in"):
+                # A transfer is "out" when the owner sent it (self-transfers included)
+                other = "(CASE WHEN t.from_addr = ? THEN t.to_addr ELSE t.from_addr END)"
+                query = (
+                    "SELECT t.block_number, b.timestamp, t.tx_hash, t.token, t.from_addr, t.to_addr, t.amount "
+                    "FROM transfers t JOIN blocks b ON b.block_number = t.block_number WHERE b.timestamp >= ?"
+                )
+                params = [since]
+                if direction == "out":
+                    query += " AND t.from_addr = ?"
+                    params.append(owner)
+                elif direction == "in":
+                    query += " AND t.to_addr = ? AND t.from_addr != ?"
+                    params += [owner, owner]
+                else:
+                    query += " AND (t.from_addr = ? OR t.to_addr = ?)"
+                    params += [owner, owner]
+                if token_address is not None:
+                    query += " AND t.token = ?"
+                    params.append(token_address)
+                if counterparty:
+                    query += f" AND {other} = ?"
+                    params += [owner, counterparty.lower()]
+                if self.pairs:
+                    # Swap legs are reported as swaps
+                    query += f" AND {other} NOT IN ({', '.join('?' * len(self.pairs))})"
+                    params += [owner, *self.pairs]
+                query += " ORDER BY t.block_number DESC, t.log_index DESC LIMIT ?"
+                params.append(limit)
+                for number, timestamp, tx_hash, token_addr, from_addr, to_addr, amount in self._db.execute(query, params):
+                    kind = "out" if from_addr == owner else "in"
+                    entries.append(HistoryEntry(
+                        number, timestamp, tx_hash, kind, self.tokens.get(token_addr, token_addr), int(amount),
+                        to_addr if kind == "out" else from_addr, None, None,
+                    ))
+            if direction in (None, "swap") and counterparty is None:
+                query = (
+                    "SELECT s.block_number, b.timestamp, s.tx_hash, s.token_in, s.amount_in, s.token_out, s.amount_out "
+                    "FROM swaps s JOIN blocks b ON b.block_number = s.block_number "
+                    "WHERE s.to_addr = ? AND b.timestamp >= ?"
+                )
+                params = [owner, since]
+                if token_address is not None:
+                    query += " AND (s.token_in = ? OR s.token_out = ?)"
+                    params += [token_address, token_address]
+                query += " ORDER BY s.block_number DESC, s.log_index DESC LIMIT ?"
+                params.append(limit)
+                for number, timestamp, tx_hash, token_in, amount_in, token_out, amount_out in self._db.execute(query, params):
+                    entries.append(HistoryEntry(
+                        number, timestamp, tx_hash, "swap", self.tokens.get(token_in, token_in), int(amount_in), None,
+                        self.tokens.get(token_out, token_out), int(amount_out),
+                    ))
+        entries.sort(key=lambda entry: entry.block_number, reverse=True)
+        return entries[:limit]
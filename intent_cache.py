@@ -0,0 +1,157 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# -----------------------------------------------------------------------------
+# Parsed Intent Cache
+# -----------------------------------------------------------------------------
+
+ADDRESS_PATTERN = re.compile(r"(0x[a-fA-F0-9]{40})")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Collapses whitespace and lowercases a prompt so trivially different
+    spellings share a cache entry. Addresses keep their case (checksums).
+    """
+    parts = ADDRESS_PATTERN.split(" ".join(prompt.split()))
+    return "".join(part if ADDRESS_PATTERN.fullmatch(part) else part.lower() for part in parts)
+
+
+def schema_version(*format_instructions) -> str:
+    """
+    Derives a short version tag from parser format instructions, so cached
+    entries are invalidated automatically when a schema changes.
+    """
+    digest = hashlib.sha256("\n".join(format_instructions).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+class IntentCache:
+    """
+    Bounded LRU cache with a TTL for parsed intents, optionally backed by a
+    SQLite file so entries survive restarts.
+
+    Only successful parses (dicts) are stored; error strings and exceptions
+    are never cached.
+    """
+
+    def __init__(self, max_size=1024, ttl=3600, db_path=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS intent_cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM intent_cache WHERE expires_at <= ?", (time.time(),))
+            self._db.commit()
+
+    @staticmethod
+    def make_key(namespace, version, prompt):
+        return f"{namespace}:{version}:{normalize_prompt(prompt)}"
+
+    def get(self, key):
+        """
+        Returns the cached value for key, or None on a miss or expired entry.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return value
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM intent_cache WHERE key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._store_memory(key, value, row[1])
+                    self._stats["hits"] += 1
+                    self._stats["disk_hits"] += 1
+                    return value
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key, value):
+        """
+        Stores a successful parse. Non-dict values (error messages) are ignored.
+        """
+        if not isinstance(value, dict):
+            return
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store_memory(key, value, expires_at)
+            self._stats["stores"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO intent_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at),
+                )
+                self._db.commit()
+
+    def _store_memory(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def get_or_compute(self, namespace, version, prompt, compute):
+        """
+        Returns the cached parse for prompt, calling compute(prompt) on a miss
+        and caching its result if it succeeded.
+        """
+        key = self.make_key(namespace, version, prompt)
+        value = self.get(key)
+        if value is None:
+            value = compute(prompt)
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        """
+        Returns hit/miss counters and the overall hit rate.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def prometheus_lines(self):
+        """
+        Renders the counters and hit rate for Tracer.prometheus_text().
+        """
+        stats = self.stats()
+        return [
+            "# HELP mezo_intent_cache_total Parsed-intent cache lookups and stores.",
+            "# TYPE mezo_intent_cache_total counter",
+            f'mezo_intent_cache_total{{result="hit"}} {stats["hits"]}',
+            f'mezo_intent_cache_total{{result="disk_hit"}} {stats["disk_hits"]}',
+            f'mezo_intent_cache_total{{result="miss"}} {stats["misses"]}',
+            f'mezo_intent_cache_total{{result="store"}} {stats["stores"]}',
+            "# HELP mezo_intent_cache_hit_rate Share of lookups served from the cache.",
+            "# TYPE mezo_intent_cache_hit_rate gauge",
+            f"mezo_intent_cache_hit_rate {stats['hit_rate']}",
+            "# HELP mezo_intent_cache_entries Entries held in memory.",
+            "# TYPE mezo_intent_cache_entries gauge",
+            f"mezo_intent_cache_entries {stats['size']}",
+        ]
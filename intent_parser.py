@@ -0,0 +1,183 @@
+import re
+import threading
+
+# -----------------------------------------------------------------------------
+# Deterministic Fast-Path Intent Parser
+# -----------------------------------------------------------------------------
+
+ADDRESS_PATTERN = re.compile(r"\b0x[a-fA-F0-9]{40}\b")
+
+# Commands are matched against the whole prompt: an optional polite prefix,
+# the verb, amount, currency and target, and optional closing punctuation.
+# Anything else ("don't send...", "...unless my balance is low") goes to the LLM.
+POLITE_PREFIX = r"(?:(?:please|kindly)\s+|(?P<ask>(?:can|could|would)\s+you\s+(?:please\s+)?))?"
+AMOUNT = r"(?P<amount>\d+(?:\.\d+)?|\.\d+)"
+CLOSING = r"\s*(?(ask)[.!?]?|[.!]?)"
+
+TRANSFER_VERBS = re.compile(r"\b(send|transfer|pay)\b", re.IGNORECASE)
+TRANSFER_PATTERN = re.compile(
+    POLITE_PREFIX + r"(?:send|transfer|pay)\s+" + AMOUNT + r"\s*(?P<currency>btc|musd)"
+    r"\s+to\s+(?P<recipient>0x[a-fA-F0-9]{40})" + CLOSING,
+    re.IGNORECASE,
+)
+
+SWAP_VERBS = re.compile(r"\b(swap|exchange|convert|trade)\b", re.IGNORECASE)
+SWAP_PATTERN = re.compile(
+    POLITE_PREFIX + r"(?:swap|exchange|convert|trade)\s+" + AMOUNT + r"\s*musd"
+    r"\s+(?:for|to|into)\s+(?:w(?:rapped)?\s*)?btc(?:\s+(?:on|via)\s+dumpy\s*swap)?" + CLOSING,
+    re.IGNORECASE,
+)
+
+BALANCE_PATTERN = re.compile(r"\b(balance|balances|how much)\b", re.IGNORECASE)
+
+HISTORY_PATTERN = re.compile(
+    r"\b(history|histories|transactions|activity|did i (?:send|receive|swap|pay)|(?:have i|i) (?:sent|received|swapped|paid)"
+    r"|what (?:did|have) i (?:send|receive|swap|pay|sent|received|swapped|paid)|my (?:swaps|transfers|payments))\b",
+    re.IGNORECASE,
+)
+HISTORY_OUT = re.compile(r"\b(send|sent|pay|paid|outgoing)\b", re.IGNORECASE)
+HISTORY_IN = re.compile(r"\b(receive|received|got|incoming)\b", re.IGNORECASE)
+HISTORY_SWAP = re.compile(r"\b(swap|swaps|swapped)\b", re.IGNORECASE)
+LOOKBACK_PATTERN = re.compile(r"\b(?:last|past)\s+(?:(?P<count>\d+)\s+)?(?P<unit>hour|day|week|month)s?\b", re.IGNORECASE)
+LOOKBACK_SECONDS = {"hour": 3600, "day": 86400, "week": 7 * 86400, "month": 30 * 86400}
+
+CURRENCY_NAMES = {"btc": "BTC", "musd": "mUSD"}
+
+
+# Prompt kinds with their own hit/miss counters
+PARSE_KINDS = ("transfer", "swap", "balance", "history")
+
+
+def hit_rates(stats):
+    """
+    Returns {kind: share of lookups the regexes answered} from
+    FastIntentParser.stats() counters (or the difference of two snapshots).
+    """
+    rates = {}
+    for kind in PARSE_KINDS:
+        lookups = stats[f"{kind}_hits"] + stats[f"{kind}_misses"]
+        rates[kind] = stats[f"{kind}_hits"] / lookups if lookups else 0.0
+    return rates
+
+
+class FastIntentParser:
+    """
+    Compiled regex parser for well-formed transfer and swap commands.
+
+    Returns the same dict shapes as the LLM output parsers when the whole
+    prompt is a plain command and None otherwise, so callers can fall back
+    to the LLM. Hit/miss counters are kept per kind.
+    """
+
+    def __init__(self, router_address):
+        self.router_address = router_address
+        self._lock = threading.Lock()
+        self._counters = {f"{kind}_{result}": 0 for kind in PARSE_KINDS for result in ("hits", "misses")}
+
+    def _record(self, kind, hit):
+        with self._lock:
+            self._counters[f"{kind}_{'hits' if hit else 'misses'}"] += 1
+
+    def parse_transfer(self, prompt: str):
+        """
+        Parses "send <amount> <BTC|mUSD> to <address>" style prompts.
+        Returns {"amount", "currency", "recipient"} or None.
+        """
+        result = None
+        match = TRANSFER_PATTERN.fullmatch(prompt.strip())
+        if match:
+            result = {
+                "amount": match.group("amount"),
+                "currency": CURRENCY_NAMES[match.group("currency").lower()],
+                "recipient": match.group("recipient"),
+            }
+        self._record("transfer", result is not None)
+        return result
+
+    def parse_swap(self, prompt: str):
+        """
+        Parses "swap <amount> mUSD for BTC" style prompts.
+        Returns {"amount", "from_currency", "to_currency", "router_address"} or None.
+        """
+        result = None
+        match = SWAP_PATTERN.fullmatch(prompt.strip())
+        if match:
+            result = {
+                "amount": match.group("amount"),
+                "from_currency": "mUSD",
+                "to_currency": "BTC",
+                "router_address": self.router_address,
+            }
+        self._record("swap", result is not None)
+        return result
+
+    def parse_balance(self, prompt: str):
+        """
+        Recognizes "what's my balance" style prompts.
+        Returns {"query": "balance"} or None.
+        """
+        result = None
+        if (BALANCE_PATTERN.search(prompt) and not TRANSFER_VERBS.search(prompt)
+                and not SWAP_VERBS.search(prompt) and not ADDRESS_PATTERN.search(prompt)):
+            result = {"query": "balance"}
+        self._record("balance", result is not None)
+        return result
+
+    def parse_history(self, prompt: str):
+        """
+        Recognizes "what did I send last week" style history questions.
+        Returns {"direction", "currency", "lookback_seconds", "counterparty"}
+        (any of them may be None) or None.
+        """
+        result = None
+        if HISTORY_PATTERN.search(prompt):
+            direction = None
+            if HISTORY_SWAP.search(prompt):
+                direction = "swap"
+            elif HISTORY_OUT.search(prompt):
+                direction = "out"
+            elif HISTORY_IN.search(prompt):
+                direction = "in"
+            currencies = {CURRENCY_NAMES[c.lower()] for c in re.findall(r"\b(btc|musd)\b", prompt, re.IGNORECASE)}
+            lookback = None
+            if re.search(r"\btoday\b", prompt, re.IGNORECASE):
+                lookback = LOOKBACK_SECONDS["day"]
+            match = LOOKBACK_PATTERN.search(prompt)
+            if match:
+                lookback = int(match.group("count") or 1) * LOOKBACK_SECONDS[match.group("unit").lower()]
+            addresses = ADDRESS_PATTERN.findall(prompt)
+            result = {
+                "direction": direction,
+                "currency": currencies.pop() if len(currencies) == 1 else None,
+                "lookback_seconds": lookback,
+                "counterparty": addresses[0] if len(addresses) == 1 else None,
+            }
+        self._record("history", result is not None)
+        return result
+
+    def stats(self):
+        """
+        Returns a copy of the hit/miss counters.
+        """
+        with self._lock:
+            return dict(self._counters)
+
+    def prometheus_lines(self):
+        """
+        Renders the counters and hit rates for Tracer.prometheus_text().
+        """
+        stats = self.stats()
+        lines = [
+            "# HELP mezo_fast_parser_total Deterministic intent parser lookups.",
+            "# TYPE mezo_fast_parser_total counter",
+        ]
+        for kind in PARSE_KINDS:
+            lines.append(f'mezo_fast_parser_total{{kind="{kind}",result="hit"}} {stats[f"{kind}_hits"]}')
+            lines.append(f'mezo_fast_parser_total{{kind="{kind}",result="miss"}} {stats[f"{kind}_misses"]}')
+        lines += [
+            "# HELP mezo_fast_parser_hit_rate Share of lookups answered without the LLM.",
+            "# TYPE mezo_fast_parser_hit_rate gauge",
+        ]
+        for kind, rate in hit_rates(stats).items():
+            lines.append(f'mezo_fast_parser_hit_rate{{kind="{kind}"}} {rate}')
+        return lines
@@ -0,0 +1,419 @@
+import functools
+import json
+import os
+import threading
+
+# -----------------------------------------------------------------------------
+# Shared Configuration
+# -----------------------------------------------------------------------------
+
+# Mezo Testnet RPC
+RPC_URL = "https://rpc.test.mezo.org"
+CHAIN_ID = 31611
+
+# Token and Router Addresses
+MUSD_ADDRESS = "0x637e22A1EBbca50EA2d34027c238317fD10003eB"
+WRAPPED_BTC_ADDRESS = "0xA460F83cdd9584E4bD6a9838abb0baC58EAde999"
+ROUTER_ADDRESS = "0xC2E61936a542D78b9c3AA024fA141c4C632DF6c1"
+
+ROUTER_ABI_PATH = "new_router_abi.json"
+
+# Minimal ERC-20 ABI (approve, balanceOf, allowance, transfer)
+ERC20_ABI = json.loads(
+    '[{"constant": false, "inputs": [{"name": "spender", "type": "address"}, {"name": "amount", "type": "uint256"}],'
+    '"name": "approve", "outputs": [{"name": "", "type": "bool"}], "stateMutability": "nonpayable", "type":"function"},'
+    '{"constant": true, "inputs": [{"name": "owner", "type": "address"}],'
+    '"name": "balanceOf", "outputs": [{"name": "balance", "type": "uint256"}], "stateMutability": "view", "type": "function"},'
+    '{"constant": true, "inputs": [{"name": "owner", "type": "address"}, {"name": "spender", "type": "address"}],'
+    '"name": "allowance", "outputs": [{"name": "remaining", "type": "uint256"}], "stateMutability": "view", "type": "function"},'
+    '{"constant": false, "inputs": [{"name": "to", "type": "address"}, {"name": "amount", "type": "uint256"}],'
+    '"name": "transfer", "outputs": [{"name": "", "type": "bool"}], "stateMutability": "nonpayable", "type": "function"}]'
+)
+
+
+def env_flag(name, default="false") -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
+def lazy(builder):
+    """
+    Turns a MezoContext method into a property that is built once, on first
+    access, under the context lock.
+    """
+    name = builder.__name__
+
+    @property
+    @functools.wraps(builder)
+    def getter(self):
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._values:
+                self._values[name] = builder(self)
+            return self._values[name]
+
+    return getter
+
+
+# -----------------------------------------------------------------------------
+# Lazily Constructed Context
+# -----------------------------------------------------------------------------
+
+
+class MezoContext:
+    """
+    Holds every client, contract and helper the tools need.
+
+    Creating a context does nothing: environment variables are read, the RPC
+    provider is created, the router ABI is loaded and LangChain is imported
+    only when the corresponding attribute is first used. This keeps importing
+    agent.py and DumpySwapScript.py free of network access and heavy imports.
+    """
+
+    def __init__(self, rpc_url=None, private_key=None, openai_api_key=None, router_abi_path=ROUTER_ABI_PATH, llm=None):
+        self._lock = threading.RLock()
+        self._values = {}
+        self._rpc_url = rpc_url
+        self._private_key = private_key
+        self._openai_api_key = openai_api_key
+        self._llm = llm
+        self.router_abi_path = router_abi_path
+
+    @lazy
+    def env_loaded(self):
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        return True
+
+    def getenv(self, name, default=None):
+        self.env_loaded
+        return os.getenv(name, default)
+
+    # -------------------------------------------------------------------------
+    # Keys and clients
+    # -------------------------------------------------------------------------
+
+    @lazy
+    def rpc_url(self):
+        return self._rpc_url or self.getenv("MEZO_RPC_URL", RPC_URL)
+
+    @lazy
+    def private_key(self):
+        private_key = self._private_key or self.getenv("PRIVATE_KEY")
+        if not private_key:
+            raise ValueError("PRIVATE_KEY not found in environment variables!")
+        return private_key
+
+    @lazy
+    def openai_api_key(self):
+        openai_api_key = self._openai_api_key or self.getenv("OPENAI_API_KEY")
+        if not openai_api_key:
+            raise ValueError("OPENAI_API_KEY not found in environment variables!")
+        return openai_api_key
+
+    @lazy
+    def rpc_urls(self):
+        # Primary endpoint first, then any comma-separated fallbacks
+        fallbacks = self.getenv("MEZO_RPC_FALLBACK_URLS", "")
+        return [self.rpc_url] + [url.strip() for url in fallbacks.split(",") if url.strip()]
+
+    @lazy
+    def web3(self):
+        from web3 import Web3
+        from rpc_transport import PooledHTTPProvider
+
+        return Web3(PooledHTTPProvider(self.rpc_urls, **self.rpc_options))
+
+    @lazy
+    def rpc_options(self):
+        return {
+            "pool_size": int(self.getenv("MEZO_RPC_POOL_SIZE", "20")),
+            "timeout": float(self.getenv("MEZO_RPC_TIMEOUT", "10")),
+            "max_retries": int(self.getenv("MEZO_RPC_RETRIES", "3")),
+        }
+
+    @lazy
+    def async_web3(self):
+        from web3 import AsyncWeb3
+        from rpc_transport import AsyncPooledHTTPProvider
+
+        return AsyncWeb3(AsyncPooledHTTPProvider(self.rpc_urls, **self.rpc_options))
+
+    @lazy
+    def account(self):
+        return self.web3.eth.account.from_key(self.private_key)
+
+    @property
+    def sender_address(self):
+        return self.account.address
+
+    @lazy
+    def llm(self):
+        if self._llm is not None:
+            return self._llm
+
+        from langchain_openai import ChatOpenAI
+
+        return ChatOpenAI(temperature=0, openai_api_key=self.openai_api_key)
+
+    def ensure_connected(self):
+        if not self.web3.is_connected():
+            raise ConnectionError("Failed to connect to the RPC URL.")
+
+    # -------------------------------------------------------------------------
+    # Contracts
+    # -------------------------------------------------------------------------
+
+    @lazy
+    def router_abi(self):
+        with open(self.router_abi_path, "r") as abi_file:
+            return json.load(abi_file)
+
+    @lazy
+    def musd_contract(self):
+        return self.web3.eth.contract(address=MUSD_ADDRESS, abi=ERC20_ABI)
+
+    @lazy
+    def router_contract(self):
+        return self.web3.eth.contract(address=ROUTER_ADDRESS, abi=self.router_abi)
+
+    # -------------------------------------------------------------------------
+    # Transaction helpers
+    # -------------------------------------------------------------------------
+
+    @lazy
+    def nonce_manager(self):
+        from nonce_manager import NonceManager
+
+        return NonceManager(self.web3, self.sender_address, receipt_tracker=self.receipt_tracker)
+
+    @lazy
+    def receipt_tracker(self):
+        from receipt_tracker import ReceiptTracker
+
+        return ReceiptTracker(self.web3)
+
+    @lazy
+    def chain_cache(self):
+        from chain_cache import ChainStateCache
+
+        return ChainStateCache(self.web3)
+
+    def build_musd_allowance(self, owner):
+        from allowance_ledger import AllowanceLedger
+
+        return AllowanceLedger(
+            self.musd_contract,
+            owner,
+            ROUTER_ADDRESS,
+            strategy=self.getenv("MEZO_APPROVAL_STRATEGY", "capped").lower(),
+            cap=int(float(self.getenv("MEZO_APPROVAL_CAP", "1000")) * 10**18),
+        )
+
+    @lazy
+    def musd_allowance(self):
+        return self.build_musd_allowance(self.sender_address)
+
+    @lazy
+    def read_aggregator(self):
+        from multicall import MULTICALL3_ADDRESS, ReadAggregator
+
+        # Set MEZO_MULTICALL_ADDRESS to an empty string to always use plain eth_calls
+        return ReadAggregator(self.web3, self.getenv("MEZO_MULTICALL_ADDRESS", MULTICALL3_ADDRESS))
+
+    @lazy
+    def quote_engine(self):
+        from quote_engine import QuoteEngine
+
+        # Extra comma-separated tokens let quotes route through intermediate pools
+        extra_tokens = [token.strip() for token in self.getenv("MEZO_QUOTE_TOKENS", "").split(",") if token.strip()]
+        return QuoteEngine(
+            self.read_aggregator,
+            self.chain_cache,
+            ROUTER_ADDRESS,
+            [MUSD_ADDRESS, WRAPPED_BTC_ADDRESS] + extra_tokens,
+            fee_bps=int(self.getenv("MEZO_SWAP_FEE_BPS", "30")),
+            max_hops=int(self.getenv("MEZO_QUOTE_MAX_HOPS", "3")),
+        )
+
+    @lazy
+    def slippage_bps(self):
+        # Slippage tolerance applied to quotes when setting amountOutMin (50 = 0.5%)
+        return int(self.getenv("MEZO_SLIPPAGE_BPS", "50"))
+
+    @lazy
+    def swap_batch_window(self):
+        # Seconds to hold swaps so concurrent ones share a router call, 0 sends each on its own
+        return float(self.getenv("MEZO_SWAP_BATCH_WINDOW", "0"))
+
+    @lazy
+    def swap_batch_max(self):
+        return int(self.getenv("MEZO_SWAP_BATCH_MAX", "20"))
+
+    @lazy
+    def allowance_ledgers(self):
+        return {MUSD_ADDRESS: self.musd_allowance}
+
+    @lazy
+    def signer_pool(self):
+        from nonce_manager import NonceManager
+        from signer_pool import Signer, SignerPool
+
+        # The PRIVATE_KEY account comes first and keeps the shared nonce manager and ledger
+        signers = [Signer(self.account, self.nonce_manager, self.allowance_ledgers)]
+        extra_keys = [key.strip() for key in self.getenv("MEZO_SIGNER_KEYS", "").split(",") if key.strip()]
+        for key in extra_keys:
+            account = self.web3.eth.account.from_key(key)
+            signers.append(Signer(
+                account,
+                NonceManager(self.web3, account.address, receipt_tracker=self.receipt_tracker),
+                {MUSD_ADDRESS: self.build_musd_allowance(account.address)},
+            ))
+
+        pool = SignerPool(
+            self.web3,
+            signers,
+            CHAIN_ID,
+            min_balance=int(float(self.getenv("MEZO_SIGNER_MIN_BALANCE", "0")) * 10**18),
+            top_up=int(float(self.getenv("MEZO_SIGNER_TOP_UP", "0")) * 10**18),
+        )
+        if len(signers) > 1 and pool.top_up > 0:
+            pool.start_rebalancer(float(self.getenv("MEZO_SIGNER_REBALANCE_INTERVAL", "60")))
+        return pool
+
+    @lazy
+    def prefetcher(self):
+        from prefetch import StatePrefetcher
+
+        return StatePrefetcher(
+            self.read_aggregator, self.chain_cache, self.signer_pool, MUSD_ADDRESS, WRAPPED_BTC_ADDRESS, ROUTER_ADDRESS
+        )
+
+    @lazy
+    def prefetch_enabled(self):
+        self.env_loaded
+        return env_flag("MEZO_PREFETCH", "true")
+
+    @lazy
+    def event_indexer(self):
+        from event_indexer import EventIndexer
+
+        try:
+            pairs = {pair: tokens for tokens, pair in self.quote_engine.pairs().items()}
+        except Exception as e:
+            print(f"⚠️ Could not discover swap pairs, indexing transfers only: {e}")
+            pairs = {}
+        start_block = self.getenv("MEZO_INDEXER_START_BLOCK")
+        indexer = EventIndexer(
+            self.web3,
+            self.getenv("MEZO_INDEXER_DB", "mezo_events.db"),
+            {MUSD_ADDRESS: "mUSD", WRAPPED_BTC_ADDRESS: "Wrapped BTC"},
+            [signer.address for signer in self.signer_pool.signers],
+            pairs=pairs,
+            start_block=int(start_block) if start_block else None,
+            lookback_blocks=int(self.getenv("MEZO_INDEXER_LOOKBACK_BLOCKS", "250000")),
+            chunk_size=int(self.getenv("MEZO_INDEXER_CHUNK_SIZE", "5000")),
+        )
+        indexer.start(float(self.getenv("MEZO_INDEXER_POLL_INTERVAL", "15")))
+        return indexer
+
+    @lazy
+    def bulk_sign_workers(self):
+        # Processes used to sign bulk transfers, 0 signs in the calling thread
+        return int(self.getenv("MEZO_BULK_SIGN_WORKERS", "0"))
+
+    @lazy
+    def wait_for_receipts(self):
+        self.env_loaded
+        return env_flag("MEZO_WAIT_FOR_RECEIPTS", "true")
+
+    @lazy
+    def async_tools(self):
+        from async_tools import AsyncMezoTools
+
+        return AsyncMezoTools(
+            self.async_web3, self.signer_pool, MUSD_ADDRESS, WRAPPED_BTC_ADDRESS, ROUTER_ADDRESS,
+            ERC20_ABI, self.router_abi, receipt_tracker=self.receipt_tracker,
+            quote_engine=self.quote_engine, slippage_bps=self.slippage_bps,
+            chain_cache=self.chain_cache, prefetcher=self.prefetcher if self.prefetch_enabled else None,
+        )
+
+    # -------------------------------------------------------------------------
+    # Intent parsing
+    # -------------------------------------------------------------------------
+
+    @lazy
+    def fast_parser(self):
+        from intent_parser import FastIntentParser
+
+        parser = FastIntentParser(ROUTER_ADDRESS)
+        self.tracer.add_collector("fast_parser", parser.prometheus_lines)
+        return parser
+
+    @lazy
+    def intent_cache(self):
+        from intent_cache import IntentCache
+
+        cache = IntentCache(
+            max_size=int(self.getenv("MEZO_INTENT_CACHE_SIZE", "1024")),
+            ttl=float(self.getenv("MEZO_INTENT_CACHE_TTL", "3600")),
+            db_path=self.getenv("MEZO_INTENT_CACHE_DB"),
+        )
+        self.tracer.add_collector("intent_cache", cache.prometheus_lines)
+        return cache
+
+    @lazy
+    def agent_mode(self):
+        # "router" runs tools directly on routed intents, "react" always uses the agent
+        return self.getenv("MEZO_AGENT_MODE", "router").lower()
+
+    @lazy
+    def use_async(self):
+        self.env_loaded
+        return env_flag("MEZO_AGENT_ASYNC")
+
+    # -------------------------------------------------------------------------
+    # Observability
+    # -------------------------------------------------------------------------
+
+    @lazy
+    def tracer(self):
+        from tracing import tracer
+
+        self.env_loaded
+        tracer.configure(
+            env_flag("MEZO_TRACE"),
+            trace_path=self.getenv("MEZO_TRACE_FILE"),
+            metrics_path=self.getenv("MEZO_METRICS_FILE"),
+        )
+        return tracer
+
+
+_context = None
+_context_lock = threading.Lock()
+
+
+def get_context() -> MezoContext:
+    """
+    Returns the process-wide context, creating it (cheaply) on first call.
+    """
+    global _context
+    with _context_lock:
+        if _context is None:
+            _context = MezoContext()
+        return _context
+
+
+def set_context(context):
+    """
+    Replaces the process-wide context, e.g. to point the tools at a local
+    chain, and returns the one it replaced (None if none was created yet).
+    """
+    global _context
+    with _context_lock:
+        previous, _context = _context, context
+    return previous
+
@@ -0,0 +1,275 @@
+import asyncio
+import json
+import os
+import queue
+import socketserver
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from tracing import tracer
+
+# -----------------------------------------------------------------------------
+# Long-Running Service Mode
+# -----------------------------------------------------------------------------
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class AgentService:
+    """
+    Keeps the agent warm and serves requests from a bounded queue with a
+    fixed pool of worker threads.
+
+    Requests run concurrently; the nonce manager and allowance ledger already
+    serialize the signer-critical sections. Every request gets a request_id;
+    requests a caller stopped waiting for stay retrievable by it (up to
+    max_kept of them) until collected.
+    """
+
+    def __init__(self, handler, workers=4, queue_size=100, max_kept=1000):
+        self.handler = handler
+        self.workers = workers
+        self.max_kept = max_kept
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._requests = OrderedDict()
+        self._requests_lock = threading.Lock()
+        self._threads = []
+        self._stopped = False
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"agent-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stopped = True
+        for _ in self._threads:
+            self._queue.put(None)
+
+    def submit(self, prompt: str) -> Future:
+        """
+        Queues a request and returns a Future for its response, with the
+        request's id in future.request_id.
+        Raises QueueFullError when the queue is at capacity.
+        """
+        future = Future()
+        future.request_id = uuid.uuid4().hex
+        try:
+            self._queue.put_nowait((prompt, future))
+        except queue.Full:
+            raise QueueFullError("Request queue is full, try again later.")
+        with self._requests_lock:
+            self._requests[future.request_id] = future
+            while len(self._requests) > self.max_kept:
+                self._requests.popitem(last=False)
+        return future
+
+    def lookup(self, request_id):
+        """
+        Returns the Future of a request that hasn't been collected yet, or None.
+        """
+        with self._requests_lock:
+            return self._requests.get(request_id)
+
+    def collect(self, request_id):
+        """
+        Forgets a finished request once its response has been handed out.
+        """
+        with self._requests_lock:
+            self._requests.pop(request_id, None)
+
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    def _work(self):
+        while not self._stopped:
+            item = self._queue.get()
+            if item is None:
+                break
+            prompt, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(self.handler(prompt))
+            except Exception as e:
+                future.set_exception(e)
+
+
+class EventLoopThread:
+    """
+    One asyncio event loop running in a background thread for the life of
+    the process. Worker threads hand it coroutines with run(), so every
+    request shares the loop's AsyncWeb3 sessions and connection pools
+    instead of building (and tearing down) a loop per request.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.loop.run_forever, name="agent-event-loop", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def run(self, coroutine):
+        """
+        Runs coroutine on the loop and blocks the calling thread for its result.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+
+# -----------------------------------------------------------------------------
+# Local APIs
+# -----------------------------------------------------------------------------
+
+
+def request_result(service, future, timeout):
+    """
+    Waits up to timeout seconds for a request and returns (status_code,
+    response_dict). A request still running after that answers 202 with its
+    request_id, and the agent keeps working on it.
+    """
+    request_id = future.request_id
+    # Wait separately so a request that itself raised TimeoutError isn't taken for a running one
+    if not wait([future], timeout=timeout).done:
+        return 202, {
+            "request_id": request_id,
+            "state": "running",
+            "message": f"Request {request_id} is still running. Fetch the result later with GET /requests/{request_id} "
+                       f"(or a {{\"request_id\": \"{request_id}\"}} line on the Unix socket).",
+        }
+    try:
+        response = future.result()
+    except Exception as e:
+        service.collect(request_id)
+        return 500, {"request_id": request_id, "state": "failed", "error": str(e) or type(e).__name__}
+    service.collect(request_id)
+    return 200, {"request_id": request_id, "state": "done", "response": response}
+
+
+def handle_payload(service, payload, timeout):
+    """
+    Runs one {"prompt": ...} payload through the service, or looks up an
+    earlier request for {"request_id": ...}, and returns (status_code,
+    response_dict).
+    """
+    if isinstance(payload, dict) and payload.get("request_id") and not payload.get("prompt"):
+        future = service.lookup(payload["request_id"])
+        if future is None:
+            return 404, {"error": f"Unknown or already collected request {payload['request_id']}."}
+        return request_result(service, future, 0)
+    prompt = payload.get("prompt") if isinstance(payload, dict) else None
+    if not prompt:
+        return 400, {"error": "Expected a JSON body with a 'prompt' field."}
+    try:
+        future = service.submit(prompt)
+    except QueueFullError as e:
+        return 503, {"error": str(e)}
+    return request_result(service, future, timeout)
+
+
+def serve_http(service, host="127.0.0.1", port=8765, timeout=300):
+    """
+    Serves POST /requests {"prompt": "..."}, GET /requests/<request_id> for
+    requests that outlived timeout, GET /health and GET /metrics (Prometheus
+    text, populated when MEZO_TRACE is on) over HTTP.
+    """
+    class RequestHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, {"status": "ok", "queued": service.queued()})
+            elif self.path.startswith("/requests/"):
+                self._reply(*handle_payload(service, {"request_id": self.path[len("/requests/"):]}, timeout))
+            elif self.path == "/metrics":
+                data = tracer.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            else:
+                self._reply(404, {"error": "Not found."})
+
+        def do_POST(self):
+            if self.path != "/requests":
+                self._reply(404, {"error": "Not found."})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._reply(400, {"error": "Invalid JSON body."})
+                return
+            self._reply(*handle_payload(service, payload, timeout))
+
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    print(f"Mezo Agent service listening on http://{host}:{port}")
+    server.serve_forever()
+
+
+def serve_unix_socket(service, path, timeout=300):
+    """
+    Serves newline-delimited JSON requests ({"prompt": "..."}, or
+    {"request_id": "..."} to collect a request that outlived timeout) on a
+    Unix socket. Each request line gets one JSON response line.
+    """
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                try:
+                    payload = json.loads(line)
+                except ValueError:
+                    status, body = 400, {"error": "Invalid JSON line."}
+                else:
+                    status, body = handle_payload(service, payload, timeout)
+                body["status"] = status
+                self.wfile.write(json.dumps(body).encode("utf-8") + b"\n")
+                self.wfile.flush()
+
+    class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    if os.path.exists(path):
+        os.remove(path)
+    server = ThreadingUnixServer(path, RequestHandler)
+    print(f"Mezo Agent service listening on unix://{path}")
+    server.serve_forever()
+
+
+def run_repl(handler):
+    """
+    Multi-turn prompt loop on the warm agent. Type 'exit' or 'quit' to stop.
+    """
+    print("Mezo Agent Ready! Type your request ('exit' to quit):")
+    while True:
+        try:
+            user_input = input("> ").strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+        if user_input.lower() in ("exit", "quit"):
+            break
+        if not user_input:
+            continue
+        try:
+            print(handler(user_input))
+        except Exception as e:
+            print(f"❌ Request failed: {str(e)}")
@@ -0,0 +1,110 @@
+import threading
+
+from eth_abi import decode, encode
+from eth_utils import function_signature_to_4byte_selector, to_checksum_address
+
+from rpc_transport import batch_request
+
+# -----------------------------------------------------------------------------
+# Multicall Read Aggregation
+# -----------------------------------------------------------------------------
+
+# Multicall3 is deployed at the same address on most EVM chains
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+AGGREGATE3_SELECTOR = function_signature_to_4byte_selector("aggregate3((address,bool,bytes)[])")
+
+
+class ViewCall:
+    """
+    One read-only contract call: target, function signature, arguments and
+    the ABI types of its return values.
+    """
+
+    def __init__(self, target, signature, arg_types=(), args=(), output_types=("uint256",)):
+        self.target = to_checksum_address(target)
+        self.signature = signature
+        self.output_types = list(output_types)
+        self.data = function_signature_to_4byte_selector(signature) + encode(list(arg_types), list(args))
+
+    def decode(self, return_data):
+        values = decode(self.output_types, return_data)
+        return values[0] if len(values) == 1 else values
+
+    def rpc_call(self, block="latest"):
+        return ("eth_call", [{"to": self.target, "data": "0x" + self.data.hex()}, block])
+
+
+def erc20_balance_call(token, owner):
+    return ViewCall(token, "balanceOf(address)", ["address"], [owner])
+
+
+def erc20_allowance_call(token, owner, spender):
+    return ViewCall(token, "allowance(address,address)", ["address", "address"], [owner, spender])
+
+
+def pair_reserves_call(pair):
+    return ViewCall(pair, "getReserves()", output_types=("uint112", "uint112", "uint32"))
+
+
+def router_factory_call(router):
+    return ViewCall(router, "factory()", output_types=("address",))
+
+
+def factory_pair_call(factory, token_a, token_b):
+    return ViewCall(factory, "getPair(address,address)", ["address", "address"], [token_a, token_b], ("address",))
+
+
+def hex_to_bytes(value):
+    return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+
+
+class ReadAggregator:
+    """
+    Packs several view calls into a single Multicall3 aggregate3 eth_call.
+
+    Extra raw JSON-RPC calls (e.g. eth_gasPrice, eth_getBalance) can ride in
+    the same batched HTTP request. If no multicall contract is deployed at
+    the configured address, the calls are sent as individual eth_calls
+    (batched when the provider supports it).
+    """
+
+    def __init__(self, web3, multicall_address=MULTICALL3_ADDRESS):
+        self.web3 = web3
+        self.multicall_address = to_checksum_address(multicall_address) if multicall_address else None
+        self._available = None
+        self._lock = threading.Lock()
+
+    def multicall_available(self) -> bool:
+        """
+        Checks once whether the multicall contract has code on this chain.
+        """
+        with self._lock:
+            if self._available is None:
+                if self.multicall_address is None:
+                    self._available = False
+                else:
+                    (code,) = batch_request(self.web3, [("eth_getCode", [self.multicall_address, "latest"])])
+                    self._available = bool(code) and code not in ("0x", "0x0")
+            return self._available
+
+    def read(self, calls, extra=()):
+        """
+        Executes calls (ViewCall list) and extra raw (method, params) requests.
+
+        :return: (decoded call results, raw extra results), each in request order.
+        """
+        calls = list(calls)
+        extra = list(extra)
+        if calls and self.multicall_available():
+            payload = AGGREGATE3_SELECTOR + encode(
+                ["(address,bool,bytes)[]"], [[(call.target, False, call.data) for call in calls]]
+            )
+            requests_list = [("eth_call", [{"to": self.multicall_address, "data": "0x" + payload.hex()}, "latest"])]
+            results = batch_request(self.web3, requests_list + extra)
+            (returned,) = decode(["(bool,bytes)[]"], hex_to_bytes(results[0]))
+            values = [call.decode(return_data) for call, (_, return_data) in zip(calls, returned)]
+            return values, results[1:]
+
+        results = batch_request(self.web3, [call.rpc_call() for call in calls] + extra)
+        values = [call.decode(hex_to_bytes(result)) for call, result in zip(calls, results)]
+        return values, results[len(calls):]
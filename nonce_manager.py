@@ -0,0 +1,294 @@
+import asyncio
+import threading
+
+from rpc_transport import SendOutcomeUnknown
+from tracing import tracer
+
+# -----------------------------------------------------------------------------
+# Local Nonce Allocation
+# -----------------------------------------------------------------------------
+
+# RPC error fragments that mean the nonce we used is already taken on chain
+NONCE_CONFLICT_ERRORS = (
+    "nonce too low",
+    "replacement transaction underpriced",
+    "invalid nonce",
+)
+
+
+def is_nonce_conflict(error) -> bool:
+    """
+    Returns True if an RPC error was caused by reusing a nonce that the
+    chain (or mempool) has already seen.
+    """
+    message = str(error).lower()
+    return any(fragment in message for fragment in NONCE_CONFLICT_ERRORS)
+
+
+def is_already_known(error) -> bool:
+    """
+    Returns True if the node already has this exact signed transaction.
+    """
+    return "already known" in str(error).lower()
+
+
+class NonceManager:
+    """
+    Process-wide nonce allocator for a single sender address.
+
+    The next nonce is seeded once from the chain (pending block) and then
+    handed out locally, so sending a transaction no longer costs a
+    get_transaction_count round trip and concurrent sends never share a
+    nonce. Nonces that never reached the mempool are released and reused
+    first so they don't leave a gap that blocks later transactions.
+
+    Every handed-out nonce stays in flight until it is released or its
+    transaction is mined, so a resync never reissues a nonce another thread
+    still holds. With a receipt_tracker, sent transactions are watched and a
+    nonce whose transaction times out and is unknown to the node is treated
+    as a gap and refilled.
+    """
+
+    def __init__(self, web3, address, max_retries=3, receipt_tracker=None):
+        self.web3 = web3
+        self.address = address
+        self.max_retries = max_retries
+        self.receipt_tracker = receipt_tracker
+        self._lock = threading.Lock()
+        self._next_nonce = None
+        self._released = set()
+        self._in_flight = set()
+
+    def _chain_nonce(self):
+        return self.web3.eth.get_transaction_count(self.address, "pending")
+
+    def _allocate_locked(self) -> int:
+        if self._next_nonce is None:
+            self._next_nonce = self._chain_nonce()
+        if self._released:
+            nonce = min(self._released)
+            self._released.remove(nonce)
+        else:
+            nonce = self._next_nonce
+            self._next_nonce += 1
+        self._in_flight.add(nonce)
+        return nonce
+
+    def allocate(self) -> int:
+        """
+        Reserves and returns the next nonce, seeding from the chain on first use.
+        """
+        with self._lock:
+            return self._allocate_locked()
+
+    def allocate_many(self, count):
+        """
+        Reserves count nonces in one step, so a batch can't be interleaved with
+        other senders. Released gaps are filled first, so the batch never
+        leaves a hole behind it.
+        """
+        with self._lock:
+            return [self._allocate_locked() for _ in range(count)]
+
+    def needs_sync(self) -> bool:
+        """
+        True until the next nonce has been seeded from the chain.
+        """
+        with self._lock:
+            return self._next_nonce is None
+
+    def sync(self, chain_nonce):
+        """
+        Seeds the next nonce from a pending transaction count read elsewhere
+        (e.g. a batched prefetch), unless it is already seeded.
+        """
+        with self._lock:
+            if self._next_nonce is None:
+                self._next_nonce = chain_nonce
+
+    def release(self, nonce):
+        """
+        Returns a nonce whose transaction was never broadcast so it can be reused.
+        """
+        with self._lock:
+            self._in_flight.discard(nonce)
+            if self._next_nonce is None or nonce >= self._next_nonce:
+                return
+            if nonce == self._next_nonce - 1:
+                self._next_nonce -= 1
+                # Collapse any released nonces sitting directly below the new tip
+                while self._next_nonce - 1 in self._released:
+                    self._next_nonce -= 1
+                    self._released.remove(self._next_nonce)
+            else:
+                self._released.add(nonce)
+
+    def resync(self):
+        """
+        Re-reads the pending nonce from the chain. Use after "nonce too low"
+        errors or when a sent transaction was dropped.
+
+        The next nonce becomes max(chain pending, highest in-flight + 1), so
+        nonces other threads are still using are never handed out again. Any
+        nonce between the chain's count and that tip that nobody holds is a
+        gap and is reused first.
+        """
+        chain_nonce = self._chain_nonce()
+        with self._lock:
+            # Nonces below the pending count are mined or in the mempool
+            self._in_flight = {nonce for nonce in self._in_flight if nonce >= chain_nonce}
+            self._next_nonce = max([chain_nonce] + [nonce + 1 for nonce in self._in_flight])
+            self._released = set(range(chain_nonce, self._next_nonce)) - self._in_flight
+            return self._next_nonce
+
+    def in_flight(self):
+        """
+        Returns the sorted nonces currently handed out and not yet settled.
+        """
+        with self._lock:
+            return sorted(self._in_flight)
+
+    def watch(self, tx_hash, nonce):
+        """
+        Keeps nonce in flight until tx_hash is mined. Without a receipt
+        tracker the nonce is only let go once a resync sees it on chain.
+        """
+        if self.receipt_tracker is None:
+            return
+        self.receipt_tracker.track(
+            tx_hash, callback=lambda tx_hash, receipt, error: self._settle(nonce, tx_hash, receipt, error)
+        )
+
+    def _settle(self, nonce, tx_hash, receipt, error):
+        if receipt is not None:
+            with self._lock:
+                self._in_flight.discard(nonce)
+            return
+        if not isinstance(error, TimeoutError):
+            return
+        try:
+            if self._is_known(tx_hash):
+                # Still pending (e.g. queued behind a gap), keep holding the nonce
+                self.watch(tx_hash, nonce)
+                return
+            print(f"⚠️ Transaction {tx_hash} (nonce {nonce}) was dropped, refilling the nonce gap")
+            with self._lock:
+                self._in_flight.discard(nonce)
+            self.resync()
+        except Exception as e:
+            print(f"⚠️ Could not check dropped transaction {tx_hash}: {e}")
+
+    def _is_known(self, tx_hash) -> bool:
+        """
+        True if the node has tx_hash (pending or mined).
+        """
+        from web3.exceptions import TransactionNotFound
+
+        try:
+            self.web3.eth.get_transaction(tx_hash)
+        except TransactionNotFound:
+            return False
+        return True
+
+    def send_transaction(self, build_tx, private_key, nonce=None):
+        """
+        Allocates a nonce, builds the transaction with build_tx(nonce), signs it
+        and broadcasts it. Retries with a fresh nonce if the chain reports a
+        nonce conflict, unless the conflicting transaction is our own.
+
+        :param build_tx: Callable taking a nonce and returning a transaction dict.
+        :param private_key: Key used to sign the transaction.
+        :param nonce: Nonce allocated earlier to use on the first attempt.
+        :return: Transaction hash.
+        """
+        for attempt in range(self.max_retries + 1):
+            if nonce is None:
+                nonce = self.allocate()
+            try:
+                tx = build_tx(nonce)
+                with tracer.span("sign"):
+                    signed_tx = self.web3.eth.account.sign_transaction(tx, private_key)
+            except Exception:
+                self.release(nonce)
+                raise
+            try:
+                with tracer.span("broadcast"):
+                    tx_hash = self.web3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            except SendOutcomeUnknown as e:
+                # The node may have it: keep the nonce and never resend blindly
+                self.watch(signed_tx.hash, nonce)
+                raise SendOutcomeUnknown(f"Broadcast of 0x{bytes(signed_tx.hash).hex()} unconfirmed, check the hash before resending ({e})")
+            except Exception as e:
+                if is_already_known(e) or (is_nonce_conflict(e) and self._is_known(signed_tx.hash)):
+                    # This exact transaction is already in the mempool or mined
+                    self.watch(signed_tx.hash, nonce)
+                    return signed_tx.hash
+                if is_nonce_conflict(e):
+                    # Someone else took the nonce, it is no longer ours to hold or hand out again
+                    with self._lock:
+                        self._in_flight.discard(nonce)
+                    if attempt < self.max_retries:
+                        nonce = None
+                        self.resync()
+                        continue
+                    raise
+                self.release(nonce)
+                raise
+            self.watch(tx_hash, nonce)
+            return tx_hash
+
+    async def asend_transaction(self, async_web3, build_tx, private_key, nonce=None):
+        """
+        Async variant of send_transaction for AsyncWeb3 clients. build_tx is
+        awaited with the allocated nonce; chain resyncs run in a worker thread.
+        Transport errors on the broadcast (timeouts, dropped connections) are
+        handled like SendOutcomeUnknown: the nonce is kept and the hash watched.
+        """
+        import aiohttp
+        from web3.exceptions import TransactionNotFound
+
+        transport_errors = (SendOutcomeUnknown, aiohttp.ClientError, TimeoutError, OSError)
+
+        for attempt in range(self.max_retries + 1):
+            if nonce is None and self._next_nonce is None:
+                # First use seeds from the chain, keep that RPC off the event loop
+                nonce = await asyncio.to_thread(self.allocate)
+            elif nonce is None:
+                nonce = self.allocate()
+            try:
+                tx = await build_tx(nonce)
+                with tracer.span("sign"):
+                    signed_tx = async_web3.eth.account.sign_transaction(tx, private_key)
+            except Exception:
+                self.release(nonce)
+                raise
+            try:
+                with tracer.span("broadcast"):
+                    tx_hash = await async_web3.eth.send_raw_transaction(signed_tx.raw_transaction)
+            except transport_errors as e:
+                # The node may have it: keep the nonce and never resend blindly
+                self.watch(signed_tx.hash, nonce)
+                raise SendOutcomeUnknown(f"Broadcast of 0x{bytes(signed_tx.hash).hex()} unconfirmed, check the hash before resending ({e!r})")
+            except Exception as e:
+                if is_already_known(e):
+                    self.watch(signed_tx.hash, nonce)
+                    return signed_tx.hash
+                if is_nonce_conflict(e):
+                    try:
+                        await async_web3.eth.get_transaction(signed_tx.hash)
+                        self.watch(signed_tx.hash, nonce)
+                        return signed_tx.hash
+                    except TransactionNotFound:
+                        pass
+                if is_nonce_conflict(e):
+                    with self._lock:
+                        self._in_flight.discard(nonce)
+                    if attempt < self.max_retries:
+                        nonce = None
+                        await asyncio.to_thread(self.resync)
+                        continue
+                    raise
+                self.release(nonce)
+                raise
+            self.watch(tx_hash, nonce)
+            return tx_hash
@@ -0,0 +1,145 @@
+import contextvars
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from multicall import erc20_allowance_call, erc20_balance_call
+
+# -----------------------------------------------------------------------------
+# Speculative Sender-State Prefetch
+# -----------------------------------------------------------------------------
+
+SenderSnapshot = namedtuple("SenderSnapshot", ["block_number", "btc_balance", "musd_balance", "wrapped_btc_balance"])
+
+
+class Prefetch:
+    """
+    One speculative prefetch, started when a request arrives.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.future = None
+        self.served = False  # A tool was handed a snapshot while this prefetch was the latest
+
+
+class StatePrefetcher:
+    """
+    Reads the state every tool needs from the sender alone (balances,
+    allowance, pending nonce, gas price, block number) while the LLM is still
+    parsing the prompt.
+
+    Everything for every account in the signer pool goes out in one batched
+    request (contract reads in one multicall). The results seed the nonce
+    managers, allowance ledgers and chain cache, and balances are kept as a
+    per-block snapshot for the tools to use. If the request turns out not to
+    need chain state, the snapshot is simply left unused.
+    """
+
+    def __init__(self, read_aggregator, chain_cache, signer_pool, musd_address, wrapped_btc_address, router_address):
+        self.read_aggregator = read_aggregator
+        self.chain_cache = chain_cache
+        self.signer_pool = signer_pool
+        self.musd_address = musd_address
+        self.wrapped_btc_address = wrapped_btc_address
+        self.router_address = router_address
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._snapshots = {}
+        self._inflight = None
+        self._stats = {"started": 0, "used": 0, "discarded": 0, "saved_seconds": 0.0}
+
+    def start(self) -> Prefetch:
+        """
+        Starts a prefetch in the background and returns its handle.
+        """
+        prefetch = Prefetch()
+        # Run in the request's context so its spans are attributed to the request
+        prefetch.future = self._executor.submit(contextvars.copy_context().run, self._fetch, prefetch)
+        with self._lock:
+            self._inflight = prefetch
+            self._stats["started"] += 1
+        return prefetch
+
+    def _fetch(self, prefetch):
+        signers = self.signer_pool.signers
+        calls = []
+        for signer in signers:
+            calls += [
+                erc20_balance_call(self.musd_address, signer.address),
+                erc20_balance_call(self.wrapped_btc_address, signer.address),
+                erc20_allowance_call(self.musd_address, signer.address, self.router_address),
+            ]
+        unsynced = [signer for signer in signers if signer.nonce_manager.needs_sync()]
+        extra = [("eth_blockNumber", []), ("eth_gasPrice", [])]
+        extra += [("eth_getBalance", [signer.address, "latest"]) for signer in signers]
+        extra += [("eth_getTransactionCount", [signer.address, "pending"]) for signer in unsynced]
+
+        try:
+            values, results = self.read_aggregator.read(calls, extra)
+        finally:
+            prefetch.finished = time.perf_counter()
+
+        block_number, gas_price = int(results[0], 16), int(results[1], 16)
+        btc_balances = results[2:2 + len(signers)]
+        nonces = results[2 + len(signers):]
+
+        self.chain_cache.on_new_head(block_number)
+        self.chain_cache.start()
+        self.chain_cache.set_gas_price(gas_price)
+        for signer, nonce in zip(unsynced, nonces):
+            signer.nonce_manager.sync(int(nonce, 16))
+
+        snapshots = {}
+        for index, signer in enumerate(signers):
+            musd_balance, wrapped_btc_balance, allowance = values[3 * index:3 * index + 3]
+            signer.allowance_ledgers[self.musd_address].sync(allowance)
+            snapshots[signer.address] = SenderSnapshot(
+                block_number, int(btc_balances[index], 16), musd_balance, wrapped_btc_balance
+            )
+        with self._lock:
+            self._snapshots.update(snapshots)
+
+    def snapshot(self, address, timeout=5.0):
+        """
+        Returns the prefetched balances for address if they are from the
+        current block, waiting for an in-flight prefetch first. Returns None
+        when there is nothing usable (the caller reads the chain instead).
+        """
+        with self._lock:
+            inflight = self._inflight
+        if inflight is not None:
+            try:
+                inflight.future.result(timeout=timeout)
+            except Exception:
+                return None
+        with self._lock:
+            snapshot = self._snapshots.get(address)
+        if snapshot is None or snapshot.block_number != self.chain_cache.block_number():
+            return None
+        if inflight is not None:
+            inflight.served = True
+        return snapshot
+
+    def finish(self, prefetch, routed_at, used):
+        """
+        Records whether the request needed the prefetched state and how much
+        chain latency overlapped with intent parsing.
+
+        :return: Seconds saved (0 when the prefetch was discarded).
+        """
+        saved = 0.0
+        failed = prefetch.future.done() and prefetch.future.exception() is not None
+        if used and not failed:
+            finished = prefetch.finished if prefetch.finished is not None else routed_at
+            saved = max(0.0, min(finished, routed_at) - prefetch.started)
+        with self._lock:
+            self._stats["used" if used else "discarded"] += 1
+            self._stats["saved_seconds"] += saved
+        return saved
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
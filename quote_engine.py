@@ -0,0 +1,150 @@
+import itertools
+import threading
+from collections import namedtuple
+
+from multicall import factory_pair_call, pair_reserves_call, router_factory_call
+
+# -----------------------------------------------------------------------------
+# Off-Chain Swap Quotes
+# -----------------------------------------------------------------------------
+
+BPS = 10_000
+
+
+def get_amount_out(amount_in, reserve_in, reserve_out, fee_bps=30):
+    """
+    Constant-product output for one hop, matching UniswapV2Library.getAmountOut.
+    """
+    if amount_in <= 0 or reserve_in <= 0 or reserve_out <= 0:
+        return 0
+    amount_in_with_fee = amount_in * (BPS - fee_bps)
+    return amount_in_with_fee * reserve_out // (reserve_in * BPS + amount_in_with_fee)
+
+
+def get_amounts_out(amount_in, path, reserves, fee_bps=30):
+    """
+    Local equivalent of router.getAmountsOut. reserves maps (token_in, token_out)
+    to (reserve_in, reserve_out), keyed by lowercase addresses.
+    """
+    amounts = [amount_in]
+    for token_in, token_out in zip(path, path[1:]):
+        reserve_in, reserve_out = reserves[(token_in.lower(), token_out.lower())]
+        amounts.append(get_amount_out(amounts[-1], reserve_in, reserve_out, fee_bps))
+    return amounts
+
+
+class Quote(namedtuple("Quote", ["path", "amount_in", "amount_out", "block_number"])):
+    def min_amount_out(self, slippage_bps):
+        """
+        Lowest acceptable output for this quote under slippage_bps tolerance.
+        """
+        return self.amount_out * (BPS - slippage_bps) // BPS
+
+
+class QuoteEngine:
+    """
+    Prices swaps locally from cached pair reserves instead of one eth_call each.
+
+    - The router's factory and the pairs between the configured tokens are
+      discovered once (one multicall each) and kept for the process lifetime.
+    - Reserves of every known pair are read in a single multicall and cached
+      for the current block (block numbers come from the chain cache).
+    - quote() searches every path of up to max_hops hops through the known
+      pairs and returns the one with the largest output.
+    """
+
+    def __init__(self, read_aggregator, chain_cache, router_address, tokens, fee_bps=30, max_hops=3):
+        self.read_aggregator = read_aggregator
+        self.chain_cache = chain_cache
+        self.router_address = router_address
+        self.tokens = list(dict.fromkeys(tokens))
+        self.fee_bps = fee_bps
+        self.max_hops = max_hops
+        self._lock = threading.Lock()
+        self._pairs = None  # {(token_a, token_b) sorted lowercase: pair address}
+        self._reserves = {}
+        self._reserves_block = None
+
+    def pairs(self):
+        """
+        Returns the existing pairs between the configured tokens, discovering them once.
+        """
+        with self._lock:
+            if self._pairs is not None:
+                return self._pairs
+        (factory,), _ = self.read_aggregator.read([router_factory_call(self.router_address)])
+        token_pairs = list(itertools.combinations(self.tokens, 2))
+        pair_addresses, _ = self.read_aggregator.read(
+            [factory_pair_call(factory, token_a, token_b) for token_a, token_b in token_pairs]
+        )
+        pairs = {}
+        for (token_a, token_b), pair in zip(token_pairs, pair_addresses):
+            if int(pair, 16) != 0:
+                pairs[tuple(sorted((token_a.lower(), token_b.lower())))] = pair
+        with self._lock:
+            self._pairs = pairs
+        return pairs
+
+    def reserves(self):
+        """
+        Returns {(token_in, token_out): (reserve_in, reserve_out)} for the
+        current block, reading all pair reserves in one multicall per block.
+        """
+        block_number = self.chain_cache.block_number()
+        with self._lock:
+            if self._reserves_block == block_number:
+                return self._reserves, block_number
+        pairs = self.pairs()
+        results, _ = self.read_aggregator.read([pair_reserves_call(pair) for pair in pairs.values()])
+        reserves = {}
+        for (token0, token1), (reserve0, reserve1, _) in zip(pairs, results):
+            # Pairs store reserves in sorted token order, same as our keys
+            reserves[(token0, token1)] = (reserve0, reserve1)
+            reserves[(token1, token0)] = (reserve1, reserve0)
+        with self._lock:
+            self._reserves = reserves
+            self._reserves_block = block_number
+        return reserves, block_number
+
+    def invalidate(self):
+        """
+        Drops cached reserves, e.g. after one of our own swaps moved the pool.
+        """
+        with self._lock:
+            self._reserves_block = None
+
+    def candidate_paths(self, token_in, token_out, reserves):
+        """
+        Yields every simple path from token_in to token_out of at most
+        max_hops hops through pools with liquidity.
+        """
+        token_in, token_out = token_in.lower(), token_out.lower()
+        neighbours = {}
+        for (a, b), (reserve_a, reserve_b) in reserves.items():
+            if reserve_a > 0 and reserve_b > 0:
+                neighbours.setdefault(a, []).append(b)
+
+        stack = [[token_in]]
+        while stack:
+            path = stack.pop()
+            for token in neighbours.get(path[-1], ()):
+                if token == token_out:
+                    yield path + [token]
+                elif token not in path and len(path) < self.max_hops:
+                    stack.append(path + [token])
+
+    def quote(self, token_in, token_out, amount_in):
+        """
+        Returns the best Quote for swapping amount_in of token_in to token_out.
+        Raises ValueError when no path with liquidity exists.
+        """
+        reserves, block_number = self.reserves()
+        checksummed = {token.lower(): token for token in self.tokens + [token_in, token_out]}
+        best = None
+        for path in self.candidate_paths(token_in, token_out, reserves):
+            amount_out = get_amounts_out(amount_in, path, reserves, self.fee_bps)[-1]
+            if best is None or amount_out > best.amount_out:
+                best = Quote([checksummed[token] for token in path], amount_in, amount_out, block_number)
+        if best is None or best.amount_out == 0:
+            raise ValueError(f"No liquid swap path from {token_in} to {token_out}.")
+        return best
@@ -0,0 +1,149 @@
+import threading
+import time
+from concurrent.futures import Future
+
+# -----------------------------------------------------------------------------
+# Shared Background Receipt Tracker
+# -----------------------------------------------------------------------------
+
+
+class ReceiptTracker:
+    """
+    Watches pending transactions from a single background thread.
+
+    Instead of one wait_for_transaction_receipt polling loop per transaction,
+    the tracker polls the block number and, once per new block, fetches the
+    receipts of every pending hash in one batched eth_getTransactionReceipt
+    request. A hash tracked mid-block is checked once at the next poll and
+    then only when a new block arrives. Callers get a Future (and optionally
+    a callback) per hash.
+    """
+
+    def __init__(self, web3, poll_interval=1.0, timeout=120):
+        self.web3 = web3
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pending = {}
+        self._checked = {}  # tx_hash -> block number its receipt was last looked up at
+        self._thread = None
+        self._stopped = False
+
+    def track(self, tx_hash, callback=None, timeout=None) -> Future:
+        """
+        Starts watching tx_hash and returns a Future resolving to its receipt.
+
+        :param callback: Optional callable(tx_hash, receipt, error) run on completion.
+        :param timeout: Seconds before the Future fails with TimeoutError.
+        """
+        from web3 import Web3
+
+        # Batched sends return hex strings already, web3 returns HexBytes
+        tx_hash = tx_hash.lower() if isinstance(tx_hash, str) else Web3.to_hex(tx_hash)
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(
+                lambda done: callback(tx_hash, None if done.exception() else done.result(), done.exception())
+            )
+        deadline = time.time() + (timeout if timeout is not None else self.timeout)
+        with self._lock:
+            idle = not self._pending
+            self._pending.setdefault(tx_hash, []).append((future, deadline))
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = False
+                self._thread = threading.Thread(target=self._run, name="receipt-tracker", daemon=True)
+                self._thread.start()
+        if idle:
+            # Otherwise the hash joins the next scheduled poll
+            self._wakeup.set()
+        return future
+
+    def wait(self, tx_hash, timeout=None):
+        """
+        Blocks until tx_hash is mined and returns its receipt.
+        """
+        return self.track(tx_hash, timeout=timeout).result()
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.clear()
+            with self._lock:
+                hashes = list(self._pending)
+            if not hashes:
+                self._wakeup.wait()
+                continue
+
+            try:
+                block_number = self.web3.eth.block_number
+                # Hashes already looked up at this block can't have a receipt yet
+                due = [tx_hash for tx_hash in hashes if self._checked.get(tx_hash) != block_number]
+                if due:
+                    receipts = self._fetch_receipts(due)
+                    for tx_hash in due:
+                        self._checked[tx_hash] = block_number
+                    self._resolve(receipts)
+            except Exception as e:
+                print(f"Receipt tracker poll failed: {e}")
+            self._expire()
+            self._wakeup.wait(self.poll_interval)
+
+    def _fetch_receipts(self, hashes):
+        """
+        Returns {tx_hash: receipt} for the hashes that have been mined.
+        """
+        from web3._utils.method_formatters import receipt_formatter
+        from web3.datastructures import AttributeDict
+        from web3.exceptions import TransactionNotFound
+
+        provider = self.web3.provider
+        if not hasattr(provider, "make_batch_request"):
+            receipts = {}
+            for tx_hash in hashes:
+                try:
+                    receipts[tx_hash] = self.web3.eth.get_transaction_receipt(tx_hash)
+                except TransactionNotFound:
+                    continue
+            return receipts
+
+        responses = provider.make_batch_request(
+            [("eth_getTransactionReceipt", [tx_hash]) for tx_hash in hashes]
+        )
+        # Apply web3's own receipt formatting so callers get the same object as get_transaction_receipt
+        return {
+            tx_hash: AttributeDict.recursive(receipt_formatter(response["result"]))
+            for tx_hash, response in zip(hashes, responses)
+            if isinstance(response, dict) and response.get("result")
+        }
+
+    def _resolve(self, receipts):
+        with self._lock:
+            waiters = [(tx_hash, self._pending.pop(tx_hash)) for tx_hash in receipts if tx_hash in self._pending]
+            for tx_hash in receipts:
+                self._checked.pop(tx_hash, None)
+        for tx_hash, entries in waiters:
+            for future, _ in entries:
+                future.set_result(receipts[tx_hash])
+
+    def _expire(self):
+        now = time.time()
+        expired = []
+        with self._lock:
+            for tx_hash, entries in list(self._pending.items()):
+                remaining = [entry for entry in entries if entry[1] > now]
+                expired.extend((tx_hash, future) for future, deadline in entries if deadline <= now)
+                if remaining:
+                    self._pending[tx_hash] = remaining
+                else:
+                    del self._pending[tx_hash]
+                    self._checked.pop(tx_hash, None)
+        for tx_hash, future in expired:
+            future.set_exception(TimeoutError(f"Transaction {tx_hash} not mined in time."))
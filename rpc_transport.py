@@ -0,0 +1,306 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3.providers import JSONBaseProvider
+from web3.providers.async_base import AsyncJSONBaseProvider
+
+from tracing import tracer
+
+# -----------------------------------------------------------------------------
+# Pooled Multi-Endpoint RPC Transport
+# -----------------------------------------------------------------------------
+
+# HTTP statuses worth retrying on another endpoint (rate limits, overload)
+TRANSIENT_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Methods that must reach a node at most once: a send that timed out may
+# already be in the mempool, and resending it can only fail or double-spend
+NON_IDEMPOTENT_METHODS = ("eth_sendRawTransaction",)
+
+
+class TransientRPCError(Exception):
+    pass
+
+
+class SendOutcomeUnknown(Exception):
+    """
+    A non-idempotent request (e.g. a transaction broadcast) failed in transit.
+    The node may or may not have processed it; check the transaction hash
+    before sending again.
+    """
+
+
+class Endpoint:
+    """
+    One RPC URL with a smoothed latency measurement and a failure cooldown.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.latency = 0.0  # Unmeasured endpoints sort first so they get probed
+        self.failures = 0
+        self.down_until = 0.0
+
+    def record_success(self, elapsed, smoothing=0.3):
+        self.latency = elapsed if self.latency == 0.0 else (1 - smoothing) * self.latency + smoothing * elapsed
+        self.failures = 0
+        self.down_until = 0.0
+
+    def record_failure(self, cooldown):
+        self.failures += 1
+        self.down_until = time.time() + cooldown * self.failures
+
+
+class EndpointPool:
+    """
+    Endpoint ranking shared by the sync and async pooled providers.
+    """
+
+    def _init_endpoints(self, endpoint_urls, timeout, max_retries, backoff, cooldown):
+        if isinstance(endpoint_urls, str):
+            endpoint_urls = [endpoint_urls]
+        self.endpoints = [Endpoint(url) for url in endpoint_urls]
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+
+    def __str__(self):
+        return f"{type(self).__name__}({', '.join(endpoint.url for endpoint in self.endpoints)})"
+
+    def ranked_endpoints(self):
+        """
+        Healthy endpoints by latency, followed by those still cooling down.
+        """
+        now = time.time()
+        with self._lock:
+            healthy = sorted((e for e in self.endpoints if e.down_until <= now), key=lambda e: e.latency)
+            cooling = sorted((e for e in self.endpoints if e.down_until > now), key=lambda e: e.down_until)
+        return healthy + cooling
+
+
+class PooledHTTPProvider(EndpointPool, JSONBaseProvider):
+    """
+    web3 provider that spreads JSON-RPC traffic over several endpoints.
+
+    - One pooled requests.Session (keep-alive, pool_size connections per host).
+    - Endpoints are ranked by measured latency; a failing endpoint is put in
+      cooldown and the request fails over to the next one.
+    - Transient errors (timeouts, connection errors, 429/5xx) are retried with
+      exponential backoff. Transaction broadcasts are never retried or failed
+      over; a failed broadcast raises SendOutcomeUnknown.
+    - make_batch_request sends several calls in one HTTP request.
+    """
+
+    def __init__(self, endpoint_urls, pool_size=20, timeout=10, max_retries=3, backoff=0.25, cooldown=5.0):
+        super().__init__()
+        self._init_endpoints(endpoint_urls, timeout, max_retries, backoff, cooldown)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.endpoints), pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, body, idempotent=True):
+        """
+        POSTs an encoded JSON-RPC body, failing over and backing off on
+        transient errors. Returns the decoded JSON response.
+        """
+        if not idempotent:
+            return self._post_once(body)
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            for endpoint in self.ranked_endpoints():
+                started = time.perf_counter()
+                try:
+                    response = self.session.post(
+                        endpoint.url,
+                        data=body,
+                        headers={"Content-Type": "application/json"},
+                        timeout=self.timeout,
+                    )
+                    if response.status_code in TRANSIENT_STATUS_CODES:
+                        raise TransientRPCError(f"{endpoint.url} returned HTTP {response.status_code}")
+                    response.raise_for_status()
+                    decoded = json.loads(response.content)
+                except (requests.ConnectionError, requests.Timeout, TransientRPCError) as e:
+                    with self._lock:
+                        endpoint.record_failure(self.cooldown)
+                    last_error = e
+                    continue
+                with self._lock:
+                    endpoint.record_success(time.perf_counter() - started)
+                return decoded
+            time.sleep(self.backoff * (2 ** attempt))
+        raise ConnectionError(f"All RPC endpoints failed: {last_error}")
+
+    def _post_once(self, body):
+        """
+        POSTs body to the best endpoint exactly once. Any failure after the
+        request may have left the client raises SendOutcomeUnknown.
+        """
+        endpoint = self.ranked_endpoints()[0]
+        started = time.perf_counter()
+        try:
+            response = self.session.post(
+                endpoint.url,
+                data=body,
+                headers={"Content-Type": "application/json"},
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            decoded = json.loads(response.content)
+        except (requests.RequestException, ValueError) as e:
+            with self._lock:
+                endpoint.record_failure(self.cooldown)
+            raise SendOutcomeUnknown(f"{endpoint.url} did not confirm the request: {e}")
+        with self._lock:
+            endpoint.record_success(time.perf_counter() - started)
+        return decoded
+
+    def make_request(self, method, params):
+        with tracer.span("rpc", method=method):
+            return self._post(self.encode_rpc_request(method, params), idempotent=method not in NON_IDEMPOTENT_METHODS)
+
+    def make_batch_request(self, requests_list):
+        """
+        Sends [(method, params), ...] as a single JSON-RPC batch and returns
+        the responses in request order.
+        """
+        if not requests_list:
+            return []
+        first_id = next(self._ids)
+        batch = []
+        for offset, (method, params) in enumerate(requests_list):
+            request = json.loads(self.encode_rpc_request(method, params))
+            request["id"] = f"batch-{first_id}-{offset}"
+            batch.append(request)
+        idempotent = not any(method in NON_IDEMPOTENT_METHODS for method, _ in requests_list)
+        with tracer.span("rpc", method="batch", calls=len(batch)):
+            responses = self._post(json.dumps(batch).encode("utf-8"), idempotent=idempotent)
+        if isinstance(responses, dict):
+            # Some nodes answer a rejected batch with a single error object
+            return [responses] * len(requests_list)
+        by_id = {response.get("id"): response for response in responses}
+        return [by_id.get(request["id"], {"error": {"message": "Missing batch response."}}) for request in batch]
+
+    def is_connected(self, show_traceback=False):
+        try:
+            response = self.make_request("web3_clientVersion", [])
+        except Exception:
+            if show_traceback:
+                raise
+            return False
+        return "error" not in response
+
+
+class AsyncPooledHTTPProvider(EndpointPool, AsyncJSONBaseProvider):
+    """
+    AsyncWeb3 counterpart of PooledHTTPProvider: the same endpoint ranking,
+    failover, backoff and at-most-once broadcasts over aiohttp. One pooled
+    ClientSession is kept per event loop.
+    """
+
+    def __init__(self, endpoint_urls, pool_size=20, timeout=10, max_retries=3, backoff=0.25, cooldown=5.0):
+        super().__init__()
+        self._init_endpoints(endpoint_urls, timeout, max_retries, backoff, cooldown)
+        self.pool_size = pool_size
+        self._sessions = {}
+
+    def _session(self):
+        import aiohttp
+
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Content-Type": "application/json"},
+            )
+            self._sessions[loop] = session
+        return session
+
+    async def _fetch(self, endpoint, body):
+        async with self._session().post(endpoint.url, data=body) as response:
+            if response.status in TRANSIENT_STATUS_CODES:
+                raise TransientRPCError(f"{endpoint.url} returned HTTP {response.status}")
+            response.raise_for_status()
+            return json.loads(await response.read())
+
+    async def _post(self, body, idempotent=True):
+        """
+        Async variant of PooledHTTPProvider._post.
+        """
+        import aiohttp
+
+        if not idempotent:
+            return await self._post_once(body)
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            for endpoint in self.ranked_endpoints():
+                started = time.perf_counter()
+                try:
+                    decoded = await self._fetch(endpoint, body)
+                except (aiohttp.ClientError, asyncio.TimeoutError, TransientRPCError) as e:
+                    with self._lock:
+                        endpoint.record_failure(self.cooldown)
+                    last_error = e
+                    continue
+                with self._lock:
+                    endpoint.record_success(time.perf_counter() - started)
+                return decoded
+            await asyncio.sleep(self.backoff * (2 ** attempt))
+        raise ConnectionError(f"All RPC endpoints failed: {last_error}")
+
+    async def _post_once(self, body):
+        """
+        Async variant of PooledHTTPProvider._post_once.
+        """
+        import aiohttp
+
+        endpoint = self.ranked_endpoints()[0]
+        started = time.perf_counter()
+        try:
+            decoded = await self._fetch(endpoint, body)
+        except (aiohttp.ClientError, asyncio.TimeoutError, TransientRPCError, ValueError) as e:
+            with self._lock:
+                endpoint.record_failure(self.cooldown)
+            raise SendOutcomeUnknown(f"{endpoint.url} did not confirm the request: {e}")
+        with self._lock:
+            endpoint.record_success(time.perf_counter() - started)
+        return decoded
+
+    async def make_request(self, method, params):
+        with tracer.span("rpc", method=method):
+            return await self._post(self.encode_rpc_request(method, params), idempotent=method not in NON_IDEMPOTENT_METHODS)
+
+    async def disconnect(self):
+        sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            await session.close()
+
+
+def batch_request(web3, calls):
+    """
+    Runs independent [(method, params), ...] JSON-RPC calls in one HTTP
+    request when the provider supports batching, sequentially otherwise.
+    Returns the raw results in order and raises on the first error.
+    """
+    provider = web3.provider
+    if hasattr(provider, "make_batch_request"):
+        responses = provider.make_batch_request(calls)
+    else:
+        responses = [provider.make_request(method, params) for method, params in calls]
+    results = []
+    for (method, _), response in zip(calls, responses):
+        if "error" in response:
+            raise ValueError(f"{method} failed: {response['error']}")
+        results.append(response.get("result"))
+    return results
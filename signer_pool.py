@@ -0,0 +1,178 @@
+import contextlib
+import threading
+import time
+
+from rpc_transport import batch_request
+
+# -----------------------------------------------------------------------------
+# Multi-Account Signer Pool
+# -----------------------------------------------------------------------------
+
+
+class Signer:
+    """
+    One signing account with its own nonce manager and allowance ledgers.
+
+    load is the number of requests currently running on the account plus its
+    transactions still waiting for a receipt.
+    """
+
+    def __init__(self, account, nonce_manager, allowance_ledgers):
+        self.account = account
+        self.address = account.address
+        self.private_key = account.key
+        self.nonce_manager = nonce_manager
+        self.allowance_ledgers = allowance_ledgers
+        self.balance = None  # Native balance seen by the last rebalance
+        self._lock = threading.Lock()
+        self._active = 0
+        self._pending = 0
+
+    def __repr__(self):
+        return f"Signer({self.address}, load={self.load()})"
+
+    def load(self) -> int:
+        with self._lock:
+            return self._active + self._pending
+
+    def watch(self, future):
+        """
+        Counts a receipt future towards this signer's load until it resolves.
+        """
+        with self._lock:
+            self._pending += 1
+        future.add_done_callback(self._unwatch)
+        return future
+
+    def _unwatch(self, future):
+        with self._lock:
+            self._pending -= 1
+
+
+class SignerPool:
+    """
+    Spreads requests over several accounts so independent transactions don't
+    queue behind a single nonce sequence.
+
+    assign() hands out the least-loaded signer (ties go to the one used least
+    recently). Accounts whose last seen native balance is below min_balance
+    are skipped while a funded account is available. rebalance() tops up
+    low accounts from the best-funded one; start_rebalancer() runs it
+    periodically in the background.
+    """
+
+    def __init__(self, web3, signers, chain_id, min_balance=0, top_up=0):
+        if not signers:
+            raise ValueError("A signer pool needs at least one account.")
+        self.web3 = web3
+        self.signers = list(signers)
+        self.chain_id = chain_id
+        self.min_balance = min_balance
+        self.top_up = top_up
+        self._lock = threading.Lock()
+        self._last_used = {signer.address: 0.0 for signer in self.signers}
+        self._rebalancer = None
+        self._stopped = False
+
+    @property
+    def primary(self):
+        return self.signers[0]
+
+    def select(self):
+        """
+        Picks the least-loaded funded signer and marks it as used.
+        """
+        with self._lock:
+            funded = [s for s in self.signers if s.balance is None or s.balance >= self.min_balance]
+            signer = min(funded or self.signers, key=lambda s: (s.load(), self._last_used[s.address]))
+            self._last_used[signer.address] = time.monotonic()
+            with signer._lock:
+                signer._active += 1
+            return signer
+
+    @contextlib.contextmanager
+    def assign(self):
+        """
+        Runs a request on the selected signer, counting it towards its load.
+        """
+        signer = self.select()
+        try:
+            yield signer
+        finally:
+            with signer._lock:
+                signer._active -= 1
+
+    def loads(self):
+        return {signer.address: signer.load() for signer in self.signers}
+
+    # -------------------------------------------------------------------------
+    # Gas rebalancing
+    # -------------------------------------------------------------------------
+
+    def refresh_balances(self):
+        """
+        Reads every signer's native balance in one batched request.
+        """
+        results = batch_request(self.web3, [("eth_getBalance", [s.address, "latest"]) for s in self.signers])
+        for signer, balance in zip(self.signers, results):
+            signer.balance = int(balance, 16)
+
+    def rebalance(self):
+        """
+        Sends top_up wei to every signer below min_balance from the signer with
+        the most gas funds, as long as that keeps the funder above min_balance.
+
+        :return: List of (recipient address, tx hash) for the top-ups sent.
+        """
+        self.refresh_balances()
+        gas_price = self.web3.eth.gas_price
+        funder = max(self.signers, key=lambda s: s.balance)
+        sent = []
+        for signer in self.signers:
+            if signer is funder or signer.balance >= self.min_balance:
+                continue
+            fee = 21000 * gas_price
+            if funder.balance - self.top_up - fee < self.min_balance:
+                print(f"⚠️ Not enough gas funds to top up {signer.address}.")
+                break
+
+            def build_tx(nonce, recipient=signer.address):
+                return {
+                    "to": recipient,
+                    "value": self.top_up,
+                    "gas": 21000,
+                    "gasPrice": gas_price,
+                    "nonce": nonce,
+                    "chainId": self.chain_id,
+                }
+
+            tx_hash = funder.nonce_manager.send_transaction(build_tx, funder.private_key)
+            print(f"Topped up {signer.address} with {self.top_up} wei from {funder.address}. TX Hash: {tx_hash.hex()}")
+            funder.balance -= self.top_up + fee
+            signer.balance += self.top_up
+            sent.append((signer.address, tx_hash))
+        return sent
+
+    def start_rebalancer(self, interval=60.0):
+        """
+        Starts a daemon thread that runs rebalance() every interval seconds.
+        """
+        with self._lock:
+            if self._rebalancer is not None and self._rebalancer.is_alive():
+                return
+            self._stopped = False
+            self._rebalancer = threading.Thread(
+                target=self._rebalance_loop, args=(interval,), name="signer-rebalancer", daemon=True
+            )
+            self._rebalancer.start()
+
+    def stop(self):
+        self._stopped = True
+
+    def _rebalance_loop(self, interval):
+        while not self._stopped:
+            try:
+                self.rebalance()
+            except Exception as e:
+                print(f"Signer rebalance failed: {e}")
+            time.sleep(interval)
@@ -0,0 +1,121 @@
+import threading
+from collections import namedtuple
+from concurrent.futures import Future
+
+from event_indexer import TRANSFER_TOPIC
+from tracing import tracer
+
+# -----------------------------------------------------------------------------
+# Swap Coalescing Queue
+# -----------------------------------------------------------------------------
+
+# One requester's part of a coalesced swap
+SwapFill = namedtuple("SwapFill", ["amount_in", "amount_out", "tx_hash", "batch_size"])
+
+
+def split_pro_rata(amount_out, amounts_in):
+    """
+    Splits amount_out in proportion to amounts_in, rounding down. The
+    rounding remainder goes to the largest contribution, so the shares
+    always add up to amount_out.
+    """
+    total = sum(amounts_in)
+    shares = [amount_out * amount // total for amount in amounts_in]
+    largest = max(range(len(amounts_in)), key=lambda index: amounts_in[index])
+    shares[largest] += amount_out - sum(shares)
+    return shares
+
+
+def transferred_to(receipt, token, recipient) -> int:
+    """
+    Sums the ERC-20 Transfer logs of token to recipient in a receipt.
+    """
+    recipient_topic = bytes(12) + bytes.fromhex(recipient[2:])
+    received = 0
+    for log in receipt.logs:
+        topics = [bytes(topic) for topic in log["topics"]]
+        if (log["address"].lower() == token.lower() and len(topics) == 3
+                and "0x" + topics[0].hex() == TRANSFER_TOPIC and topics[2] == recipient_topic):
+            received += int.from_bytes(bytes(log["data"]), "big")
+    return received
+
+
+class SwapBatcher:
+    """
+    Merges concurrent small swaps for the same path into one router call.
+
+    The first request opens a window of `window` seconds; every request
+    arriving before it closes (up to max_batch) joins the batch. A batch of
+    one runs as an ordinary swap through execute_single(request). Larger
+    batches are summed and swapped once through execute_batch(total), which
+    returns (tx hash, output amount); each requester's Future then resolves
+    to a SwapFill with its pro-rata share of the output.
+    """
+
+    def __init__(self, execute_single, execute_batch, window=0.25, max_batch=20):
+        self.execute_single = execute_single
+        self.execute_batch = execute_batch
+        self.window = window
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._batch = None  # [(amount_in, request, future)] of the open window
+        self._stats = {"requests": 0, "single": 0, "batches": 0, "batched_requests": 0, "swaps_saved": 0}
+
+    def submit(self, amount_in, request) -> Future:
+        """
+        Queues a swap of amount_in. The Future resolves to execute_single's
+        result when the request ends up alone, otherwise to a SwapFill.
+        """
+        future = Future()
+        with self._lock:
+            self._stats["requests"] += 1
+            if self._batch is None:
+                self._batch = []
+                timer = threading.Timer(self.window, self._close, args=(self._batch,))
+                timer.daemon = True
+                timer.start()
+            batch = self._batch
+            batch.append((amount_in, request, future))
+            full = len(batch) >= self.max_batch
+            if full:
+                self._batch = None
+        if full:
+            self._run(batch)
+        return future
+
+    def _close(self, batch):
+        with self._lock:
+            if self._batch is not batch:
+                return  # Already sent when it filled up
+            self._batch = None
+        self._run(batch)
+
+    def _run(self, batch):
+        if len(batch) == 1:
+            _, request, future = batch[0]
+            with self._lock:
+                self._stats["single"] += 1
+            try:
+                future.set_result(self.execute_single(request))
+            except Exception as e:
+                future.set_exception(e)
+            return
+
+        amounts = [amount_in for amount_in, _, _ in batch]
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["batched_requests"] += len(batch)
+            self._stats["swaps_saved"] += len(batch) - 1
+        try:
+            with tracer.span("swap_batch", size=len(batch)):
+                tx_hash, amount_out = self.execute_batch(sum(amounts))
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (amount_in, _, future), share in zip(batch, split_pro_rata(amount_out, amounts)):
+            future.set_result(SwapFill(amount_in, share, tx_hash, len(batch)))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
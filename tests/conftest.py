@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# The agent is a set of top-level modules, make them importable from the tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fake_chain():
+    """
+    Yields (chain, web3) for a funded benchmark FakeChain served over local HTTP.
+    """
+    from eth_account import Account
+    from web3 import Web3
+
+    from benchmark import FakeChain, FakeChainServer, benchmark_key
+    from rpc_transport import PooledHTTPProvider
+
+    chain = FakeChain()
+    chain.fund(Account.from_key(benchmark_key(0)).address, btc_wei=10**24, musd_wei=10**27)
+    server = FakeChainServer(chain)
+    web3 = Web3(PooledHTTPProvider([server.start()]))
+    yield chain, web3
+    server.stop()
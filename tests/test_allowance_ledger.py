@@ -0,0 +1,118 @@
+import argparse
+import os
+import threading
+
+import pytest
+
+import mezo_context
+from allowance_ledger import MAX_UINT256, AllowanceLedger
+
+
+class StubCall:
+    def __init__(self, value):
+        self.value = value
+
+    def call(self):
+        return self.value
+
+
+class StubFunctions:
+    def __init__(self, token):
+        self.token = token
+
+    def allowance(self, owner, spender):
+        self.token.reads += 1
+        return StubCall(self.token.allowance)
+
+
+class StubToken:
+    def __init__(self, allowance=0):
+        self.allowance = allowance
+        self.reads = 0
+        self.functions = StubFunctions(self)
+
+
+def test_ensure_reads_once_then_tracks_locally():
+    token = StubToken(allowance=100)
+    ledger = AllowanceLedger(token, "0xowner", "0xrouter")
+    approvals = []
+    assert ledger.ensure(60, approvals.append) is None
+    assert ledger.ensure(40, approvals.append) is None
+    assert ledger.available() == 0
+    assert token.reads == 1
+    assert approvals == []
+
+
+@pytest.mark.parametrize("strategy, cap, expected", [
+    ("exact", 0, 0),
+    ("capped", 1000, 900),
+    ("unlimited", 0, MAX_UINT256),
+])
+def test_ensure_approves_by_strategy(strategy, cap, expected):
+    ledger = AllowanceLedger(StubToken(), "0xowner", "0xrouter", strategy=strategy, cap=cap)
+    approvals = []
+    assert ledger.ensure(100, lambda amount: approvals.append(amount) or "0xhash") == "0xhash"
+    assert approvals == [max(100, cap) if strategy != "unlimited" else MAX_UINT256]
+    assert ledger.available() == expected
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        AllowanceLedger(StubToken(), "0xowner", "0xrouter", strategy="generous")
+
+
+def test_release_and_resync():
+    token = StubToken(allowance=100)
+    ledger = AllowanceLedger(token, "0xowner", "0xrouter")
+    ledger.ensure(70, lambda amount: None)
+    ledger.release(70)
+    assert ledger.available() == 100
+    token.allowance = 5
+    ledger.resync()
+    assert ledger.needs_sync()
+    assert ledger.available() == 5
+
+
+def test_reserve_spend_runs_before_another_approval():
+    ledger = AllowanceLedger(StubToken(), "0xowner", "0xrouter")
+    order = []
+    lock = threading.Lock()
+
+    def swap(name):
+        def send_approval(amount):
+            with lock:
+                order.append(f"approve {name}")
+            return name
+
+        def reserve_spend():
+            with lock:
+                order.append(f"swap {name}")
+
+        ledger.ensure(10, send_approval, reserve_spend)
+
+    threads = [threading.Thread(target=swap, args=(name,)) for name in "abcdefgh"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Every approval is directly followed by the swap relying on it
+    for index in range(0, len(order), 2):
+        assert order[index].split()[1] == order[index + 1].split()[1]
+        assert order[index].startswith("approve") and order[index + 1].startswith("swap")
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_concurrent_exact_approvals_do_not_revert_swaps(monkeypatch, use_async):
+    from benchmark import run_benchmark
+
+    monkeypatch.setenv("MEZO_APPROVAL_STRATEGY", "exact")
+    args = argparse.Namespace(
+        requests=12, warmup=0, flows=["swap"], phrasing="fast", concurrency=6, use_async=use_async,
+        signers=1, llm_latency=0.0, rpc_latency=0.0, block_time=0.0, verbose=False,
+    )
+    signer_keys, context = os.environ.get("MEZO_SIGNER_KEYS"), mezo_context._context
+    report = run_benchmark(args)
+    assert report["failed"] == 0
+    # The benchmark's settings and context don't outlive it
+    assert os.environ.get("MEZO_SIGNER_KEYS") == signer_keys
+    assert mezo_context._context is context
@@ -0,0 +1,24 @@
+import pytest
+
+from bulk_transfer import load_payout_rows, parse_inline
+
+FIRST = "0x" + "ab" * 20
+SECOND = "0x" + "cd" * 20
+
+
+def test_each_pays_every_listed_address():
+    assert parse_inline(f"send 5 mUSD each to {FIRST} and {SECOND}, 2 BTC to {FIRST}") == [
+        {"recipient": FIRST, "amount": "5", "currency": "mUSD"},
+        {"recipient": SECOND, "amount": "5", "currency": "mUSD"},
+        {"recipient": FIRST, "amount": "2", "currency": "BTC"},
+    ]
+
+
+@pytest.mark.parametrize("prompt", [
+    f"send 5 mUSD to {FIRST} and {SECOND}",  # Split or each?
+    f"send 5 mUSD to {FIRST}, {SECOND}",
+    f"send 1 BTC to {FIRST} and 5 mUSD to {FIRST} and {SECOND}",
+])
+def test_several_addresses_without_each_go_to_the_llm(prompt):
+    assert parse_inline(prompt) is None
+    assert load_payout_rows(prompt) is None
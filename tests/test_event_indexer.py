@@ -0,0 +1,110 @@
+from event_indexer import TRANSFER_TOPIC, EventIndexer, address_topic, topic_address
+
+TOKEN = "0x" + "11" * 20
+OWNER = "0x" + "aa" * 20
+FRIEND = "0x" + "bb" * 20
+NEW_SIGNER = "0x" + "cc" * 20
+
+
+class StubChain:
+    """
+    Serves eth_getLogs for Transfer events and balanceOf at the head only,
+    like a node without archive state.
+    """
+
+    def __init__(self, starting_balances):
+        self.head = 100
+        self.starting_balances = dict(starting_balances)
+        self.transfers = []
+
+    def transfer(self, sender, recipient, amount):
+        self.head += 1
+        self.transfers.append((self.head, sender, recipient, amount))
+
+    def balance(self, owner):
+        balance = self.starting_balances.get(owner, 0)
+        for _, sender, recipient, amount in self.transfers:
+            balance += amount if recipient == owner else 0
+            balance -= amount if sender == owner else 0
+        return balance
+
+    def make_request(self, method, params):
+        if method == "eth_call":
+            call, block = params
+            if int(block, 16) != self.head:
+                return {"error": {"message": "missing trie node"}}
+            return {"result": "0x" + format(self.balance(topic_address(call["data"][10:])), "064x")}
+        if method == "eth_getBlockByNumber":
+            number = int(params[0], 16)
+            return {"result": {"hash": hex(number), "timestamp": hex(number * 10)}}
+        if method == "eth_getLogs":
+            query = params[0]
+            senders, recipients = (query["topics"][1:] + [None])[:2]
+            logs = []
+            for index, (number, sender, recipient, amount) in enumerate(self.transfers):
+                if not int(query["fromBlock"], 16) <= number <= int(query["toBlock"], 16):
+                    continue
+                if senders is not None and address_topic(sender) not in senders:
+                    continue
+                if recipients is not None and address_topic(recipient) not in recipients:
+                    continue
+                logs.append({
+                    "blockNumber": hex(number), "transactionHash": f"0x{index:064x}", "logIndex": "0x0",
+                    "address": TOKEN, "topics": [TRANSFER_TOPIC, address_topic(sender), address_topic(recipient)],
+                    "data": hex(amount),
+                })
+            return {"result": logs}
+        raise AssertionError(f"Unexpected RPC call {method}")
+
+
+class StubWeb3:
+    def __init__(self, chain):
+        self.provider = chain
+        self.eth = self
+
+    @property
+    def block_number(self):
+        return self.provider.head
+
+
+def make_indexer(chain, db_path, owners):
+    return EventIndexer(StubWeb3(chain), str(db_path), {TOKEN: "mUSD"}, owners, start_block=1, chunk_size=40)
+
+
+def test_history_filters_before_the_limit(tmp_path):
+    chain = StubChain({OWNER: 10**6})
+    chain.transfer(FRIEND, OWNER, 5)
+    for _ in range(100):
+        chain.transfer(OWNER, "0x" + "dd" * 20, 1)
+    indexer = make_indexer(chain, tmp_path / "index.db", [OWNER])
+    indexer.sync()
+
+    incoming = indexer.history(OWNER, direction="in", limit=5)
+    assert [(entry.kind, entry.amount, entry.counterparty) for entry in incoming] == [("in", 5, FRIEND)]
+    assert [entry.amount for entry in indexer.history(OWNER, counterparty=FRIEND, limit=5)] == [5]
+    assert len(indexer.history(OWNER, direction="out", limit=5)) == 5
+
+
+def test_balances_need_no_archive_state(tmp_path):
+    chain = StubChain({OWNER: 1000})
+    chain.transfer(OWNER, FRIEND, 300)
+    indexer = make_indexer(chain, tmp_path / "index.db", [OWNER])
+    indexer.sync()
+    assert indexer.balances(OWNER) == ({"mUSD": 700}, chain.head)
+
+    chain.transfer(FRIEND, OWNER, 50)
+    indexer.sync()
+    assert indexer.balances(OWNER) == ({"mUSD": 750}, chain.head)
+
+
+def test_owners_added_later_are_initialized(tmp_path):
+    chain = StubChain({OWNER: 1000})
+    chain.transfer(OWNER, NEW_SIGNER, 200)
+    make_indexer(chain, tmp_path / "index.db", [OWNER]).sync()
+
+    chain.transfer(NEW_SIGNER, FRIEND, 20)
+    indexer = make_indexer(chain, tmp_path / "index.db", [OWNER, NEW_SIGNER])
+    indexer.sync()
+    assert indexer.balances(NEW_SIGNER) == ({"mUSD": 180}, chain.head)
+    assert [entry.kind for entry in indexer.history(NEW_SIGNER)] == ["out", "in"]
+    assert indexer.balances(OWNER) == ({"mUSD": 800}, chain.head)
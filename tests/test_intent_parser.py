@@ -0,0 +1,83 @@
+import pytest
+
+from intent_parser import FastIntentParser, hit_rates
+
+ADDRESS = "0x" + "ab" * 20
+
+
+@pytest.fixture
+def parser():
+    return FastIntentParser("0xrouter")
+
+
+@pytest.mark.parametrize("prompt, amount, currency", [
+    (f"send 1.5 BTC to {ADDRESS}", "1.5", "BTC"),
+    (f"Please transfer .25 musd to {ADDRESS}.", ".25", "mUSD"),
+    (f"pay 10 mUSD to {ADDRESS}", "10", "mUSD"),
+    (f"could you send 2 btc to {ADDRESS}?", "2", "BTC"),
+])
+def test_parse_transfer(parser, prompt, amount, currency):
+    assert parser.parse_transfer(prompt) == {"amount": amount, "currency": currency, "recipient": ADDRESS}
+
+
+@pytest.mark.parametrize("prompt", [
+    f"send 1 BTC or 2 BTC to {ADDRESS}",  # Two amounts
+    f"send 1 ETH to {ADDRESS}",  # Unsupported currency
+    "send 1 BTC to my friend",  # No address
+    f"swap 1 BTC to {ADDRESS}",  # Swap verb
+    f"don't send 5 BTC to {ADDRESS}",  # Negation
+    f"should I send 5 btc to {ADDRESS}",  # Question, not a command
+    f"send 5 BTC to {ADDRESS} unless balance is low",  # Condition
+    f"send 5 mUSD worth of BTC to {ADDRESS}",  # Currency conversion
+    "send -5 btc",  # Negative amount, no address
+    f"send -5 btc to {ADDRESS}",  # Negative amount
+    f"send 1 BTC to {ADDRESS}?",  # Question without a polite prefix
+])
+def test_parse_transfer_falls_back_when_ambiguous(parser, prompt):
+    assert parser.parse_transfer(prompt) is None
+
+
+@pytest.mark.parametrize("prompt, amount", [
+    ("swap 100 mUSD for BTC", "100"),
+    ("convert 2.5 musd into wrapped btc", "2.5"),
+    ("trade 7 mUSD to wBTC", "7"),
+])
+def test_parse_swap(parser, prompt, amount):
+    assert parser.parse_swap(prompt) == {
+        "amount": amount, "from_currency": "mUSD", "to_currency": "BTC", "router_address": "0xrouter",
+    }
+
+
+@pytest.mark.parametrize("prompt", [
+    "swap 1 BTC for mUSD",
+    "swap 1 or 2 mUSD for BTC",
+    "swap mUSD for BTC",
+    "do not swap 10 musd for btc",
+    "swap 10 musd for btc when price drops",
+])
+def test_parse_swap_falls_back_when_ambiguous(parser, prompt):
+    assert parser.parse_swap(prompt) is None
+
+
+def test_parse_balance(parser):
+    assert parser.parse_balance("what's my balance?") == {"query": "balance"}
+    assert parser.parse_balance("how much BTC can I send?") is None
+
+
+def test_parse_history(parser):
+    assert parser.parse_history("what did I send last week?") == {
+        "direction": "out", "currency": None, "lookback_seconds": 7 * 86400, "counterparty": None,
+    }
+    assert parser.parse_history(f"my swaps of mUSD in the past 2 days with {ADDRESS}") == {
+        "direction": "swap", "currency": "mUSD", "lookback_seconds": 2 * 86400, "counterparty": ADDRESS,
+    }
+    assert parser.parse_history("send 1 BTC") is None
+
+
+def test_stats_and_hit_rates(parser):
+    parser.parse_transfer(f"send 1 BTC to {ADDRESS}")
+    parser.parse_transfer("send 1 BTC somewhere")
+    stats = parser.stats()
+    assert stats["transfer_hits"] == 1 and stats["transfer_misses"] == 1
+    assert hit_rates(stats)["transfer"] == 0.5
+    assert 'mezo_fast_parser_total{kind="transfer",result="hit"} 1' in parser.prometheus_lines()
@@ -0,0 +1,43 @@
+import threading
+
+import pytest
+
+from mezo_service import AgentService, handle_payload
+
+
+@pytest.fixture
+def service():
+    release = threading.Event()
+
+    def handler(prompt):
+        if prompt == "fail":
+            raise TimeoutError()
+        release.wait(5)
+        return f"done: {prompt}"
+
+    service = AgentService(handler, workers=2)
+    service.release = release
+    service.start()
+    yield service
+    release.set()
+    service.stop()
+
+
+def test_slow_request_answers_202_and_can_be_collected(service):
+    status, body = handle_payload(service, {"prompt": "swap"}, timeout=0.05)
+    assert status == 202
+    assert body["state"] == "running"
+    request_id = body["request_id"]
+    assert handle_payload(service, {"request_id": request_id}, timeout=0.05)[0] == 202
+
+    service.release.set()
+    service.lookup(request_id).result(timeout=5)
+    assert handle_payload(service, {"request_id": request_id}, timeout=0.05) == (
+        200, {"request_id": request_id, "state": "done", "response": "done: swap"}
+    )
+    assert handle_payload(service, {"request_id": request_id}, timeout=0.05)[0] == 404
+
+
+def test_failure_without_message_names_the_error(service):
+    status, body = handle_payload(service, {"prompt": "fail"}, timeout=5)
+    assert (status, body["state"], body["error"]) == (500, "failed", "TimeoutError")
@@ -0,0 +1,215 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from eth_account import Account
+from web3 import AsyncWeb3, Web3
+
+from benchmark import FakeChain, FakeChainServer, benchmark_key, benchmark_recipient
+from nonce_manager import NonceManager, is_already_known, is_nonce_conflict
+from rpc_transport import AsyncPooledHTTPProvider, PooledHTTPProvider, SendOutcomeUnknown
+
+
+class StubEth:
+    def __init__(self, pending):
+        self.pending = pending
+
+    def get_transaction_count(self, address, block):
+        return self.pending
+
+
+class StubWeb3:
+    def __init__(self, pending=0):
+        self.eth = StubEth(pending)
+
+
+def transfer(nonce, value=10**18):
+    return {"to": benchmark_recipient(1), "value": value, "gas": 21000, "gasPrice": 10**9, "nonce": nonce, "chainId": 31611}
+
+
+def test_allocate_seeds_once_from_chain():
+    web3 = StubWeb3(pending=7)
+    manager = NonceManager(web3, "0xabc")
+    assert manager.needs_sync()
+    assert manager.allocate() == 7
+    web3.eth.pending = 100
+    assert manager.allocate_many(3) == [8, 9, 10]
+    assert manager.in_flight() == [7, 8, 9, 10]
+
+
+def test_sync_only_seeds_an_unseeded_manager():
+    manager = NonceManager(StubWeb3(pending=0), "0xabc")
+    manager.sync(5)
+    manager.sync(9)
+    assert manager.allocate() == 5
+
+
+def test_release_collapses_the_tip_and_fills_gaps_first():
+    manager = NonceManager(StubWeb3(pending=0), "0xabc")
+    assert manager.allocate_many(4) == [0, 1, 2, 3]
+    manager.release(1)
+    manager.release(3)
+    manager.release(2)
+    # 3 and 2 collapse into the tip, 1 is reused before anything new
+    assert manager.allocate() == 1
+    assert manager.allocate() == 2
+    assert manager.in_flight() == [0, 1, 2]
+
+
+def test_resync_never_reissues_in_flight_nonces():
+    web3 = StubWeb3(pending=3)
+    manager = NonceManager(web3, "0xabc")
+    assert manager.allocate_many(4) == [3, 4, 5, 6]
+    manager.release(4)
+    # 3 mined, 5 and 6 are still held by other requests
+    web3.eth.pending = 4
+    assert manager.resync() == 7
+    assert manager.in_flight() == [5, 6]
+    assert manager.allocate() == 4
+    assert manager.allocate() == 7
+
+
+def test_resync_follows_the_chain_when_nothing_is_in_flight():
+    web3 = StubWeb3(pending=0)
+    manager = NonceManager(web3, "0xabc")
+    manager.allocate_many(2)
+    web3.eth.pending = 10
+    assert manager.resync() == 10
+    assert manager.allocate() == 10
+
+
+def test_rpc_error_classification():
+    assert is_nonce_conflict(ValueError("nonce too low"))
+    assert is_nonce_conflict(ValueError({"message": "replacement transaction underpriced"}))
+    assert not is_nonce_conflict(ValueError("already known"))
+    assert is_already_known(ValueError("ALREADY KNOWN"))
+
+
+def test_nonce_too_low_for_our_own_transaction_is_not_resent(fake_chain):
+    chain, web3 = fake_chain
+    account = Account.from_key(benchmark_key(0))
+    first = web3.eth.send_raw_transaction(Account.sign_transaction(transfer(0), account.key).raw_transaction)
+    manager = NonceManager(web3, account.address)
+    manager.sync(0)
+
+    assert manager.send_transaction(transfer, account.key) == first
+    assert chain.native[benchmark_recipient(1).lower()] == 10**18
+
+
+def test_dropped_transaction_nonce_is_refilled():
+    web3 = StubWeb3(pending=0)
+    manager = NonceManager(web3, "0xabc")
+    manager._is_known = lambda tx_hash: False
+    assert manager.allocate_many(3) == [0, 1, 2]
+    manager._settle(0, "0x01", None, TimeoutError())
+    assert manager.in_flight() == [1, 2]
+    assert manager.allocate() == 0
+
+
+class SlowSends(FakeChain):
+    """
+    Accepts transactions but answers after the client has given up.
+    """
+
+    def rpc_eth_sendRawTransaction(self, raw_hex):
+        result = super().rpc_eth_sendRawTransaction(raw_hex)
+        time.sleep(1.5)
+        return result
+
+
+def test_send_timeout_is_never_resent():
+    chain = SlowSends()
+    account = Account.from_key(benchmark_key(0))
+    chain.fund(account.address, btc_wei=10**22)
+    server = FakeChainServer(chain)
+    web3 = Web3(PooledHTTPProvider([server.start()], timeout=1))
+    try:
+        manager = NonceManager(web3, account.address)
+        with pytest.raises(SendOutcomeUnknown, match="check the hash"):
+            manager.send_transaction(transfer, account.key)
+        time.sleep(1)
+        assert server.counts()[1]["eth_sendRawTransaction"] == 1
+        assert chain.native[benchmark_recipient(1).lower()] == 10**18
+        # The nonce stays taken, the next send must not reuse it
+        assert manager.in_flight() == [0]
+        assert manager.allocate() == 1
+    finally:
+        server.stop()
+
+
+def test_async_send_timeout_is_never_resent():
+    chain = SlowSends()
+    account = Account.from_key(benchmark_key(0))
+    chain.fund(account.address, btc_wei=10**22)
+    server = FakeChainServer(chain)
+    async_web3 = AsyncWeb3(AsyncPooledHTTPProvider([server.start()], timeout=1))
+
+    async def build_tx(nonce):
+        return transfer(nonce)
+
+    try:
+        manager = NonceManager(StubWeb3(pending=0), account.address)
+        with pytest.raises(SendOutcomeUnknown, match="check the hash"):
+            asyncio.run(manager.asend_transaction(async_web3, build_tx, account.key))
+        time.sleep(1)
+        assert server.counts()[1]["eth_sendRawTransaction"] == 1
+        assert manager.in_flight() == [0]
+        assert manager.allocate() == 1
+    finally:
+        server.stop()
+
+
+class TimingOutEth:
+    account = Account
+
+    async def send_raw_transaction(self, raw_transaction):
+        raise TimeoutError()
+
+
+class TimingOutWeb3:
+    eth = TimingOutEth()
+
+
+def test_async_transport_error_keeps_the_nonce():
+    manager = NonceManager(StubWeb3(pending=0), "0xabc")
+
+    async def build_tx(nonce):
+        return transfer(nonce)
+
+    with pytest.raises(SendOutcomeUnknown, match="check the hash"):
+        asyncio.run(manager.asend_transaction(TimingOutWeb3(), build_tx, benchmark_key(0)))
+    assert manager.in_flight() == [0]
+
+
+class ConflictingEth:
+    """
+    Another process wins every nonce: each send is rejected and the chain moves on.
+    """
+    account = Account
+
+    def __init__(self):
+        self.pending = 0
+
+    def get_transaction_count(self, address, block):
+        return self.pending
+
+    def get_transaction(self, tx_hash):
+        from web3.exceptions import TransactionNotFound
+
+        raise TransactionNotFound("not found")
+
+    def send_raw_transaction(self, raw_transaction):
+        self.pending += 1
+        raise ValueError({"message": "nonce too low"})
+
+
+def test_conflicting_nonce_is_not_reused_after_the_last_retry():
+    web3 = SimpleNamespace(eth=ConflictingEth())
+    manager = NonceManager(web3, "0xabc", max_retries=1)
+    with pytest.raises(ValueError, match="nonce too low"):
+        manager.send_transaction(transfer, benchmark_key(0))
+    assert manager.in_flight() == []
+    web3.eth.pending = 1
+    # Nonce 1 lost its conflict too, it must not come back from the released pool
+    assert manager.allocate() == 2
@@ -0,0 +1,60 @@
+import time
+from types import SimpleNamespace
+
+from prefetch import StatePrefetcher
+
+MUSD = "0x" + "11" * 20
+SIGNER = "0x" + "aa" * 20
+
+
+class StubAggregator:
+    def read(self, calls, extra):
+        # mUSD balance, Wrapped BTC balance and allowance; block, gas price and native balance
+        return [500, 2, 0], ["0x7", "0x3b9aca00", "0x10"]
+
+
+class StubChainCache:
+    def __init__(self):
+        self.gas_price = None
+
+    def on_new_head(self, block_number):
+        self.head = block_number
+
+    def start(self):
+        pass
+
+    def set_gas_price(self, gas_price):
+        self.gas_price = gas_price
+
+    def block_number(self):
+        return 7
+
+
+def make_prefetcher():
+    ledger = SimpleNamespace(sync=lambda allowance: None)
+    signer = SimpleNamespace(
+        address=SIGNER, nonce_manager=SimpleNamespace(needs_sync=lambda: False), allowance_ledgers={MUSD: ledger}
+    )
+    pool = SimpleNamespace(signers=[signer])
+    return StatePrefetcher(StubAggregator(), StubChainCache(), pool, MUSD, "0x" + "22" * 20, "0x" + "33" * 20)
+
+
+def test_snapshot_marks_the_prefetch_served():
+    prefetcher = make_prefetcher()
+    prefetch = prefetcher.start()
+    snapshot = prefetcher.snapshot(SIGNER)
+    assert (snapshot.block_number, snapshot.btc_balance, snapshot.musd_balance) == (7, 16, 500)
+    assert prefetch.served
+    assert prefetcher.chain_cache.gas_price == 10**9
+
+    prefetcher.finish(prefetch, time.perf_counter(), prefetch.served)
+    assert prefetcher.stats()["used"] == 1
+
+
+def test_unread_prefetch_is_counted_as_discarded():
+    prefetcher = make_prefetcher()
+    prefetch = prefetcher.start()
+    prefetch.future.result()
+    assert not prefetch.served
+    assert prefetcher.finish(prefetch, time.perf_counter(), prefetch.served) == 0.0
+    assert prefetcher.stats()["discarded"] == 1
@@ -0,0 +1,54 @@
+from quote_engine import QuoteEngine, get_amount_out, get_amounts_out
+
+MUSD, WBTC, USDC = "0xaa", "0xbb", "0xcc"
+
+
+def both_ways(token_a, token_b, reserve_a, reserve_b):
+    return {(token_a, token_b): (reserve_a, reserve_b), (token_b, token_a): (reserve_b, reserve_a)}
+
+
+def engine(max_hops=3):
+    return QuoteEngine(None, None, "0xrouter", [MUSD, WBTC, USDC], max_hops=max_hops)
+
+
+def test_get_amount_out_matches_uniswap_v2():
+    # 1000 in against a 10,000 / 10,000 pool with a 0.3% fee
+    assert get_amount_out(1000, 10_000, 10_000) == 906
+    assert get_amount_out(0, 10_000, 10_000) == 0
+    assert get_amount_out(1000, 0, 10_000) == 0
+
+
+def test_get_amounts_out_chains_hops():
+    reserves = {**both_ways(MUSD, USDC, 10**6, 10**6), **both_ways(USDC, WBTC, 10**6, 10**3)}
+    amounts = get_amounts_out(10**4, [MUSD, USDC, WBTC], reserves)
+    assert amounts[0] == 10**4
+    assert amounts[1] == get_amount_out(10**4, 10**6, 10**6)
+    assert amounts[2] == get_amount_out(amounts[1], 10**6, 10**3)
+
+
+def test_candidate_paths_skips_empty_pools_and_respects_max_hops():
+    reserves = {
+        **both_ways(MUSD, WBTC, 10**6, 10**3),
+        **both_ways(MUSD, USDC, 10**6, 10**6),
+        **both_ways(USDC, WBTC, 10**6, 10**3),
+    }
+    paths = sorted(engine().candidate_paths(MUSD, WBTC, reserves))
+    assert paths == [[MUSD, WBTC], [MUSD, USDC, WBTC]]
+    assert list(engine(max_hops=1).candidate_paths(MUSD, WBTC, reserves)) == [[MUSD, WBTC]]
+
+    reserves.update(both_ways(MUSD, WBTC, 0, 0))
+    assert list(engine().candidate_paths(MUSD, WBTC, reserves)) == [[MUSD, USDC, WBTC]]
+
+
+def test_quote_picks_the_path_with_the_largest_output():
+    quoter = engine()
+    reserves = {
+        **both_ways(MUSD, WBTC, 10**6, 10**2),  # Thin direct pool
+        **both_ways(MUSD, USDC, 10**9, 10**9),
+        **both_ways(USDC, WBTC, 10**9, 10**6),
+    }
+    quoter.reserves = lambda: (reserves, 42)
+    quote = quoter.quote(MUSD, WBTC, 10**4)
+    assert quote.path == [MUSD, USDC, WBTC]
+    assert quote.block_number == 42
+    assert quote.min_amount_out(50) == quote.amount_out * 9950 // 10_000
@@ -0,0 +1,87 @@
+import pytest
+
+from swap_batcher import SwapBatcher, SwapFill, split_pro_rata
+
+
+class StubExecutor:
+    """
+    Records calls; a batch swap returns twice its input as the output.
+    """
+
+    def __init__(self, error=None):
+        self.error = error
+        self.singles = []
+        self.batches = []
+
+    def execute_single(self, request):
+        self.singles.append(request)
+        return f"single {request}"
+
+    def execute_batch(self, total):
+        self.batches.append(total)
+        if self.error is not None:
+            raise self.error
+        return "0xbatch", 2 * total
+
+
+def make_batcher(executor, window=0.05, max_batch=20):
+    return SwapBatcher(executor.execute_single, executor.execute_batch, window=window, max_batch=max_batch)
+
+
+def test_split_pro_rata_adds_up_exactly():
+    shares = split_pro_rata(1000, [1, 1, 1])
+    assert sum(shares) == 1000
+    assert shares == [334, 333, 333]
+
+
+def test_split_pro_rata_remainder_goes_to_the_largest_contribution():
+    shares = split_pro_rata(10, [1, 5, 1])
+    assert shares == [1, 8, 1]
+
+
+@pytest.mark.parametrize("amounts", [[7], [3, 9, 2, 8], [10**18, 1, 5 * 10**17]])
+def test_split_pro_rata_is_proportional(amounts):
+    amount_out = 123_456_789
+    shares = split_pro_rata(amount_out, amounts)
+    assert sum(shares) == amount_out
+    for share, amount in zip(shares, amounts):
+        assert abs(share - amount_out * amount / sum(amounts)) <= len(amounts)
+
+
+def test_window_close_sends_one_batch():
+    executor = StubExecutor()
+    batcher = make_batcher(executor)
+    futures = [batcher.submit(amount, f"request {amount}") for amount in (10, 30)]
+    fills = [future.result(timeout=5) for future in futures]
+    assert executor.batches == [40]
+    assert fills == [SwapFill(10, 20, "0xbatch", 2), SwapFill(30, 60, "0xbatch", 2)]
+    assert batcher.stats()["swaps_saved"] == 1
+
+
+def test_lone_request_runs_as_a_single_swap():
+    executor = StubExecutor()
+    batcher = make_batcher(executor)
+    assert batcher.submit(10, "alone").result(timeout=5) == "single alone"
+    assert executor.singles == ["alone"]
+    assert executor.batches == []
+
+
+def test_full_batch_is_sent_before_the_window_closes():
+    executor = StubExecutor()
+    batcher = make_batcher(executor, window=60, max_batch=3)
+    futures = [batcher.submit(1, index) for index in range(3)]
+    # The window timer is far away, the third request flushed the batch itself
+    assert all(future.done() for future in futures)
+    assert executor.batches == [3]
+    # The next request opens a new window
+    batcher.window = 0.05
+    assert batcher.submit(5, "next").result(timeout=5) == "single next"
+
+
+def test_batch_failure_reaches_every_requester():
+    executor = StubExecutor(error=RuntimeError("router reverted"))
+    batcher = make_batcher(executor)
+    futures = [batcher.submit(amount, amount) for amount in (1, 2, 3)]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="router reverted"):
+            future.result(timeout=5)
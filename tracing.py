@@ -0,0 +1,201 @@
+import atexit
+import contextvars
+import json
+import threading
+import time
+import uuid
+
+# -----------------------------------------------------------------------------
+# Per-Stage Latency Spans and Metrics
+# -----------------------------------------------------------------------------
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_tool = contextvars.ContextVar("mezo_tool", default="")
+_current_trace = contextvars.ContextVar("mezo_trace", default="")
+
+
+class NullSpan:
+    """
+    Shared do-nothing span handed out while tracing is disabled.
+    """
+
+    @property
+    def outcome(self):
+        return "ok"
+
+    @outcome.setter
+    def outcome(self, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    """
+    Times one stage. The outcome is "ok" unless the block raises or the
+    caller sets span.outcome.
+    """
+
+    def __init__(self, tracer, stage, tags):
+        self.tracer = tracer
+        self.stage = stage
+        self.tags = tags
+        self.outcome = "ok"
+        self.started = None
+        self._tokens = ()
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self.outcome == "ok":
+            self.outcome = "error"
+        self.tracer.record(self, time.perf_counter() - self.started)
+        for var, token in reversed(self._tokens):
+            var.reset(token)
+        return False
+
+
+class Tracer:
+    """
+    Records timing spans for agent stages (routing, LLM calls, output
+    parsing, RPC calls, gas estimation, signing, broadcast, receipt waits).
+
+    Each span is tagged with its stage, the tool it ran under and its
+    outcome. Spans are aggregated into Prometheus-style counters and
+    histograms and, when a trace file is set, appended to it as JSON lines.
+    While disabled, span() returns a shared no-op object, so instrumented
+    code pays one attribute check per stage.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._trace_file = None
+        self._metrics = {}  # (stage, tool, outcome) -> [count, sum, bucket counts]
+        self._collectors = {}  # name -> callable returning extra Prometheus lines
+
+    def configure(self, enabled, trace_path=None, metrics_path=None):
+        """
+        Turns tracing on or off. trace_path receives one JSON line per span;
+        metrics_path receives the Prometheus text when the process exits.
+        """
+        with self._lock:
+            self.enabled = enabled
+            if self._trace_file is not None:
+                self._trace_file.close()
+                self._trace_file = None
+            if enabled and trace_path:
+                self._trace_file = open(trace_path, "a", buffering=1)
+        if enabled and metrics_path:
+            atexit.register(self.write_prometheus, metrics_path)
+
+    def add_collector(self, name, collect):
+        """
+        Appends the lines returned by collect() (e.g. cache hit counters) to
+        prometheus_text(). A later collector under the same name replaces it.
+        """
+        with self._lock:
+            self._collectors[name] = collect
+
+    def span(self, stage, **tags):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, stage, tags)
+
+    def tool(self, name):
+        """
+        Span for a whole tool invocation; spans opened inside it (in this
+        thread or task) are tagged with the tool name.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        span = Span(self, "tool", {})
+        span._tokens = ((_current_tool, _current_tool.set(name)),)
+        return span
+
+    def request(self):
+        """
+        Span for a whole user request; gives nested spans a shared trace id.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        span = Span(self, "request", {})
+        span._tokens = ((_current_trace, _current_trace.set(uuid.uuid4().hex[:16])),)
+        return span
+
+    def record(self, span, duration):
+        tool = _current_tool.get()
+        key = (span.stage, tool, span.outcome)
+        with self._lock:
+            metric = self._metrics.get(key)
+            if metric is None:
+                metric = self._metrics[key] = [0, 0.0, [0] * len(BUCKETS)]
+            metric[0] += 1
+            metric[1] += duration
+            for index, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    metric[2][index] += 1
+            if self._trace_file is not None:
+                entry = {
+                    "trace": _current_trace.get(),
+                    "stage": span.stage,
+                    "tool": tool,
+                    "outcome": span.outcome,
+                    "start": time.time() - duration,
+                    "duration_ms": round(duration * 1000, 3),
+                }
+                entry.update(span.tags)
+                self._trace_file.write(json.dumps(entry, default=str) + "\n")
+
+    def snapshot(self):
+        """
+        Returns {(stage, tool, outcome): (count, total seconds)}.
+        """
+        with self._lock:
+            return {key: (metric[0], metric[1]) for key, metric in self._metrics.items()}
+
+    def prometheus_text(self) -> str:
+        """
+        Renders the aggregated spans in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = {key: (metric[0], metric[1], list(metric[2])) for key, metric in sorted(self._metrics.items())}
+            collectors = list(self._collectors.values())
+        lines = [
+            "# HELP mezo_stage_total Completed agent stages.",
+            "# TYPE mezo_stage_total counter",
+        ]
+        for (stage, tool, outcome), (count, _, _) in metrics.items():
+            lines.append(f'mezo_stage_total{{stage="{stage}",tool="{tool}",outcome="{outcome}"}} {count}')
+        lines += [
+            "# HELP mezo_stage_duration_seconds Time spent per agent stage.",
+            "# TYPE mezo_stage_duration_seconds histogram",
+        ]
+        for (stage, tool, outcome), (count, total, buckets) in metrics.items():
+            labels = f'stage="{stage}",tool="{tool}",outcome="{outcome}"'
+            for bound, bucket_count in zip(BUCKETS, buckets):
+                lines.append(f'mezo_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {bucket_count}')
+            lines.append(f'mezo_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"mezo_stage_duration_seconds_sum{{{labels}}} {total}")
+            lines.append(f"mezo_stage_duration_seconds_count{{{labels}}} {count}")
+        for collect in collectors:
+            lines += collect()
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        with open(path, "w") as metrics_file:
+            metrics_file.write(self.prometheus_text())
+
+
+tracer = Tracer()